@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+class AdaptiveInterval:
+    min_interval_seconds: float
+    max_interval_seconds: float
+    backoff_factor: float
+    interval_seconds: float
+    wait_start_time: float
+    is_woken: bool
+    changed_event: asyncio.Event
+
+    def __init__(self, min_interval_seconds: float, max_interval_seconds: float, backoff_factor: float = 2.0) -> None:
+        """
+        Initialize `AdaptiveInterval` object, an interval between repeated checks that shortens while there is activity and backs off while there isn't.
+
+        :param float min_interval_seconds: The interval while active (and the one to start at)
+        :param float max_interval_seconds: The longest the interval can back off to
+        :param float backoff_factor: What the interval is multiplied by every time nothing happens, default 2.0
+
+        Every check should call `mark_active` or `mark_idle` depending on what it saw, then `wait` before the next one.
+        """
+        if min_interval_seconds <= 0 or max_interval_seconds < min_interval_seconds:
+            raise ValueError(f"Invalid interval bounds: min {min_interval_seconds}, max {max_interval_seconds}.")
+
+        self.min_interval_seconds = min_interval_seconds
+        self.max_interval_seconds = max_interval_seconds
+        self.backoff_factor = backoff_factor
+
+        self.interval_seconds = min_interval_seconds
+        self.wait_start_time = time.monotonic()
+        self.is_woken = False
+        self.changed_event = asyncio.Event()
+
+    def mark_active(self) -> None:
+        """Resets the interval to the minimum. If a wait is in progress, it ends as soon as the minimum interval has passed since it started."""
+        if self.interval_seconds != self.min_interval_seconds:
+            self.interval_seconds = self.min_interval_seconds
+            self.changed_event.set()
+
+    def mark_idle(self) -> None:
+        """Backs the interval off by `self.backoff_factor`, up to the maximum."""
+        self.interval_seconds = min(self.interval_seconds * self.backoff_factor, self.max_interval_seconds)
+
+    def wake(self) -> None:
+        """Resets the interval to the minimum and ends the current (or next) wait straight away, for when a check is needed right now."""
+        self.interval_seconds = self.min_interval_seconds
+        self.is_woken = True
+        self.changed_event.set()
+
+    async def wait(self, start_time: float | None = None) -> None:
+        """
+        Waits until the current interval has passed since `start_time`, or less if `mark_active` or `wake` is called in the meantime.
+
+        :param float start_time: The `time.monotonic()` time to measure the interval from, default None (now) - passing the time the check started means a slow check doesn't push the next one back
+        """
+        self.wait_start_time = start_time if start_time is not None else time.monotonic()
+
+        while self.is_woken is False:
+            remaining_seconds = self.wait_start_time + self.interval_seconds - time.monotonic()
+            if remaining_seconds <= 0:
+                break
+
+            try:
+                await asyncio.wait_for(self.changed_event.wait(), remaining_seconds)
+            except asyncio.TimeoutError:
+                break
+            self.changed_event.clear()
+
+        self.is_woken = False
+        self.changed_event.clear()
@@ -0,0 +1,110 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+import dns.asyncresolver
+import dns.exception
+
+class AddressResolver:
+    host: str
+    default_ttl_seconds: float
+    min_ttl_seconds: float
+    max_ttl_seconds: float
+    refresh_after_fraction: float
+    resolve_timeout_seconds: float
+    ip: str | None
+    refresh_time: float
+    expiry_time: float
+    refresh_task: asyncio.Task | None
+
+    def __init__(self, host: str, default_ttl_seconds: float = 300.0, min_ttl_seconds: float = 30.0, max_ttl_seconds: float = 3600.0, refresh_after_fraction: float = 0.75, resolve_timeout_seconds: float = 3.0) -> None:
+        """
+        Initialize `AddressResolver` object, which resolves `host` to an IP address without blocking and caches it for as long as its DNS record says to.
+
+        :param str host: The host name (or IP address, which is used as it is) to resolve
+        :param float default_ttl_seconds: How long to cache an address that wasn't resolved through DNS (e.g. from the hosts file), default 300.0
+        :param float min_ttl_seconds: The shortest time to cache an address for, whatever its record says, default 30.0
+        :param float max_ttl_seconds: The longest time to cache an address for, whatever its record says, default 3600.0
+        :param float refresh_after_fraction: How much of its TTL a cached address can be used for before it is resolved again in the background, default 0.75
+        :param float resolve_timeout_seconds: How long to wait for one resolution, default 3.0
+
+        If resolving fails once an address has been cached, the old address keeps being used for another `min_ttl_seconds` before resolving is tried again.
+        """
+        self.host = host
+        self.default_ttl_seconds = default_ttl_seconds
+        self.min_ttl_seconds = min_ttl_seconds
+        self.max_ttl_seconds = max_ttl_seconds
+        self.refresh_after_fraction = refresh_after_fraction
+        self.resolve_timeout_seconds = resolve_timeout_seconds
+
+        self.ip = None
+        self.refresh_time = 0.0
+        self.expiry_time = 0.0
+        self.refresh_task = None
+
+        try:
+            # Nothing to resolve
+            self.ip = str(ipaddress.ip_address(host))
+            self.refresh_time = float("inf")
+            self.expiry_time = float("inf")
+        except ValueError:
+            pass
+
+    async def _lookup(self) -> tuple[str, float]:
+        """Resolves `self.host`, returning its IP address and how long it can be cached for."""
+        try:
+            answer = await dns.asyncresolver.resolve(self.host, "A", lifetime=self.resolve_timeout_seconds)
+            return str(answer[0]), float(answer.rrset.ttl)
+        except dns.exception.DNSException:
+            # Not in DNS (e.g. `localhost` or a name from the hosts file) or DNS isn't reachable, so ask the system resolver instead, in a thread
+            address_infos = await asyncio.wait_for(asyncio.get_running_loop().getaddrinfo(self.host, None, family=socket.AF_INET, type=socket.SOCK_STREAM), self.resolve_timeout_seconds)
+            return str(address_infos[0][4][0]), self.default_ttl_seconds
+
+    async def refresh(self) -> bool:
+        """
+        Resolves the host again and caches the result.
+
+        Returns True if it was resolved successfully, False otherwise.
+        """
+        did_refresh_successfully = True
+
+        try:
+            ip, ttl_seconds = await self._lookup()
+            if self.ip is not None and ip != self.ip:
+                logging.info(f"{self.host} now resolves to {ip} (was {self.ip}).")
+            self.ip = ip
+            ttl_seconds = min(self.max_ttl_seconds, max(self.min_ttl_seconds, ttl_seconds))
+            self.refresh_time = time.monotonic() + ttl_seconds * self.refresh_after_fraction
+            self.expiry_time = time.monotonic() + ttl_seconds
+        except (dns.exception.DNSException, OSError, asyncio.TimeoutError) as exception:
+            did_refresh_successfully = False
+            logging.warning(f"Error resolving {self.host}: {exception}")
+            if self.ip is not None:
+                self.refresh_time = time.monotonic() + self.min_ttl_seconds
+                self.expiry_time = self.refresh_time
+
+        return did_refresh_successfully
+
+    async def resolve(self) -> str:
+        """
+        Returns the IP address of the host, resolving it only if nothing is cached or the cached address has expired.
+
+        A cached address close to expiring is returned straight away while it is resolved again in the background.
+
+        Raises `OSError` if the host has never been resolved successfully.
+        """
+        now = time.monotonic()
+
+        if self.ip is None or now >= self.expiry_time:
+            if self.refresh_task is not None and self.refresh_task.done() is False:
+                await self.refresh_task
+            else:
+                await self.refresh()
+        elif now >= self.refresh_time and (self.refresh_task is None or self.refresh_task.done()):
+            self.refresh_task = asyncio.create_task(self.refresh())
+
+        if self.ip is None:
+            raise OSError(f"Couldn't resolve {self.host}.")
+
+        return self.ip
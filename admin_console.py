@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import typing
+from dataclasses import dataclass
+
+# What became of an admin's console command
+COMMAND_COMPLETED = "completed"
+COMMAND_FAILED = "failed"
+COMMAND_TIMED_OUT = "timed_out"
+COMMAND_CANCELLED = "cancelled"
+COMMAND_REJECTED = "rejected"
+
+@dataclass
+class AdminCommandResult:
+    command: str
+    status: str
+    # The server's response, if the command completed
+    response: str | None = None
+
+    def describe(self) -> str:
+        """Returns what to tell the admin: the server's response, or what went wrong."""
+        if self.status == COMMAND_COMPLETED:
+            # Commands like `/save-all` don't say anything back
+            return self.response if self.response != "" else f"`{self.command}` ran without a response."
+        if self.status == COMMAND_TIMED_OUT:
+            return f"`{self.command}` took too long, stopped waiting for it (the server may still run it)."
+        if self.status == COMMAND_CANCELLED:
+            return f"`{self.command}` was cancelled."
+        if self.status == COMMAND_REJECTED:
+            return f"Too many commands are running already, `{self.command}` wasn't run."
+
+        return "An error occurred."
+
+class AdminCommandExecutor:
+    run_console_command: typing.Callable[[str], typing.Awaitable[str | None]]
+    max_concurrent_commands: int
+    max_queued_commands: int
+    command_timeout_seconds: float
+    command_slots: asyncio.Semaphore
+    command_tasks: set[asyncio.Task]
+    # The commands `cancel_all` cancelled, to tell them apart from whoever is waiting for one being cancelled
+    cancelled_command_tasks: set[asyncio.Task]
+
+    def __init__(self, run_console_command: typing.Callable[[str], typing.Awaitable[str | None]], max_concurrent_commands: int = 2, max_queued_commands: int = 10, command_timeout_seconds: float = 30.0) -> None:
+        """
+        Initialize `AdminCommandExecutor` object, which runs the admin's console commands in the background.
+
+        :param Callable run_console_command: Runs a console command on the server, returning its response or None if it failed (e.g. `Server.run_console_command`).
+        :param int max_concurrent_commands: How many commands can run at once, default 2 - the rest wait their turn
+        :param int max_queued_commands: How many commands can be waiting their turn before more are turned away, default 10
+        :param float command_timeout_seconds: How long a command can take before giving up on it, default 30.0 - make it shorter than any timeout
+            `run_console_command` has of its own, so it's always this one that stops a slow command and the admin is told so
+
+        Every command runs in a task of its own, so a slow one never holds up handling the next message (or anything else), and `cancel_all` can stop them.
+        """
+        self.run_console_command = run_console_command
+        self.max_concurrent_commands = max_concurrent_commands
+        self.max_queued_commands = max_queued_commands
+        self.command_timeout_seconds = command_timeout_seconds
+
+        self.command_slots = asyncio.Semaphore(max_concurrent_commands)
+        self.command_tasks = set()
+        self.cancelled_command_tasks = set()
+
+    @property
+    def command_count(self) -> int:
+        """How many commands are running or waiting their turn."""
+        return len(self.command_tasks)
+
+    async def _run(self, command: str) -> AdminCommandResult:
+        async with self.command_slots:
+            try:
+                response = await asyncio.wait_for(self.run_console_command(command), self.command_timeout_seconds)
+            except asyncio.TimeoutError:
+                logging.warning(f"Console command {command!r} timed out after {self.command_timeout_seconds} seconds.")
+                return AdminCommandResult(command, COMMAND_TIMED_OUT)
+
+        if response is None:
+            return AdminCommandResult(command, COMMAND_FAILED)
+
+        return AdminCommandResult(command, COMMAND_COMPLETED, response)
+
+    async def run(self, command: str) -> AdminCommandResult:
+        """
+        Runs `command` once one of the `self.max_concurrent_commands` slots is free, and returns what became of it.
+
+        If `self.max_queued_commands` commands are already waiting for a slot, the command is turned away rather than run.
+        """
+        if self.command_count >= self.max_concurrent_commands + self.max_queued_commands:
+            return AdminCommandResult(command, COMMAND_REJECTED)
+
+        command_task = asyncio.create_task(self._run(command))
+        self.command_tasks.add(command_task)
+        command_task.add_done_callback(self.command_tasks.discard)
+
+        try:
+            return await command_task
+        except asyncio.CancelledError:
+            # Only the command was cancelled (see `cancel_all`), not whoever is waiting for it
+            if command_task in self.cancelled_command_tasks:
+                return AdminCommandResult(command, COMMAND_CANCELLED)
+            raise
+        finally:
+            self.cancelled_command_tasks.discard(command_task)
+
+    def cancel_all(self) -> int:
+        """Cancels every running or waiting command, returning how many there were."""
+        for command_task in self.command_tasks:
+            command_task.cancel()
+            self.cancelled_command_tasks.add(command_task)
+
+        return len(self.command_tasks)
@@ -0,0 +1,233 @@
+import asyncio
+import collections
+import concurrent.futures
+import datetime
+import gzip
+import logging
+import os
+import re
+import typing
+from dataclasses import dataclass
+from chat_classifier import ChatClassifier, ChatRule
+from checkpoint import LogCheckpoint
+
+# Minecraft names the logs it rotates away after the date they were started and a counter, e.g. `2023-06-01-2.log.gz`
+ARCHIVED_LOG_NAME_PATTERN = re.compile(r"^(?P<date>\d{4}-\d{2}-\d{2})-(?P<index>\d+)\.log(?:\.gz)?$")
+# The timestamp at the start of a log line, e.g. `[13:13:49] [Server thread/INFO]: ...`
+LOG_TIME_PATTERN = re.compile(r"^\[(\d{2}):(\d{2}):(\d{2})\]")
+# How many lines are classified at once while reading a log file
+LINES_PER_CHUNK = 10000
+# How far back from an offset to look for the start of the line ending there
+MAX_LINE_LENGTH = 65536
+
+@dataclass
+class BackfillSource:
+    file_name: str
+    # The date the file was started on, for working out the date of each line (which only has a time)
+    log_date: datetime.date
+    start_byte_offset: int = 0
+    # Where to stop reading, or None to read to the end
+    end_byte_offset: int | None = None
+
+def open_log_file(file_name: str) -> typing.BinaryIO:
+    """Opens the log file `file_name` for reading, decompressing it as it is read if it is gzipped."""
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "rb")
+
+    return open(file_name, "rb")
+
+def list_archived_logs(logs_folder: str) -> list[tuple[datetime.date, str]]:
+    """Returns the date and file name of every rotated log in `logs_folder`, oldest first."""
+    archived_logs: list[tuple[datetime.date, int, str]] = []
+
+    with os.scandir(logs_folder) as folder_entries:
+        for folder_entry in folder_entries:
+            name_match = ARCHIVED_LOG_NAME_PATTERN.match(folder_entry.name)
+            if name_match is None or folder_entry.is_file() is False:
+                continue
+            try:
+                log_date = datetime.date.fromisoformat(name_match.group("date"))
+            except ValueError:
+                continue
+            archived_logs.append((log_date, int(name_match.group("index")), folder_entry.path))
+
+    return [(log_date, file_name) for log_date, _, file_name in sorted(archived_logs)]
+
+def read_line_ending_at(log_file: typing.BinaryIO, byte_offset: int) -> str | None:
+    """Returns the complete line ending right before `byte_offset` in `log_file` (without its line break), or None if there isn't one."""
+    if byte_offset <= 0:
+        return None
+
+    window_start = max(0, byte_offset - MAX_LINE_LENGTH)
+    log_file.seek(window_start)
+    window = log_file.read(byte_offset - window_start)
+    if len(window) != byte_offset - window_start or window.endswith(b"\n") is False:
+        return None
+
+    window = window[:-1]
+    line_break_index = window.rfind(b"\n")
+    if line_break_index == -1 and window_start > 0:
+        return None
+
+    return window[line_break_index + 1:].decode("utf-8", errors="replace").rstrip("\r")
+
+def find_checkpoint_archive(archived_logs: list[tuple[datetime.date, str]], checkpoint: LogCheckpoint, max_candidates: int = 3) -> int | None:
+    """
+    Returns the index in `archived_logs` of the rotated log `checkpoint` was taken in, or None if it isn't one of them.
+
+    Only the `max_candidates` newest archives are checked (the checkpoint is usually in the newest one), by comparing the line before the checkpoint's offset to the checkpoint.
+    """
+    for archive_index in range(len(archived_logs) - 1, max(-1, len(archived_logs) - 1 - max_candidates), -1):
+        _, file_name = archived_logs[archive_index]
+        try:
+            with open_log_file(file_name) as log_file:
+                if checkpoint.is_last_line(read_line_ending_at(log_file, checkpoint.byte_offset)) is True:
+                    return archive_index
+        except (OSError, EOFError) as exception:
+            logging.warning(f"Can't read archived log {file_name}: {exception}")
+
+    return None
+
+def plan_backfill(logs_folder: str, latest_log_file_name: str, checkpoint: LogCheckpoint | None = None, since: datetime.datetime | None = None, latest_log_end_byte_offset: int = 0) -> list[BackfillSource]:
+    """
+    Works out which logs were missed, oldest first: everything after `checkpoint` (if `since` is None) or everything logged at or after `since`.
+
+    :param str logs_folder: The folder with `latest.log` and the archived logs
+    :param str latest_log_file_name: The current log file
+    :param LogCheckpoint checkpoint: The checkpoint saved by the last run - only the archived logs after it are missed, since reading `latest.log` resumes from the checkpoint anyway
+    :param datetime since: Catch up on everything logged since then instead
+    :param int latest_log_end_byte_offset: How much of `latest.log` the bridge is going to skip (where it resumes from) - with `since`, only that part of it is caught up on
+
+    Raises `ValueError` if neither `checkpoint` nor `since` is given.
+    """
+    if checkpoint is None and since is None:
+        raise ValueError("Catching up needs either a checkpoint or a time to catch up since.")
+
+    archived_logs = list_archived_logs(logs_folder)
+    backfill_sources: list[BackfillSource] = []
+
+    if since is not None:
+        # An archive can't hold anything logged since `since` if the next one was started before it
+        for archive_index, (log_date, file_name) in enumerate(archived_logs):
+            next_log_date = archived_logs[archive_index + 1][0] if archive_index + 1 < len(archived_logs) else None
+            if next_log_date is None or next_log_date >= since.date():
+                backfill_sources.append(BackfillSource(file_name, log_date))
+
+        if latest_log_end_byte_offset > 0:
+            # `latest.log` was started when the newest archive was rotated away
+            latest_log_date = datetime.date.fromtimestamp(os.stat(archived_logs[-1][1]).st_mtime) if len(archived_logs) > 0 else datetime.date.fromtimestamp(os.stat(latest_log_file_name).st_mtime)
+            backfill_sources.append(BackfillSource(latest_log_file_name, latest_log_date, end_byte_offset=latest_log_end_byte_offset))
+
+        return backfill_sources
+
+    latest_log_stats = os.stat(latest_log_file_name)
+    if checkpoint.file_identity == (latest_log_stats.st_dev, latest_log_stats.st_ino):
+        # Nothing was rotated away since the checkpoint, so resuming `latest.log` from it is enough
+        return backfill_sources
+
+    checkpoint_archive_index = find_checkpoint_archive(archived_logs, checkpoint)
+    if checkpoint_archive_index is None:
+        logging.warning(f"Couldn't find which archived log in {logs_folder} the checkpoint was taken in, so there is nothing to catch up on.")
+        return backfill_sources
+
+    for archive_index in range(checkpoint_archive_index, len(archived_logs)):
+        log_date, file_name = archived_logs[archive_index]
+        start_byte_offset = checkpoint.byte_offset if archive_index == checkpoint_archive_index else 0
+        backfill_sources.append(BackfillSource(file_name, log_date, start_byte_offset=start_byte_offset))
+
+    return backfill_sources
+
+def iter_log_lines(backfill_source: BackfillSource) -> typing.Iterator[str]:
+    """Yields the lines of `backfill_source` (without their line breaks) between its start and end offsets, reading the file as a stream."""
+    with open_log_file(backfill_source.file_name) as log_file:
+        log_file.seek(backfill_source.start_byte_offset)
+        byte_offset = backfill_source.start_byte_offset
+
+        for raw_line in log_file:
+            byte_offset += len(raw_line)
+            if backfill_source.end_byte_offset is not None and byte_offset > backfill_source.end_byte_offset:
+                return
+            yield raw_line.decode("utf-8", errors="replace").rstrip("\r\n")
+
+def iter_lines_since(log_lines: typing.Iterable[str], log_date: datetime.date, since: datetime.datetime) -> typing.Iterator[str]:
+    """
+    Skips the lines of `log_lines` logged before `since` and yields the rest.
+
+    Lines only have a time, so the date is counted forward from `log_date` every time the time goes backwards (past midnight).
+    """
+    since_time = since.replace(tzinfo=None)
+    current_date = log_date
+    previous_time: datetime.time | None = None
+    line_iterator = iter(log_lines)
+
+    for log_line in line_iterator:
+        time_match = LOG_TIME_PATTERN.match(log_line)
+        if time_match is None:
+            continue
+
+        line_time = datetime.time(*(int(time_part) for time_part in time_match.groups()))
+        if previous_time is not None and line_time < previous_time:
+            current_date += datetime.timedelta(days=1)
+        previous_time = line_time
+
+        if datetime.datetime.combine(current_date, line_time) >= since_time:
+            yield log_line
+            # The logs are in order, so everything after this was logged since too
+            yield from line_iterator
+            return
+
+def extract_chat_logs_from_source(backfill_source: BackfillSource, chat_rules: list[ChatRule], since: datetime.datetime | None = None) -> list[str]:
+    """
+    Reads `backfill_source` and returns its chat logs (see `ChatClassifier.extract_chat_logs`), skipping anything logged before `since`.
+
+    Meant to run in a worker process, so only the (much smaller) chat logs are sent back, never the whole file.
+    """
+    chat_classifier = ChatClassifier(chat_rules)
+    log_lines = iter_log_lines(backfill_source)
+    if since is not None:
+        log_lines = iter_lines_since(log_lines, backfill_source.log_date, since)
+
+    chat_logs: list[str] = []
+    chunk: list[str] = []
+    for log_line in log_lines:
+        chunk.append(log_line)
+        if len(chunk) >= LINES_PER_CHUNK:
+            chat_logs.extend(chat_classifier.extract_chat_logs(chunk))
+            chunk.clear()
+    chat_logs.extend(chat_classifier.extract_chat_logs(chunk))
+
+    return chat_logs
+
+async def iter_backfill_chat_logs(backfill_sources: list[BackfillSource], chat_rules: list[ChatRule], since: datetime.datetime | None = None, max_workers: int | None = None) -> typing.AsyncIterator[tuple[BackfillSource, list[str]]]:
+    """
+    Yields each of `backfill_sources` with its chat logs, in order, reading and classifying several files at once in a pool of processes.
+
+    Only a few files more than there are workers are read ahead of what has been yielded, so memory use doesn't grow with how much there is to catch up on.
+
+    :param int max_workers: How many processes to read files in, default None (the number of CPUs, up to 4)
+    """
+    if len(backfill_sources) == 0:
+        return
+
+    max_workers = max_workers if max_workers is not None else min(4, os.cpu_count() or 1)
+    event_loop = asyncio.get_running_loop()
+
+    process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        pending_results: collections.deque[tuple[BackfillSource, asyncio.Future[list[str]]]] = collections.deque()
+        source_iterator = iter(backfill_sources)
+
+        for backfill_source in source_iterator:
+            pending_results.append((backfill_source, event_loop.run_in_executor(process_pool, extract_chat_logs_from_source, backfill_source, chat_rules, since)))
+            if len(pending_results) <= max_workers:
+                continue
+
+            finished_source, chat_logs_future = pending_results.popleft()
+            yield finished_source, await chat_logs_future
+
+        while len(pending_results) > 0:
+            finished_source, chat_logs_future = pending_results.popleft()
+            yield finished_source, await chat_logs_future
+    finally:
+        # Not waiting for the workers, which would block the event loop if the caller stops early (or is cancelled) with files still being read
+        process_pool.shutdown(wait=False, cancel_futures=True)
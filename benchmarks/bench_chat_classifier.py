@@ -0,0 +1,35 @@
+import argparse
+import time
+from chat_classifier import ChatClassifier
+from benchmarks.synthetic_log import generate_log_lines
+
+def main():
+    argument_parser = argparse.ArgumentParser(description="Measures how many lines per second ChatClassifier can classify on a synthetic modded server log.")
+    argument_parser.add_argument("--lines", type=int, default=500_000, help="How many lines of logs to classify")
+    argument_parser.add_argument("--repeat", type=int, default=3, help="How many times to time the classification (the best time is reported)")
+    argument_parser.add_argument("--rules-file", type=str, default=None, help="A JSON file of rules to use instead of the default rules")
+    arguments = argument_parser.parse_args()
+
+    rules = ChatClassifier.load_rules(arguments.rules_file) if arguments.rules_file is not None else None
+    chat_classifier = ChatClassifier(rules) if rules is not None else ChatClassifier()
+    logs = [log.rstrip("\n") for log in generate_log_lines(arguments.lines)]
+
+    best_seconds = None
+    for _ in range(arguments.repeat):
+        start_time = time.perf_counter()
+        chat_logs = chat_classifier.extract_chat_logs(logs)
+        elapsed_seconds = time.perf_counter() - start_time
+        best_seconds = elapsed_seconds if best_seconds is None else min(best_seconds, elapsed_seconds)
+
+    matched_rule_counts: dict[str | None, int] = {}
+    for classified_log in chat_classifier.classify_logs(logs):
+        matched_rule_counts[classified_log.rule_name] = matched_rule_counts.get(classified_log.rule_name, 0) + 1
+
+    print(f"{len(logs)} lines, {len(chat_classifier.rules)} rules, {len(chat_logs)} chat logs")
+    print(f"{best_seconds * 1000:.1f}ms, {len(logs) / best_seconds:,.0f} lines/sec")
+    print("Matched rules:")
+    for rule_name, count in sorted(matched_rule_counts.items(), key=lambda item: -item[1]):
+        print(f"  {str(rule_name):<30} {count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import time
+import log_packer
+from benchmarks.synthetic_log import generate_log_lines
+
+def legacy_condense_logs(logs: list[str], max_message_size: int = 2000) -> list[str]:
+    """A copy of `DiscordBotWrapper.condense_logs` from before `log_packer` replaced it (and it was removed), kept here for comparison. Never returns if a line is too long for a message."""
+    condensed_messages: list[str] = []
+    while len(logs) > 0:
+        condensed_message = ""
+        while len(logs) > 0 and len(condensed_message) + len(logs[0] + "\n") < max_message_size:
+            condensed_message += (logs.pop(0) + "\n")
+        condensed_messages.append(condensed_message)
+
+    return condensed_messages
+
+def main():
+    argument_parser = argparse.ArgumentParser(description="Compares log_packer.pack_logs to the old condense_logs implementation.")
+    argument_parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Sizes of the burst of logs, in lines")
+    argument_parser.add_argument("--legacy-max-lines", type=int, default=100_000, help="Skip the old implementation above this size")
+    arguments = argument_parser.parse_args()
+
+    print(f"{'lines':>10} {'pack_logs':>12} {'legacy':>12} {'speedup':>10} {'messages':>10}")
+    for size in arguments.sizes:
+        logs = [log.rstrip("\n") for log in generate_log_lines(size)]
+
+        start_time = time.perf_counter()
+        messages = list(log_packer.pack_logs(logs))
+        packer_seconds = time.perf_counter() - start_time
+
+        if size <= arguments.legacy_max_lines:
+            start_time = time.perf_counter()
+            # The old implementation empties the list it is given
+            legacy_condense_logs(list(logs))
+            legacy_seconds = time.perf_counter() - start_time
+            print(f"{size:>10} {packer_seconds * 1000:>10.2f}ms {legacy_seconds * 1000:>10.2f}ms {legacy_seconds / packer_seconds:>9.1f}x {len(messages):>10}")
+        else:
+            print(f"{size:>10} {packer_seconds * 1000:>10.2f}ms {'skipped':>12} {'-':>10} {len(messages):>10}")
+
+if __name__ == "__main__":
+    main()
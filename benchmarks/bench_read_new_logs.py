@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import difflib
+import os
+import tempfile
+import time
+from log_tailer import LogTailer
+from benchmarks.synthetic_log import generate_log_lines
+
+def legacy_extract_new_logs(current_logs: list[str], previous_logs: list[str]) -> list[str]:
+    """The `difflib`-based implementation `BotServerBridge.extract_new_logs` used before `LogTailer`, which diffed every log read so far, kept here for comparison."""
+    differ = difflib.Differ()
+    log_delta = differ.compare(current_logs, previous_logs)
+    new_logs: list[str] = [delta[2:].rstrip("\n") for delta in log_delta if delta.startswith("- ")]
+    return new_logs
+
+def time_call(function, *args) -> tuple[float, list[str]]:
+    start_time = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start_time, result
+
+async def time_tailer_read(log_file_name: str, previous_logs: list[str], appended_logs: list[str]) -> tuple[float, list[str]]:
+    """Writes `previous_logs` to `log_file_name` and reads them, then appends `appended_logs` and times reading just those with a `LogTailer`."""
+    with open(log_file_name, "w", encoding="utf-8") as log_file:
+        log_file.writelines(previous_logs)
+
+    log_tailer = LogTailer(log_file_name, max_read_bytes=None)
+    await log_tailer.read_new_lines()
+
+    with open(log_file_name, "a", encoding="utf-8") as log_file:
+        log_file.writelines(appended_logs)
+
+    start_time = time.perf_counter()
+    tail_result = await log_tailer.read_new_lines()
+    return time.perf_counter() - start_time, tail_result.new_lines
+
+def main():
+    argument_parser = argparse.ArgumentParser(description="Compares reading newly appended logs with LogTailer to the old difflib implementation.")
+    argument_parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Sizes of the previous log, in lines")
+    argument_parser.add_argument("--appended", type=int, default=100, help="How many lines are appended between the previous and current log")
+    argument_parser.add_argument("--legacy-max-lines", type=int, default=100_000, help="Skip the difflib implementation above this size (it takes minutes)")
+    arguments = argument_parser.parse_args()
+
+    print(f"{'lines':>10} {'LogTailer':>12} {'difflib':>12} {'speedup':>10}")
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        log_file_name = os.path.join(temporary_folder, "latest.log")
+
+        for size in arguments.sizes:
+            current_logs = generate_log_lines(size + arguments.appended)
+            previous_logs = current_logs[:size]
+
+            tailer_seconds, tailer_result = asyncio.run(time_tailer_read(log_file_name, previous_logs, current_logs[size:]))
+            assert len(tailer_result) == arguments.appended
+
+            if size <= arguments.legacy_max_lines:
+                legacy_seconds, _ = time_call(legacy_extract_new_logs, current_logs, previous_logs)
+                print(f"{size:>10} {tailer_seconds * 1000:>10.3f}ms {legacy_seconds * 1000:>10.1f}ms {legacy_seconds / tailer_seconds:>9.0f}x")
+            else:
+                print(f"{size:>10} {tailer_seconds * 1000:>10.3f}ms {'skipped':>12} {'-':>10}")
+
+if __name__ == "__main__":
+    main()
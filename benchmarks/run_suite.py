@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+from dataclasses import dataclass, asdict
+import observer
+from chat_classifier import ChatClassifier
+import log_packer
+from log_buffer import LogLine
+from log_parser import LogParser
+from log_tailer import LogTailer
+from presence import StatusSnapshot
+from benchmarks.synthetic_log import DEFAULT_LINE_MIX, generate_log_lines
+
+# The share of the log that is "new" in the read_new_logs case, like a burst of logs arriving between two reads
+NEW_LOG_FRACTION = 0.1
+
+@dataclass
+class BenchmarkResult:
+    function_name: str
+    line_count: int
+    best_seconds: float
+    lines_per_second: float
+    peak_memory_bytes: int
+
+def prepare_read_new_logs(log_lines: list[str]) -> typing.Callable[[], typing.Any]:
+    # The log file is deleted along with the folder once the benchmark call (which holds on to it) is done with
+    temporary_folder = tempfile.TemporaryDirectory()
+    log_file_name = os.path.join(temporary_folder.name, "latest.log")
+    previous_line_count = int(len(log_lines) * (1 - NEW_LOG_FRACTION))
+    event_loop = asyncio.new_event_loop()
+    log_tailer = LogTailer(log_file_name, max_read_bytes=None)
+
+    with open(log_file_name, "w", encoding="utf-8") as log_file:
+        log_file.writelines(log_lines[:previous_line_count])
+    event_loop.run_until_complete(log_tailer.read_new_lines())
+    previous_position = log_tailer.get_position()
+    with open(log_file_name, "a", encoding="utf-8") as log_file:
+        log_file.writelines(log_lines[previous_line_count:])
+
+    async def read_new_logs() -> list[str]:
+        # Every call reads the same appended lines again
+        log_tailer.set_position(previous_position)
+        tail_result = await log_tailer.read_new_lines()
+        return tail_result.new_lines
+
+    return lambda: (temporary_folder, event_loop.run_until_complete(read_new_logs()))
+
+def prepare_extract_chat_logs(log_lines: list[str]) -> typing.Callable[[], typing.Any]:
+    chat_classifier = ChatClassifier()
+    logs = [log.rstrip("\n") for log in log_lines]
+    return lambda: chat_classifier.extract_chat_logs(logs)
+
+def prepare_parse_log_records(log_lines: list[str]) -> typing.Callable[[], typing.Any]:
+    log_parser = LogParser()
+    logs = [LogLine(line_number, log.rstrip("\n")) for line_number, log in enumerate(log_lines, 1)]
+    return lambda: list(log_parser.parse(logs))
+
+def prepare_extract_chat_records(log_lines: list[str]) -> typing.Callable[[], typing.Any]:
+    chat_classifier = ChatClassifier()
+    log_records = list(LogParser().parse(LogLine(line_number, log.rstrip("\n")) for line_number, log in enumerate(log_lines, 1)))
+    return lambda: chat_classifier.extract_chat_records(log_records)
+
+def prepare_pack_logs(log_lines: list[str]) -> typing.Callable[[], typing.Any]:
+    logs = [log.rstrip("\n") for log in log_lines]
+    return lambda: list(log_packer.pack_logs(logs))
+
+def prepare_status_fingerprint(log_lines: list[str]) -> typing.Callable[[], typing.Any]:
+    # What `PresenceTracker.update` does with each status: snapshot it and compare its fingerprint to the previous snapshot's
+    previous_snapshot = StatusSnapshot.from_status_response(observer.ServerStatusResponse(timestamp=0.0, is_online=True, online_player_count=3, online_player_limit=20, online_player_names=["Alex", "Steve", "Notch"], version="1.18.2"))
+    status_response = observer.ServerStatusResponse(timestamp=0.0, is_online=True, online_player_count=3, online_player_limit=20, online_player_names=["Steve", "Alex", "Notch"], version="1.18.2")
+    return lambda: StatusSnapshot.from_status_response(status_response).fingerprint == previous_snapshot.fingerprint
+
+# Each one is given the synthetic log lines, does any setup that shouldn't be timed, and returns the call to time
+BENCHMARKS: dict[str, typing.Callable[[list[str]], typing.Callable[[], typing.Any]]] = {
+    "read_new_logs": prepare_read_new_logs,
+    "extract_chat_logs": prepare_extract_chat_logs,
+    "parse_log_records": prepare_parse_log_records,
+    "extract_chat_records": prepare_extract_chat_records,
+    "pack_logs": prepare_pack_logs,
+    "status_fingerprint": prepare_status_fingerprint,
+}
+
+def run_benchmark(function_name: str, log_lines: list[str], repeat: int) -> BenchmarkResult:
+    """
+    Times the benchmark `function_name` on `log_lines` `repeat` times, keeping the best time, then runs it once more under `tracemalloc` for its peak memory.
+
+    Peak memory is what the call allocates on top of its inputs.
+    """
+    benchmark_call = BENCHMARKS[function_name](log_lines)
+
+    best_seconds = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        benchmark_call()
+        best_seconds = min(best_seconds, time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    try:
+        benchmark_call()
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        function_name = function_name,
+        line_count = len(log_lines),
+        best_seconds = best_seconds,
+        lines_per_second = len(log_lines) / best_seconds if best_seconds > 0 else float("inf"),
+        peak_memory_bytes = peak_memory_bytes,
+    )
+
+def parse_line_mix(line_mix_argument: str | None) -> dict[str, int]:
+    """
+    Parses a line mix like `chat=50,stack_trace=0` into weights for `generate_log_lines`.
+
+    Kinds that aren't mentioned keep their default weight, and a weight of 0 leaves that kind out.
+    """
+    line_mix = dict(DEFAULT_LINE_MIX)
+    if line_mix_argument is None:
+        return line_mix
+
+    for line_kind_weight in line_mix_argument.split(","):
+        line_kind, _, weight = line_kind_weight.partition("=")
+        if line_kind not in DEFAULT_LINE_MIX:
+            raise ValueError(f"Unknown kind of line {line_kind!r}, expected one of {', '.join(DEFAULT_LINE_MIX)}.")
+        line_mix[line_kind] = int(weight)
+
+    return line_mix
+
+def find_regressions(results: list[BenchmarkResult], baseline_file_name: str, max_slowdown: float, seed: int, line_mix: dict[str, int]) -> list[str]:
+    """
+    Compares `results` to the results saved in `baseline_file_name`, returning a description of every benchmark that got more than `max_slowdown` slower.
+
+    Raises `ValueError` if the baseline was run on a different synthetic log (`seed` or `line_mix`), since the times wouldn't be comparable.
+    """
+    with open(baseline_file_name, "r", encoding="utf-8") as baseline_file:
+        baseline_json = json.load(baseline_file)
+
+    if baseline_json["seed"] != seed or baseline_json["line_mix"] != line_mix:
+        raise ValueError(f"{baseline_file_name} was run with a different --seed or --mix, so it can't be compared against.")
+
+    baseline_results = baseline_json["results"]
+
+    baseline_seconds = {(result["function_name"], result["line_count"]): result["best_seconds"] for result in baseline_results}
+
+    regressions: list[str] = []
+    for result in results:
+        previous_seconds = baseline_seconds.get((result.function_name, result.line_count))
+        if previous_seconds is not None and result.best_seconds > previous_seconds * (1 + max_slowdown):
+            regressions.append(f"{result.function_name} ({result.line_count} lines): {previous_seconds * 1000:.2f}ms -> {result.best_seconds * 1000:.2f}ms")
+
+    return regressions
+
+def main():
+    argument_parser = argparse.ArgumentParser(description="Measures the throughput and peak memory of the log processing hot path on synthetic server logs.")
+    argument_parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Sizes of the synthetic log, in lines")
+    argument_parser.add_argument("--functions", type=str, nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS), help="Which functions to benchmark")
+    argument_parser.add_argument("--mix", type=str, default=None, help=f"Relative weights of each kind of line, e.g. chat=50,stack_trace=0 (default {','.join(f'{kind}={weight}' for kind, weight in DEFAULT_LINE_MIX.items())})")
+    argument_parser.add_argument("--seed", type=int, default=0, help="The seed for generating the synthetic log")
+    argument_parser.add_argument("--repeat", type=int, default=5, help="How many times to time each function (the best time is reported)")
+    argument_parser.add_argument("--json", type=str, default=None, dest="json_file_name", help="Write the results as JSON to this file (- for stdout)")
+    argument_parser.add_argument("--baseline", type=str, default=None, dest="baseline_file_name", help="A JSON file from an earlier run to compare against - exits with status 1 if anything got slower")
+    argument_parser.add_argument("--max-slowdown", type=float, default=0.2, help="How much slower than the baseline counts as a regression, default 0.2 (20%%)")
+    arguments = argument_parser.parse_args()
+
+    line_mix = parse_line_mix(arguments.mix)
+
+    results: list[BenchmarkResult] = []
+    is_table_printed = arguments.json_file_name != "-"
+    if is_table_printed is True:
+        print(f"{'function':<20} {'lines':>10} {'best':>12} {'lines/sec':>14} {'peak memory':>14}")
+
+    for size in arguments.sizes:
+        log_lines = generate_log_lines(size, arguments.seed, line_mix)
+        for function_name in arguments.functions:
+            result = run_benchmark(function_name, log_lines, arguments.repeat)
+            results.append(result)
+            if is_table_printed is True:
+                print(f"{result.function_name:<20} {result.line_count:>10} {result.best_seconds * 1000:>10.3f}ms {result.lines_per_second:>14,.0f} {result.peak_memory_bytes / 1024:>11,.1f}KiB")
+
+    if arguments.json_file_name is not None:
+        results_json = json.dumps({
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": arguments.seed,
+            "line_mix": line_mix,
+            "repeat": arguments.repeat,
+            "results": [asdict(result) for result in results],
+        }, indent=4)
+
+        if arguments.json_file_name == "-":
+            print(results_json)
+        else:
+            with open(arguments.json_file_name, "w", encoding="utf-8") as json_file:
+                json_file.write(results_json + "\n")
+
+    if arguments.baseline_file_name is not None:
+        regressions = find_regressions(results, arguments.baseline_file_name, arguments.max_slowdown, arguments.seed, line_mix)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
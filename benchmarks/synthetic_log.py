@@ -0,0 +1,104 @@
+import random
+
+PLAYER_NAMES = ["PikaGoku", "Notch", "jeb_", "Dinnerbone", "Grumm", "Alex", "Steve", "xXCreeperXx"]
+
+STACK_TRACE_LINES = [
+    "java.lang.NullPointerException: Cannot invoke \"net.minecraft.world.entity.Entity.getId()\" because \"entity\" is null",
+    "\tat net.minecraft.server.level.ServerLevel.tickNonPassenger(ServerLevel.java:652) ~[server-1.18.2.jar:?]",
+    "\tat net.minecraft.world.level.Level.guardEntityTick(Level.java:463) ~[server-1.18.2.jar:?]",
+    "\tat net.minecraft.server.level.ServerLevel.lambda$tick$2(ServerLevel.java:376) ~[server-1.18.2.jar:?]",
+    "\tat net.minecraft.world.level.entity.EntityTickList.forEach(EntityTickList.java:54) ~[server-1.18.2.jar:?]",
+    "\tat net.minecraft.server.MinecraftServer.tickChildren(MinecraftServer.java:1195) ~[server-1.18.2.jar:?]",
+    "\tat java.lang.Thread.run(Thread.java:833) [?:?]",
+]
+
+def _timestamp(second: int) -> str:
+    return f"[{(second // 3600) % 24:02}:{(second // 60) % 60:02}:{second % 60:02}]"
+
+def _chat_line(random_generator: random.Random) -> str:
+    return f"[Server thread/INFO]: <{random_generator.choice(PLAYER_NAMES)}> message number {random_generator.randrange(100000)}"
+
+def _join_leave_line(random_generator: random.Random) -> str:
+    player_name = random_generator.choice(PLAYER_NAMES)
+    return random_generator.choice([
+        f"[Server thread/INFO]: {player_name} joined the game",
+        f"[Server thread/INFO]: {player_name} left the game",
+        f"[Server thread/INFO]: {player_name} lost connection: Disconnected",
+        f"[Server thread/INFO]: {player_name}[/83.221.231.202:1342] logged in with entity id {random_generator.randrange(10000)} at (-9.8, 124.0, 100.1)",
+        f"[Server thread/INFO]: {player_name} has made the advancement [Stone Age]",
+        f"[Server thread/INFO]: {player_name} was slain by Zombie",
+    ])
+
+def _dynmap_line(random_generator: random.Random) -> str:
+    return random_generator.choice([
+        f"[Server thread/INFO]: [Dynmap] Added {random_generator.randrange(100)} custom biome mappings",
+        f"[Dynmap Render Thread/INFO]: [Dynmap] Radius render of map 'flat' of 'world' in progress - {random_generator.randrange(10000)} tiles rendered",
+    ])
+
+def _op_command_line(random_generator: random.Random) -> str:
+    player_name = random_generator.choice(PLAYER_NAMES)
+    return random_generator.choice([
+        f"[Server thread/INFO]: [{player_name}: Gave 1 [Acacia Boat] to {player_name}]",
+        f"[Server thread/INFO]: [{player_name}: Killed {player_name}]",
+        f"[Server thread/INFO]: Made {player_name} a server operator",
+        "[Server thread/INFO]: There are 1 of a max of 30 players online: PikaGoku",
+    ])
+
+def _mod_line(random_generator: random.Random) -> str:
+    return random_generator.choice([
+        f"[Server thread/INFO]: [LuckPerms] Loaded {random_generator.randrange(500)} tracks",
+        f"[Worker-Main-{random_generator.randrange(12)}/INFO]: [create] Registered {random_generator.randrange(3000)} block entities",
+        f"[Server thread/WARN]: [FTB Chunks] Player {random_generator.choice(PLAYER_NAMES)} tried to claim a chunk in a protected area",
+        f"[Server thread/INFO]: [Essentials] Saved {random_generator.randrange(50)} user files",
+        f"[Craftengine Thread/DEBUG]: [journeymap] Mapping chunk at ({random_generator.randrange(-500, 500)}, {random_generator.randrange(-500, 500)})",
+    ])
+
+def _warning_line(random_generator: random.Random) -> str:
+    return f"[Server thread/WARN]: Can't keep up! Is the server overloaded? Running {random_generator.randrange(2000, 9000)}ms or {random_generator.randrange(40, 180)} ticks behind"
+
+LINE_GENERATORS = {
+    "chat": _chat_line,
+    "join_leave": _join_leave_line,
+    "dynmap": _dynmap_line,
+    "op_command": _op_command_line,
+    "mod": _mod_line,
+    "warning": _warning_line,
+}
+
+DEFAULT_LINE_MIX = {
+    "chat": 30,
+    "join_leave": 15,
+    "dynmap": 25,
+    "op_command": 10,
+    "mod": 20,
+    "warning": 15,
+    "stack_trace": 5,
+}
+
+def generate_log_lines(line_count: int, seed: int = 0, line_mix: dict[str, int] = DEFAULT_LINE_MIX) -> list[str]:
+    """
+    Generates `line_count` lines that look like a busy server's `latest.log` (each ending in a new line, the way `readlines()` returns them).
+
+    The same `line_count`, `seed` and `line_mix` always produce the same lines.
+
+    :param int line_count: How many lines to generate.
+    :param int seed: The seed for the random number generator.
+    :param dict line_mix: The relative weight of each kind of line - keys are the names in `LINE_GENERATORS` or `"stack_trace"`.
+    """
+    random_generator = random.Random(seed)
+    line_kinds = list(line_mix.keys())
+    line_weights = list(line_mix.values())
+
+    log_lines: list[str] = []
+    second = 0
+    while len(log_lines) < line_count:
+        second += random_generator.randrange(2)
+        line_kind = random_generator.choices(line_kinds, line_weights)[0]
+
+        if line_kind == "stack_trace":
+            log_lines.append(f"{_timestamp(second)} [Server thread/ERROR]: Encountered an unexpected exception\n")
+            log_lines.extend(f"{trace_line}\n" for trace_line in STACK_TRACE_LINES)
+        else:
+            log_lines.append(f"{_timestamp(second)} {LINE_GENERATORS[line_kind](random_generator)}\n")
+
+    return log_lines[:line_count]
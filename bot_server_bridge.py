@@ -1,183 +1,154 @@
+# First, so `metrics.launch_time` is as close to the launch as it can be
+import metrics
 from disnake.ext.commands import Bot
 import observer
-from discord_bot import DiscordBotWrapper
+import backfill
+from checkpoint import CheckpointStore, LogCheckpoint
+from spool import DEFAULT_MAX_DELIVERY_ATTEMPTS, Spool, SpoolEntry
+from chat_classifier import ChatClassifier
+from log_parser import LogParser, filter_records
+from routing import CHAT_SINK, LOG_DUMP_SINK, RoutingTable, load_routing_config
+from log_watcher import LogWatcher
+from adaptive_interval import AdaptiveInterval
+from presence import PresenceTracker, PresenceEvent, StatusSnapshot, PRESENCE_EVENT_KINDS
+import time
+from discord_bot import DiscordBotWrapper, create_bot
+from admin_console import AdminCommandExecutor
+from loop_watchdog import LoopWatchdog
+from send_scheduler import DELIVERY_FAILED, DELIVERY_REJECTED, SendScheduler
+from server_config import ServerConfig, load_server_configs
 from dotenv import load_dotenv
 import os
 import asyncio
-import difflib
 import logging
-import aiofiles
 import argparse
+import re
+import signal
+import typing
+import datetime
 from dataclasses import dataclass
 
+# The log line the server writes once it has finished starting up, e.g. `[Server thread/INFO]: Done (12.345s)! For help, type "help"`
+SERVER_STARTED_PATTERN = re.compile(r"\]: Done \([0-9.,]+m?s\)! For help")
+
+def is_server_started_log(log: str) -> bool:
+    """Returns True if `log` is the line the server writes once it has finished starting up."""
+    return "! For help" in log and SERVER_STARTED_PATTERN.search(log) is not None
+
 class BotServerBridge:
     bot_wrapper: DiscordBotWrapper
     discord_token: str
     server: observer.Server
-    server_observation_loop_interval_seconds: int
-    previous_server_response: observer.ServerResponse | None
-    processed_server_logs_file_name: str
-
-    def __init__(self, bot_wrapper: DiscordBotWrapper, discord_token: str, server: observer.Server, server_observation_loop_interval_seconds: int, processed_server_logs_file_name: str) -> None:
+    name: str
+    server_observation_loop_interval_seconds: float
+    max_server_observation_loop_interval_seconds: float
+    status_probe_interval: AdaptiveInterval
+    log_read_interval: AdaptiveInterval
+    checkpoint_store: CheckpointStore
+    chat_classifier: ChatClassifier
+    log_parser: LogParser
+    log_dump_levels: set[str] | None
+    routing_table: RoutingTable
+    log_watcher: LogWatcher | None
+    presence_tracker: PresenceTracker
+    announced_presence_event_kinds: set[str]
+    status_queue: asyncio.Queue[observer.ServerStatusResponse]
+    # Each batch of logs comes with its sequence number in the matching spool (or None without one)
+    server_log_queue: asyncio.Queue[tuple[int | None, list[str]]]
+    chat_log_queue: asyncio.Queue[tuple[int | None, list[str]]]
+    # Logs routed to sinks other than the log dump, by sink
+    routed_log_queues: dict[str, asyncio.Queue[tuple[int | None, list[str]]]]
+    server_log_spool: Spool | None
+    chat_log_spool: Spool | None
+    routed_log_spools: dict[str, Spool | None]
+    spool_replay_batch_lines: int
+    is_catch_up_requested: bool
+    catch_up_since: datetime.datetime | None
+    catch_up_upload_min_lines: int
+    # Whether the checkpoint and spools have been loaded - only done the first time the server observation loop starts
+    is_started: bool
+
+    def __init__(self, bot_wrapper: DiscordBotWrapper, discord_token: str, server: observer.Server, server_observation_loop_interval_seconds: float, checkpoint_store: CheckpointStore, chat_classifier: ChatClassifier, log_watcher: LogWatcher | None = None, max_queued_log_batches: int = 100, max_server_observation_loop_interval_seconds: float | None = None, name: str | None = None, announced_presence_event_kinds: set[str] | None = None, is_catch_up_requested: bool = False, catch_up_since: datetime.datetime | None = None, catch_up_upload_min_lines: int = 200, server_log_spool: Spool | None = None, chat_log_spool: Spool | None = None, spool_replay_batch_lines: int = 1000, log_dump_levels: set[str] | None = None, routing_table: RoutingTable | None = None, routed_log_spools: dict[str, Spool] | None = None) -> None:
+        """
+        Initialize `BotServerBridge` object.
+
+        :param DiscordBotWrapper bot_wrapper: The Discord bot to update.
+        :param str discord_token: The token the Discord bot logs in with.
+        :param Server server: The Minecraft server to observe.
+        :param float server_observation_loop_interval_seconds: How often to ping the server status (and read the server logs, without a log watcher) while there is activity.
+        :param CheckpointStore checkpoint_store: Where to save how far into the server logs we have read.
+        :param ChatClassifier chat_classifier: Decides which server logs are chat logs.
+        :param LogWatcher log_watcher: Notices changes to the server logs so they can be read straight away, default None (read them every interval)
+        :param int max_queued_log_batches: How many batches of new logs can be waiting for a Discord sink before the log ingestion loop waits for it, default 100
+        :param float max_server_observation_loop_interval_seconds: The longest the intervals can back off to while the server is offline or idle, default None (never back off)
+        :param str name: The name of the server in logs and metrics, default None (the server's name)
+        :param set announced_presence_event_kinds: Which kinds of presence events (see `presence.PRESENCE_EVENT_KINDS`) to announce in the chat logs channel, default None (none)
+        :param bool is_catch_up_requested: Whether to catch up on the chat logs missed since the last run before relaying new ones (see `catch_up`), default False
+        :param datetime catch_up_since: Catch up on the chat logs since then instead of since the last run's checkpoint, default None
+        :param int catch_up_upload_min_lines: While catching up, a log file with at least this many chat logs has them uploaded as a file rather than sent as messages, default 200
+        :param Spool server_log_spool: Where to keep server logs until they are sent, so they aren't lost if sending them fails, default None (only in memory)
+        :param Spool chat_log_spool: Where to keep chat logs until they are sent, default None (only in memory)
+        :param int spool_replay_batch_lines: How many spooled lines to send again at once, default 1000
+        :param set log_dump_levels: Only send server logs of these levels (e.g. `{"WARN", "ERROR"}`) to the server logs channel, default None (every level)
+        :param RoutingTable routing_table: Decides which sink each server log goes to (see `DiscordBotWrapper.get_log_sink`), default None (the server logs channel)
+        :param dict routed_log_spools: Where to keep the logs routed to each sink other than the log dump until they are sent, default None (only in memory)
+        """
         self.bot_wrapper = bot_wrapper
         self.discord_token = discord_token
         self.server = server
+        self.name = name if name is not None else server.name
         self.server_observation_loop_interval_seconds = server_observation_loop_interval_seconds
-        self.previous_server_response = None
-        self.processed_server_logs_file_name = processed_server_logs_file_name
-
-    @staticmethod
-    def extract_new_logs(current_logs: list[str], previous_logs: list[str]) -> list[str]:
-        """
-        Uses difflib to determine which logs are new to the `current_logs` and returns them.
-        """
-        differ = difflib.Differ()
-        log_delta = differ.compare(current_logs, previous_logs)
-
-        # If a line is unique to `current_logs` (the latest log information), it will start with `"- "``
-        # Also, remove that "- " while we're iterating over everything anyway
-        new_logs: list[str] = [delta[2:].rstrip("\n") for delta in log_delta if delta.startswith("- ")]
-
-        return new_logs
-    
-    @staticmethod
-    def extract_chat_logs(server_logs: list[str]) -> list[str]:
-        """
-        From a set of `server_logs`, extract which logs are chat logs and return them.
-
-        Also, processes the chat logs if necessary.
-        """
-        chat_logs: list[str] = []
-
-        def trim_server_info_log(server_log: str) -> str:
-            """From a server info log, trims the contents to remove the `[Server thread/INFO]: ` prefix and returns it"""
-            log_contents: str = ""
-            log_contents = server_log.split("[Server thread/INFO]: ")[1]
-            return log_contents
-
-        for log in server_logs:
-            if "[Server thread/INFO]:" not in log:
-                continue
-
-            # It's hard to intelligently capture all messages
-            # It's easier to exclude messages, so we'll do that
-
-            # Trimming log early because it is probably better if there are less characters in each message to linearly scan through
-            trimmed_log = trim_server_info_log(log)
-
-            # Excluding certain non-player messages
-            if ("<" in trimmed_log and ">" in trimmed_log) is False:
-                # [13:13:49] [Server thread/INFO]: PikaGoku lost connection: Disconnected
-                if "lost connection" in trimmed_log:
-                    continue
-                # [13:14:12] [Server thread/INFO]: PikaGoku[/83.221.231.202:1342] logged in with entity id 511 at (-9.837644089959465, 124.0, 100.14206735043899)
-                if "logged in with entity id" in trimmed_log:
-                    continue
-                # [13:22:08] [Server thread/INFO]: There are 1 of a max of 30 players online: PikaGoku
-                if "There are" in trimmed_log and "a max of" in trimmed_log and "players online" in trimmed_log:
-                    continue
-                # [12:54:39] [Server thread/INFO]: [Dynmap] Added 18 custom biome mappings
-                if "[Dynmap]" in trimmed_log:
-                    continue
-                # [12:54:39] [Server thread/INFO]: Starting minecraft server version 1.18.2
-                if "Starting minecraft server" in trimmed_log:
-                    continue
-                # [12:54:39] [Server thread/INFO]: Loading properties
-                if "Loading properties" in trimmed_log:
-                    continue
-                # [12:54:39] [Server thread/INFO]: Default game type: SURVIVAL
-                if "Default game type:" in trimmed_log:
-                    continue
-                # [12:54:39] [Server thread/INFO]: Generating keypair
-                if "Generating keypair" in trimmed_log:
-                    continue
-                # [12:54:39] [Server thread/INFO]: Starting Minecraft server on 51.81.64.4:25565
-                if "Starting Minecraft server" in trimmed_log:
-                    continue
-                # [12:54:39] [Server thread/INFO]: Using epoll channel type
-                if "channel type" in trimmed_log:
-                    continue
-                # [12:54:39] [Server thread/INFO]: Preparing level "fabric_1_18_2_1755343"
-                if "Preparing level" in trimmed_log:
-                    continue
-                # [12:54:48] [Server thread/INFO]: Preparing start region for dimension minecraft:overworld
-                if "Preparing start region" in trimmed_log:
-                    continue
-                # [12:54:57] [Server thread/INFO]: Time elapsed: 8900 ms
-                if "Time elapsed:" in trimmed_log:
-                    continue
-                # [12:54:57] [Server thread/INFO]: Done (17.860s)! For help, type "help"
-                if "For help, type" in trimmed_log:
-                    continue
-                # [12:54:57] [Server thread/INFO]: Starting GS4 status listener
-                if "status listener" in trimmed_log:
-                    continue
-                # [12:54:57] [Server thread/INFO]: Thread Query Listener started
-                if "Thread Query Listener" in trimmed_log:
-                    continue                        
-                # [12:54:57] [Server thread/INFO]: Starting remote control listener
-                if "Starting remote control listener" in trimmed_log:
-                    continue
-                # [12:54:57] [Server thread/INFO]: Thread RCON Listener started
-                if "Thread RCON Listener" in trimmed_log:
-                    continue
-                # [12:54:57] [Server thread/INFO]: RCON running on 51.81.64.4:25575
-                if "RCON running on" in trimmed_log:
-                    continue
-                # [16:48:04] [Server thread/INFO]: Unknown or incomplete command, see below for error
-                if "Unknown or incomplete command" in trimmed_log:
-                    continue
-                # [16:48:04] [Server thread/INFO]: STOP<--[HERE]
-                if "[HERE]" in trimmed_log:
-                    continue
-                # [16:48:06] [Server thread/INFO]: Stopping the server
-                if "Stopping the server" in trimmed_log:
-                    continue
-                # [16:48:07] [Server thread/INFO]: Stopping server
-                if "Stopping server" in trimmed_log:
-                    continue
-                # [16:48:07] [Server thread/INFO]: Saving players
-                if "Saving players" in trimmed_log:
-                    continue
-                # [16:48:07] [Server thread/INFO]: Saving worlds
-                if "Saving worlds" in trimmed_log:
-                    continue
-                # [16:48:08] [Server thread/INFO]: Saving chunks for level 'ServerLevel[world]'/minecraft:overworld
-                if "Saving chunks for level" in trimmed_log:
-                    continue
-                # [16:48:09] [Server thread/INFO]: ThreadedAnvilChunkStorage (world): All chunks are saved
-                if "ThreadedAnvilChunkStorage" in trimmed_log:
-                    continue
-                # [Server thread/INFO]: Made PikaGoku a server operator
-                if "a server operator" in trimmed_log:
-                    continue
-                # [Server thread/INFO]: [PikaGoku: Gave 1 [Acacia Boat] to PikaGoku]
-                # [Server thread/INFO]: [PikaGoku: Killed PikaGoku]
-                # [Server thread/INFO]: [PikaGoku: Killed PikaGoku]
-                # This pattern continues for all operator commands
-                if"[" in trimmed_log and ": " in trimmed_log and "]" in trimmed_log:
-                    continue
-
-                chat_logs.append(trimmed_log)
-
-        return chat_logs
-        
+        self.max_server_observation_loop_interval_seconds = max_server_observation_loop_interval_seconds if max_server_observation_loop_interval_seconds is not None else server_observation_loop_interval_seconds
+        self.status_probe_interval = AdaptiveInterval(self.server_observation_loop_interval_seconds, self.max_server_observation_loop_interval_seconds)
+        self.log_read_interval = AdaptiveInterval(self.server_observation_loop_interval_seconds, self.max_server_observation_loop_interval_seconds)
+        self.checkpoint_store = checkpoint_store
+        self.chat_classifier = chat_classifier
+        self.log_parser = LogParser()
+        self.log_dump_levels = log_dump_levels
+        self.routing_table = routing_table if routing_table is not None else RoutingTable()
+        self.log_watcher = log_watcher
+
+        self.announced_presence_event_kinds = announced_presence_event_kinds if announced_presence_event_kinds is not None else set()
+        self.presence_tracker = PresenceTracker()
+        self.presence_tracker.subscribe(self.update_status_display_from_snapshot)
+        self.presence_tracker.subscribe(self.record_presence_events)
+        if len(self.announced_presence_event_kinds) > 0:
+            self.presence_tracker.subscribe(self.announce_presence_events)
+
+        # Only the latest status matters, so a status waiting to be displayed is replaced by a newer one (see `put_latest`)
+        self.status_queue = asyncio.Queue(maxsize=1)
+        self.server_log_queue = asyncio.Queue(maxsize=max_queued_log_batches)
+        self.chat_log_queue = asyncio.Queue(maxsize=max_queued_log_batches)
+        # Each sink has its own queue, so a slow one doesn't hold up the others
+        self.routed_log_queues = {sink_name: asyncio.Queue(maxsize=max_queued_log_batches) for sink_name in sorted(self.routing_table.sink_names - {LOG_DUMP_SINK})}
+
+        self.is_catch_up_requested = is_catch_up_requested or catch_up_since is not None
+        self.catch_up_since = catch_up_since
+        self.catch_up_upload_min_lines = catch_up_upload_min_lines
+
+        self.server_log_spool = server_log_spool
+        self.chat_log_spool = chat_log_spool
+        self.routed_log_spools = {sink_name: routed_log_spools.get(sink_name) if routed_log_spools is not None else None for sink_name in self.routed_log_queues}
+        self.spool_replay_batch_lines = spool_replay_batch_lines
+        # The checkpoint only moves past logs once they are on disk in the spools
+        self.checkpoint_store.before_write = self.sync_spools
+        self.is_started = False
 
     async def optionally_update_status_display(self, status_info: observer.ServerStatusResponse) -> bool | None:
         """
-        Determine if the provided `status_info` is different from the most recently observed `status_info`, and if so, 
-        make a call to update the status display, returning the value returned by that function call.
+        Ask the bot to update the status display with the provided `status_info`. The bot only edits the message if the rendered
+        content changed, and at most once every so often (see `DiscordBotWrapper.request_status_display_update`).
 
-        If not, don't do that, and return None.
+        Returns True if an edit was scheduled, or None if the status display already shows this.
         """
-        if self.previous_server_response is not None and status_info.is_equal_to(self.previous_server_response.status_info) == True:
-            return None
+        update_response = self.bot_wrapper.request_status_display_update(status_info)
 
-        update_response = await self.bot_wrapper.update_status_display(status_info)
+        if update_response is False:
+            return None
 
         return update_response
     
-    async def optionally_update_server_log_display(self, new_server_logs: list[str]) -> bool | None:
+    async def optionally_update_server_log_display(self, new_server_logs: list[str], on_delivered: typing.Callable[[list[str]], None] | None = None) -> bool | None:
         """
         If the `new_server_logs` list isn't empty, make a call to update the server logs display, returning the value returned by that function call.
 
@@ -186,11 +157,11 @@ class BotServerBridge:
         if len(new_server_logs) == 0:
             return None
         
-        update_response = await self.bot_wrapper.update_server_log_display(new_server_logs)
+        update_response = await self.bot_wrapper.update_server_log_display(new_server_logs, on_delivered)
 
         return update_response
     
-    async def optionally_update_chat_log_display(self, new_chat_logs: list[str]) -> bool | None:
+    async def optionally_update_chat_log_display(self, new_chat_logs: list[str], on_delivered: typing.Callable[[list[str]], None] | None = None) -> bool | None:
         """
         If the `new_chat_logs` list isn't empty, make a call to update the chat logs display, returning the value returned by that function call.
 
@@ -199,111 +170,459 @@ class BotServerBridge:
         if len(new_chat_logs) == 0:
             return None
         
-        update_response = await self.bot_wrapper.update_chat_log_display(new_chat_logs)
+        update_response = await self.bot_wrapper.update_chat_log_display(new_chat_logs, on_delivered)
 
         return update_response
     
-    async def read_processed_server_logs(self) -> list[str]:
+    async def optionally_update_routed_log_display(self, sink_name: str, new_logs: list[str], on_delivered: typing.Callable[[list[str]], None] | None = None) -> bool | None:
         """
-        Reads from the file specified by `self.processed_server_logs_file_name` and returns the contents.
+        If the `new_logs` list isn't empty, queue them to be sent to the sink `sink_name` (see `DiscordBotWrapper.get_log_sink`), returning whether they were queued.
 
-        Returns an empty list if the file does not exist.
+        If not, don't do that, and return None.
         """
-        processed_server_logs: list[str] = []
+        if len(new_logs) == 0:
+            return None
 
-        try:
-            async with aiofiles.open(self.processed_server_logs_file_name, "r") as processed_server_log_file:
-                processed_server_logs = await processed_server_log_file.readlines()
-        except FileNotFoundError as exception:
-            logging.error(f"Server log file {self.processed_server_logs_file_name} not found! {exception}")
-        except Exception as exception:
-            logging.error(f"Unhandled exception reading from processed server logs file! {exception}")
+        update_response = await self.bot_wrapper.queue_sink_lines(sink_name, new_logs, on_delivered)
 
-        return processed_server_logs
+        return update_response
 
-    async def write_processed_server_logs(self, latest_server_logs: list[str]) -> bool:
+    async def resume_from_checkpoint(self) -> bool:
         """
-        Writes the `latest_server_logs` to the file specified by `self.processed_server_logs_file_name`.
+        Loads the checkpoint saved by a previous run and tells the server to continue reading its logs from there.
 
-        Returns True if the write was successful, False otherwise.
+        Returns True if the logs will be read from the checkpoint, False if they will be read from the start.
         """
-        did_write_successfully = True
+        checkpoint = await self.checkpoint_store.load()
 
-        try:
-            async with aiofiles.open(self.processed_server_logs_file_name, "w") as processed_server_log_file:
-                await processed_server_log_file.writelines(latest_server_logs)
-        except Exception as exception:
-            logging.error(f"Unhandled exception writing to processed server logs file! {exception}")
-            did_write_successfully = False
+        if checkpoint is None:
+            return False
 
-        return did_write_successfully
+        did_resume = await self.server.resume_from_checkpoint(checkpoint)
 
-    async def server_observation_loop(self) -> None:
+        return did_resume
+
+    async def catch_up(self, checkpoint: LogCheckpoint | None, resumed_byte_offset: int) -> int:
         """
-        With a delay of `self.server_observation_loop_interval_seconds` between iterations, get server information and if any changes have happened, tell the bot to update channels.
+        Sends the chat logs missed while the bridge wasn't running - from the archived logs (`logs/*.log.gz`) rotated away since `checkpoint`,
+        or with `self.catch_up_since`, from everything logged since then (see `backfill.plan_backfill`).
+
+        The part of `latest.log` from `resumed_byte_offset` on isn't caught up on, since the log ingestion loop reads it next.
+        The log files are read in a pool of processes and each file's chat logs are sent packed into as few messages as possible,
+        or uploaded as a file if there are at least `self.catch_up_upload_min_lines` of them.
+
+        Returns how many chat logs were caught up on.
+        """
+        caught_up_line_count = 0
+
+        if checkpoint is None and self.catch_up_since is None:
+            logging.info(f"[{self.name}] No checkpoint to catch up from.")
+            return caught_up_line_count
+
+        logs_folder = os.path.dirname(os.path.abspath(self.server.server_log_file_name))
+        backfill_sources = await asyncio.to_thread(backfill.plan_backfill, logs_folder, self.server.server_log_file_name, checkpoint, self.catch_up_since, resumed_byte_offset)
+        logging.info(f"[{self.name}] Catching up on {len(backfill_sources)} log file(s).")
+
+        async for backfill_source, chat_logs in backfill.iter_backfill_chat_logs(backfill_sources, self.chat_classifier.rules, self.catch_up_since):
+            caught_up_line_count += len(chat_logs)
+            if len(chat_logs) == 0:
+                continue
+
+            if len(chat_logs) >= self.catch_up_upload_min_lines:
+                await self.bot_wrapper.upload_chat_log_file(f"{os.path.basename(backfill_source.file_name).split('.')[0]}-chat.txt", chat_logs)
+            else:
+                await self.bot_wrapper.update_chat_log_display(chat_logs)
+
+        logging.info(f"[{self.name}] Caught up on {caught_up_line_count} chat log(s).")
+
+        return caught_up_line_count
+
+    async def wait_for_next_log_read(self) -> None:
+        """
+        Waits until the server logs should be read again.
+
+        Without a log watcher that is once `self.log_read_interval` has passed.
+        With one it is as soon as the server logs change, or once that interval has passed if they don't.
+        """
+        if self.log_watcher is None:
+            await self.log_read_interval.wait()
+            return
+
+        await self.log_watcher.wait_for_change(self.log_read_interval.interval_seconds)
+
+    @staticmethod
+    def put_latest(queue: asyncio.Queue, item: typing.Any) -> None:
+        """Puts `item` into `queue` without waiting, throwing away the oldest item if the queue is full (for queues where only the latest item matters)."""
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(item)
+
+    def is_server_active(self, status_response: observer.ServerStatusResponse) -> bool:
+        """Returns True if the server status should be watched closely - the server is online with players on it."""
+        return status_response.is_online is True and status_response.online_player_count > 0
+
+    async def status_probe_loop(self) -> None:
+        """
+        Ping the server status and hand it to the status display sink, over and over, with `self.status_probe_interval` between the start of one ping and the next.
+
+        The interval is at its shortest while players are online or the logs are moving, and backs off while the server is offline or idle.
         """
         while True:
-            # Ping the server
-            server_response = await self.server.ping_server()
-
-            # Get required information from the server response
-            previous_server_logs = []
-            if self.previous_server_response is None:
-                # If we have no processed server logs in memory, maybe this script restarted without the server restarting.
-                # If that is the case, we don't want to re-send all the logs in latest.log, so we are keeping a record of what we have sent in a file.
-                # We are reading from that file here.
-                previous_server_logs = await self.read_processed_server_logs()
-            elif self.previous_server_response is not None:
-                previous_server_logs = self.previous_server_response.logs_info.server_logs
-
-            new_server_logs = self.extract_new_logs(server_response.logs_info.server_logs, previous_server_logs)
-            new_chat_logs = self.extract_chat_logs(new_server_logs)
-
-            _, status_response, server_logs_response, chat_logs_response = await asyncio.gather(
-                asyncio.sleep(self.server_observation_loop_interval_seconds),
-                self.optionally_update_status_display(server_response.status_info),
-                self.optionally_update_server_log_display(new_server_logs),
-                self.optionally_update_chat_log_display(new_chat_logs)
-            )
-
-            if status_response is True:
-                logging.debug("Updated status display successfully.")
-
-            if server_logs_response is True:
-                logging.debug("Updated server logs display successfully.")
-        
-            if chat_logs_response is True:
-                logging.debug("Updated chat logs display successfully.")
+            ping_start_time = time.monotonic()
+
+            try:
+                status_response = await self.server.ping_server_status()
+                metrics.pipeline.status_ping_seconds.observe(time.monotonic() - ping_start_time, self.name)
+                metrics.pipeline.status_pings_total.inc(self.name, "online" if status_response.is_online is True else "offline")
+                self.put_latest(self.status_queue, status_response)
+
+                if self.is_server_active(status_response) is True:
+                    self.status_probe_interval.mark_active()
+                else:
+                    self.status_probe_interval.mark_idle()
+            except Exception as exception:
+                logging.error(f"[{self.name}] Unhandled exception in the status probe loop! {exception}")
+
+            await self.status_probe_interval.wait(ping_start_time)
+
+    async def log_ingestion_loop(self) -> None:
+        """
+        Whenever the server logs change (or every `self.log_read_interval` without a log watcher), read the new logs, parse them into records
+        (once - everything after works from the records), route them to their sinks (see `RoutingTable`) and pick out the chat logs, write them to the spools and hand them to the sinks, then save a checkpoint of how far into the logs we have read.
+        The checkpoint only moves past logs once they are in the spools, so logs that fail to send are sent later rather than lost.
+
+        New logs make both the status probe and log reads fast again, and the server finishing starting up makes the status probe ping straight away.
 
-            # Check if the new server response are different to determine if we should update our records for previous server response
-            if self.previous_server_response is None or (self.previous_server_response.is_equal_to(server_response) is False):
-                # Update the previous_server_response in memory
-                self.previous_server_response = server_response
+        If a sink falls far enough behind that its queue fills up, this waits for it rather than dropping logs.
 
-                # Write server response to saved.log for persisting a record of what logs we have sent outside of memory.
-                did_write_successfully = await self.write_processed_server_logs(server_response.logs_info.server_logs)
+        Only the logs read in each iteration are held on to (the server only reports the new ones), and a big backlog is read in several
+        iterations one after the other, so memory use stays flat however long the server runs.
+        """
+        previous_byte_offset = self.server.log_tailer.get_position().byte_offset
+
+        while True:
+            has_more_logs = False
+
+            try:
+                read_start_time = time.perf_counter()
+                logs_response = await self.server.ping_server_logs()
+                has_more_logs = logs_response.has_more
+                parse_start_time = time.perf_counter()
+                if logs_response.is_rotated is True:
+                    self.log_parser.reset()
+                new_log_records = list(self.log_parser.parse(logs_response.new_logs))
+                parse_end_time = time.perf_counter()
+
+                # After a rotation the offset starts again from 0, so everything up to it was read
+                byte_offset = logs_response.log_position.byte_offset
+                metrics.pipeline.log_read_bytes_total.inc(self.name, amount=byte_offset - previous_byte_offset if byte_offset >= previous_byte_offset else byte_offset)
+                previous_byte_offset = byte_offset
+                metrics.pipeline.log_read_seconds.observe(parse_start_time - read_start_time, self.name)
+                metrics.pipeline.parse_logs_seconds.observe(parse_end_time - parse_start_time, self.name)
+                metrics.pipeline.log_lines_read_total.inc(self.name, amount=len(logs_response.new_logs))
+
+                if len(new_log_records) > 0:
+                    self.log_read_interval.mark_active()
+                    if any(is_server_started_log(log_record.text) for log_record in new_log_records):
+                        logging.info(f"[{self.name}] The server finished starting, pinging its status.")
+                        self.status_probe_interval.wake()
+                    else:
+                        self.status_probe_interval.mark_active()
+
+                    classify_start_time = time.perf_counter()
+                    new_chat_logs = self.chat_classifier.extract_chat_records(new_log_records)
+                    metrics.pipeline.chat_classify_seconds.observe(time.perf_counter() - classify_start_time, self.name)
+                    metrics.pipeline.chat_lines_total.inc(self.name, amount=len(new_chat_logs))
+
+                    for sink_name, routed_log_records in self.routing_table.route(new_log_records).items():
+                        if sink_name == LOG_DUMP_SINK:
+                            log_queue, spool = self.server_log_queue, self.server_log_spool
+                            routed_log_records = filter_records(routed_log_records, self.log_dump_levels)
+                        else:
+                            log_queue, spool = self.routed_log_queues[sink_name], self.routed_log_spools[sink_name]
+
+                        routed_logs = [log_record.text for log_record in routed_log_records]
+                        if len(routed_logs) > 0:
+                            await log_queue.put((await spool.append(routed_logs) if spool is not None else None, routed_logs))
+                    if len(new_chat_logs) > 0:
+                        await self.chat_log_queue.put((await self.chat_log_spool.append(new_chat_logs) if self.chat_log_spool is not None else None, new_chat_logs))
+                else:
+                    self.log_read_interval.mark_idle()
+
+                # Save a checkpoint of how far into the logs we have read for persisting it outside of memory (written at most every so often).
+                did_write_successfully = await self.checkpoint_store.save(LogCheckpoint.from_log_position(logs_response.log_position))
                 if did_write_successfully is True:
-                    logging.debug("Updated processed server logs file successfully.")
+                    logging.debug("Updated checkpoint file successfully.")
+            except Exception as exception:
+                logging.error(f"[{self.name}] Unhandled exception in the log ingestion loop! {exception}")
+
+            # Carry straight on with the rest of a backlog too big to read at once
+            if has_more_logs is False:
+                await self.wait_for_next_log_read()
+
+    async def update_status_display_from_snapshot(self, snapshot: StatusSnapshot, events: list[PresenceEvent]) -> None:
+        """Presence subscriber updating the status display (which the presence tracker only calls when the status changed)."""
+        update_start_time = time.perf_counter()
+        update_response = await self.optionally_update_status_display(snapshot.to_status_response())
+        metrics.pipeline.discord_update_seconds.observe(time.perf_counter() - update_start_time, self.name, "status")
+        if update_response is True:
+            logging.debug("Scheduled status display update successfully.")
+
+    async def record_presence_events(self, snapshot: StatusSnapshot, events: list[PresenceEvent]) -> None:
+        """Presence subscriber logging and counting presence events."""
+        for event in events:
+            logging.info(f"[{self.name}] {event.describe()}")
+            metrics.pipeline.presence_events_total.inc(self.name, event.kind)
+
+    async def announce_presence_events(self, snapshot: StatusSnapshot, events: list[PresenceEvent]) -> None:
+        """Presence subscriber announcing the events of the kinds in `self.announced_presence_event_kinds` in the chat logs channel."""
+        announcements = [event.describe() for event in events if event.kind in self.announced_presence_event_kinds]
+
+        update_response = await self.optionally_update_chat_log_display(announcements)
+        if update_response is True:
+            logging.debug("Queued presence announcements successfully.")
+
+    async def status_display_sink_loop(self) -> None:
+        """
+        Passes each server status from the status probe loop to the presence tracker, whose subscribers update the status display
+        (and announce players joining and leaving, if enabled) whenever the status changes.
+        """
+        while True:
+            status_response = await self.status_queue.get()
+
+            try:
+                await self.presence_tracker.update(status_response)
+            except Exception as exception:
+                logging.error(f"[{self.name}] Unhandled exception updating the status display! {exception}")
+
+    async def sync_spools(self) -> None:
+        """Waits until everything written to the spools is on disk (see `Spool.sync`)."""
+        for spool in (self.server_log_spool, self.chat_log_spool, *self.routed_log_spools.values()):
+            if spool is not None:
+                await spool.sync()
+
+    async def send_spool_entries(self, spool: Spool, spool_entries: list[SpoolEntry], update_display: typing.Callable[[list[str], typing.Callable[[list[str]], None]], typing.Awaitable[bool | None]]) -> bool:
+        """
+        Sends the lines of `spool_entries` to `update_display` as one batch, waits until they were dealt with, and records in `spool` what became of each entry:
+        acknowledged if every line of it was sent (or rejected by Discord), or else sent again later from the first line that failed.
+
+        Returns True if every line was dealt with, False if any failed.
+        """
+        logs = [log for spool_entry in spool_entries for log in spool_entry.lines]
+        line_outcomes: list[str] = []
+        if len(logs) > 0:
+            delivery_future: asyncio.Future[list[str]] = asyncio.get_running_loop().create_future()
+            await update_display(logs, delivery_future.set_result)
+            line_outcomes = await delivery_future
+
+        # Lines are given up on from the first one that failed (see `ChannelSendQueue.enqueue`), so everything before it was dealt with
+        first_failed_index = line_outcomes.index(DELIVERY_FAILED) if DELIVERY_FAILED in line_outcomes else len(line_outcomes)
+        entry_start_index = 0
+        for spool_entry in spool_entries:
+            entry_end_index = entry_start_index + len(spool_entry.lines)
+            rejected_line_count = line_outcomes[entry_start_index:min(entry_end_index, first_failed_index)].count(DELIVERY_REJECTED)
+            if entry_end_index <= first_failed_index:
+                spool.acknowledge(spool_entry.sequence_number, rejected_line_count)
+            elif entry_start_index <= first_failed_index:
+                spool.record_failed_delivery(spool_entry.sequence_number, first_failed_index - entry_start_index, rejected_line_count)
+            else:
+                spool.requeue(spool_entry.sequence_number)
+            entry_start_index = entry_end_index
+        await spool.flush()
+
+        return first_failed_index == len(line_outcomes)
+
+    async def replay_spool(self, spool: Spool, update_display: typing.Callable[[list[str], typing.Callable[[list[str]], None]], typing.Awaitable[bool | None]], display_name: str) -> None:
+        """
+        Sends the spooled logs that haven't been sent yet (left over from the last run, or whose send failed) again, oldest first,
+        in batches of up to `self.spool_replay_batch_lines` lines, once the Discord bot is connected.
+
+        One batch is sent at a time, so the replay never gets further ahead of Discord than that.
+        If a batch can't be sent either, it is tried again after a growing delay, until everything has been sent, rejected by Discord,
+        or given up on (see `Spool.record_failed_delivery`).
+        """
+        retry_delay_seconds = 1.0
+
+        while spool.has_replayable_entries is True:
+            await self.bot_wrapper.discord_bot.wait_until_ready()
+            did_replay_successfully = True
+
+            async for spool_entries in spool.iter_replayable_entries(self.spool_replay_batch_lines):
+                did_replay_successfully = await self.send_spool_entries(spool, spool_entries, update_display)
+                if did_replay_successfully is False:
+                    break
+                metrics.pipeline.spool_replayed_lines_total.inc(self.name, display_name, amount=sum(len(spool_entry.lines) for spool_entry in spool_entries))
+
+            if did_replay_successfully is False:
+                logging.warning(f"[{self.name}] Couldn't send spooled {display_name}, trying again in {retry_delay_seconds} seconds.")
+                await asyncio.sleep(retry_delay_seconds)
+                retry_delay_seconds = min(60.0, retry_delay_seconds * 2)
+
+    async def log_sink_loop(self, log_queue: asyncio.Queue[tuple[int | None, list[str]]], spool: Spool | None, update_display: typing.Callable[[list[str], typing.Callable[[list[str]], None] | None], typing.Awaitable[bool | None]], display_name: str) -> None:
+        """
+        Passes each batch of logs from `log_queue` on to `update_display`.
+
+        With a `spool`, the batches waiting in `log_queue` are sent together (up to `self.spool_replay_batch_lines` lines) and acknowledged once Discord dealt with them,
+        and spooled logs that weren't sent are sent again (see `replay_spool`) before anything newer is taken off `log_queue`, so everything arrives in order.
+        Without one, batches are only queued to be sent, without waiting for them.
+        """
+        while True:
+            if spool is not None:
+                await self.replay_spool(spool, update_display, display_name)
+
+            sequence_number, new_logs = await log_queue.get()
+
+            try:
+                update_start_time = time.perf_counter()
+                if spool is not None and sequence_number is not None:
+                    spool_entries = [SpoolEntry(sequence_number, new_logs)]
+                    spool_entries_line_count = len(new_logs)
+                    while log_queue.empty() is False and spool_entries_line_count < self.spool_replay_batch_lines:
+                        sequence_number, new_logs = log_queue.get_nowait()
+                        spool_entries.append(SpoolEntry(sequence_number, new_logs))
+                        spool_entries_line_count += len(new_logs)
+
+                    if await self.send_spool_entries(spool, spool_entries, update_display) is True:
+                        logging.debug(f"Sent {display_name} display update successfully.")
+                else:
+                    if await update_display(new_logs, None) is True:
+                        logging.debug(f"Queued {display_name} display update successfully.")
+                metrics.pipeline.discord_update_seconds.observe(time.perf_counter() - update_start_time, self.name, display_name)
+                logging.debug(f"Lines waiting to be sent to each channel: {self.bot_wrapper.get_queue_depths()}")
+            except Exception as exception:
+                logging.error(f"[{self.name}] Unhandled exception updating the {display_name} display! {exception}")
+
+    async def server_log_sink_loop(self) -> None:
+        """Passes each batch of new server logs from the log ingestion loop on to the server logs channel."""
+        await self.log_sink_loop(self.server_log_queue, self.server_log_spool, self.optionally_update_server_log_display, "server_logs")
+
+    async def chat_log_sink_loop(self) -> None:
+        """Passes each batch of new chat logs from the log ingestion loop on to the chat logs channel."""
+        await self.log_sink_loop(self.chat_log_queue, self.chat_log_spool, self.optionally_update_chat_log_display, "chat_logs")
+
+    async def routed_log_sink_loop(self, sink_name: str) -> None:
+        """Passes each batch of server logs routed to the sink `sink_name` from the log ingestion loop on to that sink."""
+        update_display = lambda new_logs, on_delivered: self.optionally_update_routed_log_display(sink_name, new_logs, on_delivered)
+        await self.log_sink_loop(self.routed_log_queues[sink_name], self.routed_log_spools[sink_name], update_display, sink_name)
+
+    async def server_observation_loop(self) -> None:
+        """
+        Observe the server and keep the Discord channels up to date, by running these independently of each other:
+
+        - the status probe loop, pinging the server status (more often while it is busy, less often while it is offline or idle)
+        - the log ingestion loop, reading new server logs as soon as they are noticed
+        - a sink for each Discord display (status, server logs, chat logs, and any other sink logs are routed to), fed by the loops above through bounded queues
+
+        So a slow status ping never delays relaying logs, and a slow Discord channel never delays the others.
+        """
+        if self.log_watcher is not None:
+            self.log_watcher.start()
+
+        # Only when the bridge starts - when the loop is restarted after a failure, the log tailer's position and the spools in memory
+        # are more up to date than the files, and the lines already queued to be sent are still queued
+        did_resume = False
+        if self.is_started is False:
+            # If this script restarted without the server restarting, we don't want to re-send all the logs in latest.log,
+            # so we are keeping a checkpoint of how far into the logs we have sent, and continuing from there.
+            did_resume = await self.resume_from_checkpoint()
+            if did_resume is True:
+                logging.info(f"[{self.name}] Resuming server logs from the saved checkpoint.")
+
+            for spool in (self.server_log_spool, self.chat_log_spool, *self.routed_log_spools.values()):
+                if spool is not None:
+                    unsent_line_count = await spool.load()
+                    if unsent_line_count > 0:
+                        logging.info(f"[{self.name}] Sending {unsent_line_count} line(s) left unsent in {spool.file_name}.")
+
+            self.is_started = True
+
+        if self.is_catch_up_requested is True:
+            # Only once, not every time the loop is restarted
+            self.is_catch_up_requested = False
+            try:
+                await self.catch_up(self.checkpoint_store.written_checkpoint, self.server.log_tailer.get_position().byte_offset if did_resume is True else 0)
+            except Exception as exception:
+                logging.error(f"[{self.name}] Unhandled exception catching up on missed chat logs! {exception}")
+
+        pipeline_tasks = [
+            asyncio.create_task(self.status_probe_loop()),
+            asyncio.create_task(self.log_ingestion_loop()),
+            asyncio.create_task(self.status_display_sink_loop()),
+            asyncio.create_task(self.server_log_sink_loop()),
+            asyncio.create_task(self.chat_log_sink_loop()),
+            *(asyncio.create_task(self.routed_log_sink_loop(sink_name)) for sink_name in self.routed_log_queues),
+        ]
+
+        try:
+            await asyncio.gather(*pipeline_tasks)
+        finally:
+            # If one of them fails, stop the rest too, so the loop can be started again cleanly
+            for pipeline_task in pipeline_tasks:
+                pipeline_task.cancel()
 
         return
 
+    async def observe_server_forever(self, restart_delay_seconds: float = 10.0) -> None:
+        """
+        Runs `self.server_observation_loop`, restarting it after `restart_delay_seconds` if it ever fails, so a problem with this server never stops the bridge (or other servers).
+        """
+        while True:
+            try:
+                await self.server_observation_loop()
+            except Exception as exception:
+                logging.error(f"[{self.name}] Unhandled exception observing the server, restarting in {restart_delay_seconds} seconds! {exception}")
+
+            # Don't leave the checkpoint behind what was read (and spooled) while waiting to restart
+            await self.checkpoint_store.flush()
+
+            await asyncio.sleep(restart_delay_seconds)
+
     async def open_bridge(self) -> None:
         """
         Add the discord bot and the server observation loop to the active event loop and run until interrupted by KeyboardInterrupt.
 
         This is "starting" everything.
         """
+        await open_bridges(self.bot_wrapper.discord_bot, self.discord_token, [self])
 
-        start_bot_task = asyncio.create_task(self.bot_wrapper.discord_bot.start(self.discord_token))
-        start_observation_loop_task = asyncio.create_task(self.server_observation_loop())
-
-        await asyncio.gather(start_bot_task, start_observation_loop_task)
-        
         return
-    
+
+async def open_bridges(discord_bot: Bot, discord_token: str, bridges: list[BotServerBridge], metrics_host: str = "127.0.0.1", metrics_port: int | None = None, loop_watchdog: LoopWatchdog | None = None) -> None:
+    """
+    Start the discord bot (once, however many bridges share it) and every bridge's server observation loop on the active event loop, and run until interrupted by KeyboardInterrupt.
+
+    Each server is observed independently, so a slow or dead server doesn't hold up the others.
+
+    If `metrics_port` isn't None, the metrics (see `metrics.enable_metrics`) are served at `http://{metrics_host}:{metrics_port}/metrics`.
+
+    If `loop_watchdog` isn't None, it watches the event loop, and its report is logged whenever the process gets `SIGUSR1` (where there is one).
+    """
+    if metrics_port is not None:
+        await metrics.pipeline.registry.start_server(metrics_host, metrics_port)
+
+    if loop_watchdog is not None:
+        loop_watchdog.start()
+        if hasattr(signal, "SIGUSR1"):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, loop_watchdog.log_report)
+
+    start_bot_task = asyncio.create_task(discord_bot.start(discord_token))
+    observation_loop_tasks = [asyncio.create_task(bridge.observe_server_forever()) for bridge in bridges]
+
+    try:
+        await asyncio.gather(start_bot_task, *observation_loop_tasks)
+    finally:
+        if loop_watchdog is not None:
+            loop_watchdog.stop()
+        for send_scheduler in {bridge.bot_wrapper.send_scheduler for bridge in bridges}:
+            await send_scheduler.close()
+
+    return
+
 @dataclass
 class ProgramArguments:
     is_debug_mode: bool
+    is_catch_up_mode: bool
+    catch_up_since: str | None
 
 def main():
     argument_parser = argparse.ArgumentParser(
@@ -311,6 +630,8 @@ def main():
         description="Opens a bridge between a Minecraft server, its console, and its chat, and a few Discord channels."
     )
     argument_parser.add_argument("--debug", action="store_true", dest="is_debug_mode")
+    argument_parser.add_argument("--catch-up", action="store_true", dest="is_catch_up_mode", help="Send the chat logs missed since the last run (from the archived logs) before relaying new ones")
+    argument_parser.add_argument("--catch-up-since", type=str, default=None, dest="catch_up_since", help="Send the chat logs since this local time (e.g. 2023-06-01T18:00) before relaying new ones")
 
     # Thanks to https://stackoverflow.com/a/71035314
     program_arguments = ProgramArguments(**vars(argument_parser.parse_args()))
@@ -323,55 +644,155 @@ def main():
     logging.info("Loaded .env file.")
     logging.debug(os.environ)
 
-    server_ip = os.environ["SERVER_IP"]
-    port = int(os.environ["SERVER_PORT"])
-    rcon_port = int(os.environ["RCON_PORT"])
-    rcon_password = os.environ["RCON_PASSWORD"]
-    is_query_enabled = (os.environ["IS_QUERY_ENABLED"].lower() == "true")
-    server_log_file_name = f'{os.environ["SERVER_LOGS_FOLDER"]}/latest.log'
-    processed_server_logs_file_name = f'{os.environ["SERVER_LOGS_FOLDER"]}/saved.log'
-
-    server = observer.Server(
-        ip = server_ip,
-        port = port,
-        rcon_port = rcon_port,
-        rcon_password = rcon_password,
-        is_query_enabled = is_query_enabled,
-        server_log_file_name = server_log_file_name,
-    )
-
-    status_message_channel_id = int(os.environ["STATUS_CHANNEL_ID"])
-    status_message_message_id = int(os.environ["STATUS_MESSAGE_ID"])
-    logs_dump_channel_id = int(os.environ["LOG_DUMP_CHANNEL_ID"])
-    chat_dump_channel_id = int(os.environ["CHAT_DUMP_CHANNEL_ID"])
     discord_token = os.environ["DISCORD_TOKEN"]
     bot_id = int(os.environ["BOT_ID"])
     admin_id = int(os.environ["ADMIN_ID"])
 
-    bot_wrapper = DiscordBotWrapper(
-        status_message_channel_id = status_message_channel_id,
-        status_message_message_id = status_message_message_id,
-        logs_dump_channel_id = logs_dump_channel_id,
-        chat_dump_channel_id = chat_dump_channel_id,
-        bot_id = bot_id,
-        admin_id = admin_id,
-        send_chat_message_callback=server.send_chat_message,
-        run_console_command_callback=server.run_console_command
+    servers_config_file_name = os.environ.get("SERVERS_CONFIG_FILE")
+    checkpoint_interval_seconds = float(os.environ.get("CHECKPOINT_INTERVAL_SECONDS", "5"))
+    log_watch_mode = os.environ.get("LOG_WATCH_MODE", "auto").lower()
+    log_watch_coalesce_seconds = float(os.environ.get("LOG_WATCH_COALESCE_SECONDS", "0.02"))
+    log_watch_poll_interval_seconds = float(os.environ.get("LOG_WATCH_POLL_INTERVAL_SECONDS", "0.25"))
+    max_queued_lines = int(os.environ.get("MAX_QUEUED_LINES", "10000"))
+    status_update_min_interval_seconds = float(os.environ.get("STATUS_UPDATE_MIN_INTERVAL_SECONDS", "5"))
+    max_queued_log_batches = int(os.environ.get("MAX_QUEUED_LOG_BATCHES", "100"))
+    max_server_ping_interval_seconds = os.environ.get("SERVER_PING_MAX_INTERVAL_SECONDS")
+    announced_presence_event_kinds = {event_kind.strip() for event_kind in os.environ.get("PRESENCE_ANNOUNCEMENTS", "").lower().split(",") if event_kind.strip() != ""}
+    if len(announced_presence_event_kinds - set(PRESENCE_EVENT_KINDS)) > 0:
+        raise ValueError(f"Unknown PRESENCE_ANNOUNCEMENTS {', '.join(sorted(announced_presence_event_kinds - set(PRESENCE_EVENT_KINDS)))}, expected some of {', '.join(PRESENCE_EVENT_KINDS)}.")
+    metrics_host = os.environ.get("METRICS_HOST", "127.0.0.1")
+    metrics_port = int(os.environ["METRICS_PORT"]) if "METRICS_PORT" in os.environ else None
+    catch_up_upload_min_lines = int(os.environ.get("CATCH_UP_UPLOAD_MIN_LINES", "200"))
+    chat_relay_coalesce_seconds = float(os.environ.get("CHAT_RELAY_COALESCE_SECONDS", "0.1"))
+    spool_max_bytes = int(os.environ.get("SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+    spool_replay_batch_lines = int(os.environ.get("SPOOL_REPLAY_BATCH_LINES", "1000"))
+    spool_max_delivery_attempts = int(os.environ.get("SPOOL_MAX_DELIVERY_ATTEMPTS", str(DEFAULT_MAX_DELIVERY_ATTEMPTS)))
+    admin_command_timeout_seconds = float(os.environ.get("ADMIN_COMMAND_TIMEOUT_SECONDS", "30"))
+    admin_command_max_concurrent = int(os.environ.get("ADMIN_COMMAND_MAX_CONCURRENT", "2"))
+    admin_command_max_queued = int(os.environ.get("ADMIN_COMMAND_MAX_QUEUED", "10"))
+    loop_watchdog_threshold_seconds = os.environ.get("LOOP_WATCHDOG_THRESHOLD_SECONDS")
+    log_dump_levels = {level.strip() for level in os.environ["LOG_DUMP_LEVELS"].upper().split(",") if level.strip() != ""} if "LOG_DUMP_LEVELS" in os.environ else None
+    catch_up_since = datetime.datetime.fromisoformat(program_arguments.catch_up_since) if program_arguments.catch_up_since is not None else None
+
+    if metrics_port is not None:
+        metrics.enable_metrics()
+
+    if servers_config_file_name is not None:
+        default_server_ping_interval_seconds = os.environ.get("SERVER_PING_MIN_INTERVAL_SECONDS", os.environ.get("SERVER_PING_INTERVAL_SECONDS"))
+        server_configs = load_server_configs(servers_config_file_name, float(default_server_ping_interval_seconds) if default_server_ping_interval_seconds is not None else None)
+    else:
+        server_configs = [ServerConfig.from_env()]
+
+    # Every server shares the one Discord bot (and so one gateway connection), and one queue per Discord channel
+    loop_watchdog = LoopWatchdog(float(loop_watchdog_threshold_seconds)) if loop_watchdog_threshold_seconds is not None else None
+    discord_bot = create_bot(loop_watchdog, admin_id)
+    send_scheduler = SendScheduler(discord_bot.get_channel, max_queued_lines, discord_bot.wait_until_ready)
+
+    bridges: list[BotServerBridge] = []
+    for server_config in server_configs:
+        routing_config = load_routing_config(server_config.log_routes_file) if server_config.log_routes_file is not None else None
+        routing_table = RoutingTable(routing_config.routes) if routing_config is not None else RoutingTable()
+        log_sinks = {
+            sink_name: send_scheduler.get_webhook_send_queue(sink_config.webhook_url, sink_config.use_player_names) if sink_config.webhook_url is not None else send_scheduler.get_channel_send_queue(sink_config.channel_id)
+            for sink_name, sink_config in routing_config.sinks.items()
+        } if routing_config is not None else {}
+        chat_classifier = ChatClassifier(ChatClassifier.load_rules(server_config.chat_rules_file)) if server_config.chat_rules_file is not None else ChatClassifier()
+        # The default chat rules leave out `<PikaGoku> hello` chat, which is all posting under player names changes
+        chat_sink_config = routing_config.sinks.get(CHAT_SINK) if routing_config is not None else None
+        if chat_sink_config is not None and chat_sink_config.use_player_names is True and chat_classifier.is_chat_body("<PikaGoku> hello") is False:
+            logging.warning(f"[{server_config.name}] The chat sink posts under player names, but the chat rules leave out player chat like `<PikaGoku> hello`, so it never will - set a CHAT_RULES_FILE without the `angle_brackets` rule.")
+
+        server = observer.Server(
+            name = server_config.name,
+            ip = server_config.server_ip,
+            port = server_config.server_port,
+            rcon_port = server_config.rcon_port,
+            rcon_password = server_config.rcon_password,
+            is_query_enabled = server_config.is_query_enabled,
+            server_log_file_name = server_config.server_log_file_name,
+            chat_relay_coalesce_seconds = chat_relay_coalesce_seconds,
+            # Only a backstop: the admin command executor's timeout always goes first, so the admin is told the command took too long
+            console_command_timeout_seconds = admin_command_timeout_seconds + 5.0
+        )
+
+        bot_wrapper = DiscordBotWrapper(
+            status_message_channel_id = server_config.status_channel_id,
+            status_message_message_id = server_config.status_message_id,
+            logs_dump_channel_id = server_config.log_dump_channel_id,
+            chat_dump_channel_id = server_config.chat_dump_channel_id,
+            bot_id = bot_id,
+            admin_id = admin_id,
+            send_chat_message_callback=server.send_chat_message,
+            run_console_command_callback=server.run_console_command,
+            max_queued_lines = max_queued_lines,
+            status_update_min_interval_seconds = status_update_min_interval_seconds,
+            discord_bot = discord_bot,
+            send_scheduler = send_scheduler,
+            server_name = server_config.name,
+            log_sinks = log_sinks,
+            admin_command_executor = AdminCommandExecutor(server.run_console_command, admin_command_max_concurrent, admin_command_max_queued, admin_command_timeout_seconds)
+        )
+
+        bridge = BotServerBridge(
+            bot_wrapper = bot_wrapper,
+            discord_token = discord_token,
+            server = server,
+            server_observation_loop_interval_seconds=server_config.server_ping_interval_seconds,
+            checkpoint_store = CheckpointStore(server_config.checkpoint_file_name, checkpoint_interval_seconds),
+            chat_classifier = chat_classifier,
+            log_watcher = LogWatcher(
+                log_file_name = server_config.server_log_file_name,
+                coalesce_seconds = log_watch_coalesce_seconds,
+                poll_interval_seconds = log_watch_poll_interval_seconds,
+                is_inotify_allowed = (log_watch_mode != "poll")
+            ) if log_watch_mode != "off" else None,
+            max_queued_log_batches = max_queued_log_batches,
+            max_server_observation_loop_interval_seconds = float(max_server_ping_interval_seconds) if max_server_ping_interval_seconds is not None else max(30.0, server_config.server_ping_interval_seconds),
+            name = server_config.name,
+            announced_presence_event_kinds = announced_presence_event_kinds,
+            is_catch_up_requested = program_arguments.is_catch_up_mode,
+            catch_up_since = catch_up_since,
+            catch_up_upload_min_lines = catch_up_upload_min_lines,
+            server_log_spool = Spool(server_config.get_spool_file_name("server_logs"), spool_max_bytes, max_delivery_attempts=spool_max_delivery_attempts) if spool_max_bytes > 0 else None,
+            chat_log_spool = Spool(server_config.get_spool_file_name("chat_logs"), spool_max_bytes, max_delivery_attempts=spool_max_delivery_attempts) if spool_max_bytes > 0 else None,
+            spool_replay_batch_lines = spool_replay_batch_lines,
+            log_dump_levels = log_dump_levels,
+            routing_table = routing_table,
+            routed_log_spools = {sink_name: Spool(server_config.get_spool_file_name(sink_name), spool_max_bytes, max_delivery_attempts=spool_max_delivery_attempts) for sink_name in routing_table.sink_names - {LOG_DUMP_SINK}} if spool_max_bytes > 0 else None
+        )
+        bridges.append(bridge)
+
+    logging.info(f"Observing {len(bridges)} server(s): {', '.join(bridge.name for bridge in bridges)}")
+
+    metrics.pipeline.registry.callback_gauge(
+        "bridge_send_queue_depth", "Lines waiting to be sent to each Discord channel.", ("channel",),
+        lambda: {(str(channel_id),): queue_depth for channel_id, queue_depth in send_scheduler.get_queue_depths().items()}
     )
-
-    server_observation_loop_interval_seconds = int(os.environ["SERVER_PING_INTERVAL_SECONDS"])
-    
-    bridge = BotServerBridge(
-        bot_wrapper = bot_wrapper,
-        discord_token = discord_token,
-        server = server,
-        server_observation_loop_interval_seconds=server_observation_loop_interval_seconds,
-        processed_server_logs_file_name = processed_server_logs_file_name
+    metrics.pipeline.registry.callback_gauge(
+        "bridge_pipeline_queue_depth", "Items waiting in each queue between a server's observation loops and its Discord sinks.", ("server", "queue"),
+        lambda: {
+            (bridge.name, queue_name): queue.qsize()
+            for bridge in bridges
+            for queue_name, queue in (("status", bridge.status_queue), ("server_logs", bridge.server_log_queue), ("chat_logs", bridge.chat_log_queue), *bridge.routed_log_queues.items())
+        }
+    )
+    spools = [(bridge.name, display_name, spool) for bridge in bridges for display_name, spool in (("server_logs", bridge.server_log_spool), ("chat_logs", bridge.chat_log_spool), *bridge.routed_log_spools.items()) if spool is not None]
+    metrics.pipeline.registry.callback_gauge(
+        "bridge_spool_pending_lines", "Spooled lines not sent to Discord yet.", ("server", "display"),
+        lambda: {(server_name, display_name): spool.pending_line_count for server_name, display_name, spool in spools}
+    )
+    metrics.pipeline.registry.callback_gauge(
+        "bridge_spool_file_bytes", "Size of each spool file (including sent lines not compacted away yet).", ("server", "display"),
+        lambda: {(server_name, display_name): spool.file_size for server_name, display_name, spool in spools}
+    )
+    metrics.pipeline.registry.callback_gauge(
+        "bridge_spool_dropped_lines", "Unsent lines dropped because the spool was full, Discord refused them, or sending them failed too many times.", ("server", "display"),
+        lambda: {(server_name, display_name): spool.dropped_line_count for server_name, display_name, spool in spools}
     )
 
     try:
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(bridge.open_bridge())
+        loop.run_until_complete(open_bridges(discord_bot, discord_token, bridges, metrics_host, metrics_port, loop_watchdog))
         loop.close()
     except KeyboardInterrupt:
         logging.info("Received KeyboardInterrupt. Closing bridge...")
@@ -0,0 +1,249 @@
+import json
+import re
+import typing
+from dataclasses import dataclass
+from log_parser import LOG_HEADER_PATTERN, LogRecord
+
+@dataclass
+class ChatRule:
+    name: str
+    pattern: str
+    is_excluded: bool = True
+
+@dataclass
+class ClassifiedLog:
+    timestamp: str | None
+    thread: str
+    level: str
+    body: str
+    rule_name: str | None
+    is_chat: bool
+
+# The rules are matched against the part of a `[Server thread/INFO]` log after the `[Server thread/INFO]: ` prefix
+DEFAULT_CHAT_RULES: list[ChatRule] = [
+    # Anything with both a < and a > in it (in either order) is left out - including player chat like `<PikaGoku> hello`,
+    # so a chat sink posting under player names (see `routing.SinkConfig.use_player_names`) needs chat rules without this one
+    ChatRule("angle_brackets", r"<[^>]*>|>[^<]*<"),
+    # [13:13:49] [Server thread/INFO]: PikaGoku lost connection: Disconnected
+    ChatRule("lost_connection", r"lost connection"),
+    # [13:14:12] [Server thread/INFO]: PikaGoku[/83.221.231.202:1342] logged in with entity id 511 at (-9.837644089959465, 124.0, 100.14206735043899)
+    ChatRule("logged_in", r"logged in with entity id"),
+    # [13:22:08] [Server thread/INFO]: There are 1 of a max of 30 players online: PikaGoku
+    ChatRule("player_list", r"There are.*a max of.*players online"),
+    # [12:54:39] [Server thread/INFO]: [Dynmap] Added 18 custom biome mappings
+    ChatRule("dynmap", r"\[Dynmap\]"),
+    # [12:54:39] [Server thread/INFO]: Starting minecraft server version 1.18.2
+    ChatRule("starting_server_version", r"Starting minecraft server"),
+    # [12:54:39] [Server thread/INFO]: Loading properties
+    ChatRule("loading_properties", r"Loading properties"),
+    # [12:54:39] [Server thread/INFO]: Default game type: SURVIVAL
+    ChatRule("default_game_type", r"Default game type:"),
+    # [12:54:39] [Server thread/INFO]: Generating keypair
+    ChatRule("generating_keypair", r"Generating keypair"),
+    # [12:54:39] [Server thread/INFO]: Starting Minecraft server on 51.81.64.4:25565
+    ChatRule("starting_server_address", r"Starting Minecraft server"),
+    # [12:54:39] [Server thread/INFO]: Using epoll channel type
+    ChatRule("channel_type", r"channel type"),
+    # [12:54:39] [Server thread/INFO]: Preparing level "fabric_1_18_2_1755343"
+    ChatRule("preparing_level", r"Preparing level"),
+    # [12:54:48] [Server thread/INFO]: Preparing start region for dimension minecraft:overworld
+    ChatRule("preparing_start_region", r"Preparing start region"),
+    # [12:54:57] [Server thread/INFO]: Time elapsed: 8900 ms
+    ChatRule("time_elapsed", r"Time elapsed:"),
+    # [12:54:57] [Server thread/INFO]: Done (17.860s)! For help, type "help"
+    ChatRule("startup_done", r"For help, type"),
+    # [12:54:57] [Server thread/INFO]: Starting GS4 status listener
+    ChatRule("status_listener", r"status listener"),
+    # [12:54:57] [Server thread/INFO]: Thread Query Listener started
+    ChatRule("query_listener", r"Thread Query Listener"),
+    # [12:54:57] [Server thread/INFO]: Starting remote control listener
+    ChatRule("remote_control_listener", r"Starting remote control listener"),
+    # [12:54:57] [Server thread/INFO]: Thread RCON Listener started
+    ChatRule("rcon_listener", r"Thread RCON Listener"),
+    # [12:54:57] [Server thread/INFO]: RCON running on 51.81.64.4:25575
+    ChatRule("rcon_running", r"RCON running on"),
+    # [16:48:04] [Server thread/INFO]: Unknown or incomplete command, see below for error
+    ChatRule("unknown_command", r"Unknown or incomplete command"),
+    # [16:48:04] [Server thread/INFO]: STOP<--[HERE]
+    ChatRule("command_error_marker", r"\[HERE\]"),
+    # [16:48:06] [Server thread/INFO]: Stopping the server
+    ChatRule("stopping_the_server", r"Stopping the server"),
+    # [16:48:07] [Server thread/INFO]: Stopping server
+    ChatRule("stopping_server", r"Stopping server"),
+    # [16:48:07] [Server thread/INFO]: Saving players
+    ChatRule("saving_players", r"Saving players"),
+    # [16:48:07] [Server thread/INFO]: Saving worlds
+    ChatRule("saving_worlds", r"Saving worlds"),
+    # [16:48:08] [Server thread/INFO]: Saving chunks for level 'ServerLevel[world]'/minecraft:overworld
+    ChatRule("saving_chunks", r"Saving chunks for level"),
+    # [16:48:09] [Server thread/INFO]: ThreadedAnvilChunkStorage (world): All chunks are saved
+    ChatRule("chunks_saved", r"ThreadedAnvilChunkStorage"),
+    # [Server thread/INFO]: Made PikaGoku a server operator
+    ChatRule("made_operator", r"a server operator"),
+    # [Server thread/INFO]: [PikaGoku: Gave 1 [Acacia Boat] to PikaGoku]
+    # [Server thread/INFO]: [PikaGoku: Killed PikaGoku]
+    # This pattern continues for all operator commands
+    # Anything with a [, a ] and a ": " in it (in any order) is left out - each alternative starts at whichever of them comes first
+    ChatRule("operator_command", r"\[(?=.*: )(?=.*\])|: (?=.*\[)(?=.*\])|\](?=.*\[)(?=.*: )"),
+]
+
+class ChatClassifier:
+    chat_thread: str
+    chat_level: str
+    chat_prefix: str
+    rules: list[ChatRule]
+    header_pattern: re.Pattern
+    compiled_rules: list[tuple[ChatRule, re.Pattern]]
+    rules_pattern: re.Pattern | None
+    is_every_rule_excluded: bool
+
+    # [13:13:49] [Server thread/INFO]: <body> (see `log_parser.LOG_HEADER_PATTERN`)
+    HEADER_PATTERN = LOG_HEADER_PATTERN.pattern
+
+    def __init__(self, rules: list[ChatRule] = DEFAULT_CHAT_RULES, chat_thread: str = "Server thread", chat_level: str = "INFO") -> None:
+        """
+        Initialize `ChatClassifier` object, compiling all of the `rules` into one regular expression.
+
+        :param list rules: The rules to classify logs with, default `DEFAULT_CHAT_RULES`
+        :param str chat_thread: Only logs from this thread can be chat logs, default "Server thread"
+        :param str chat_level: Only logs with this level can be chat logs, default "INFO"
+
+        A log from the right thread and level is a chat log unless the first rule matching its body (the one matching earliest in the body) is excluded.
+        Rule patterns can't use numbered backreferences or inline flags, since they are combined into one pattern.
+        """
+        self.chat_thread = chat_thread
+        self.chat_level = chat_level
+        self.chat_prefix = f"[{chat_thread}/{chat_level}]: "
+        self.rules = rules
+
+        self.header_pattern = re.compile(self.HEADER_PATTERN)
+
+        # The rules are joined into one alternation as they are - wrapping each one in a group would stop `re` from skipping ahead to where a rule could start.
+        # The alternation tries rules in order at each position, so the rule that matched is the first one that also matches on its own where the match starts.
+        self.compiled_rules = [(rule, re.compile(rule.pattern)) for rule in rules]
+        self.rules_pattern = re.compile("|".join(rule.pattern for rule in rules)) if len(rules) > 0 else None
+        self.is_every_rule_excluded = all(rule.is_excluded is True for rule in rules)
+
+    @staticmethod
+    def load_rules(rules_file_name: str) -> list[ChatRule]:
+        """
+        Reads a list of rules from the JSON file `rules_file_name` and returns them.
+
+        The file should contain a list of objects like `{"name": "dynmap", "pattern": "\\\\[Dynmap\\\\]", "is_excluded": true}` (`is_excluded` defaults to true).
+        """
+        with open(rules_file_name, "r") as rules_file:
+            rule_records: list[dict[str, typing.Any]] = json.load(rules_file)
+
+        rules = [ChatRule(name=str(record["name"]), pattern=str(record["pattern"]), is_excluded=bool(record.get("is_excluded", True))) for record in rule_records]
+
+        return rules
+
+    def find_rule(self, body: str, match_start: int) -> ChatRule | None:
+        """Returns the first rule that matches `body` starting at `match_start` (where `self.rules_pattern` matched)."""
+        for rule, compiled_rule in self.compiled_rules:
+            if compiled_rule.match(body, match_start) is not None:
+                return rule
+
+        return None
+
+    def match_rule(self, body: str) -> ChatRule | None:
+        """Returns the rule matching earliest in `body` (the first of them in `self.rules` if several match there), or None if no rule matches."""
+        if self.rules_pattern is None:
+            return None
+
+        rule_match = self.rules_pattern.search(body)
+        if rule_match is None:
+            return None
+
+        return self.find_rule(body, rule_match.start())
+
+    def classify(self, log: str) -> ClassifiedLog | None:
+        """
+        Splits `log` into its timestamp, thread, level and body and decides whether it is a chat log, reporting which rule matched (if any).
+
+        Returns None if `log` doesn't look like a server log.
+        """
+        header_match = self.header_pattern.match(log)
+        if header_match is None:
+            return None
+
+        thread, level = header_match.group("thread", "level")
+        body = log[header_match.end():]
+
+        rule: ChatRule | None = None
+        is_chat = False
+        if thread == self.chat_thread and level == self.chat_level:
+            rule = self.match_rule(body)
+            is_chat = rule is None or rule.is_excluded is False
+
+        classified_log = ClassifiedLog(
+            timestamp = header_match.group("timestamp"),
+            thread = thread,
+            level = level,
+            body = body,
+            rule_name = rule.name if rule is not None else None,
+            is_chat = is_chat
+        )
+
+        return classified_log
+
+    def classify_logs(self, logs: typing.Iterable[str]) -> typing.Iterator[ClassifiedLog]:
+        """Classifies each of `logs` in order, skipping the ones that don't look like server logs."""
+        for log in logs:
+            classified_log = self.classify(log)
+            if classified_log is not None:
+                yield classified_log
+
+    def extract_chat_logs(self, logs: typing.Iterable[str]) -> list[str]:
+        """
+        From `logs`, returns the bodies of the ones that are chat logs.
+
+        Does the same as `classify_logs` without building a `ClassifiedLog` for every log, since this runs on every new log.
+        """
+        chat_logs: list[str] = []
+
+        for log in logs:
+            # Cheap check first - most logs aren't from the chat thread and level
+            if self.chat_prefix not in log:
+                continue
+
+            header_match = self.header_pattern.match(log)
+            if header_match is None or header_match.group("thread") != self.chat_thread or header_match.group("level") != self.chat_level:
+                continue
+
+            body = log[header_match.end():]
+            if self.is_chat_body(body) is True:
+                chat_logs.append(body)
+
+        return chat_logs
+
+    def is_chat_body(self, body: str) -> bool:
+        """Returns True if `body` (of a log from the chat thread and level) is a chat log, i.e. the first rule matching it isn't an exclusion (or none match)."""
+        rule_match = self.rules_pattern.search(body) if self.rules_pattern is not None else None
+        if rule_match is None:
+            return True
+
+        # Which rule matched only matters if some rules aren't exclusions
+        if self.is_every_rule_excluded is True:
+            return False
+        rule = self.find_rule(body, rule_match.start())
+
+        return rule is None or rule.is_excluded is False
+
+    def extract_chat_records(self, log_records: typing.Iterable[LogRecord]) -> list[str]:
+        """
+        From `log_records` (see `log_parser.LogParser`), returns the bodies of the ones that are chat logs, using the thread and level they were parsed with.
+
+        Only the first line of an entry can be chat - lines continuing it (or an entry from an earlier batch) never are.
+        """
+        chat_logs: list[str] = []
+
+        for log_record in log_records:
+            if log_record.is_continuation is True or log_record.thread != self.chat_thread or log_record.level != self.chat_level:
+                continue
+
+            body = log_record.first_line_body if log_record.line_count > 1 else log_record.body
+            if self.is_chat_body(body) is True:
+                chat_logs.append(body)
+
+        return chat_logs
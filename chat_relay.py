@@ -0,0 +1,188 @@
+import asyncio
+import collections
+import json
+import logging
+import time
+import typing
+from dataclasses import dataclass
+import metrics
+from rcon_client import MAX_COMMAND_PAYLOAD_SIZE
+
+TELLRAW_COMMAND_PREFIX = "/tellraw @a "
+SENDER_NAME_COLOR = "aqua"
+
+@dataclass
+class PendingChatMessage:
+    sender_name: str
+    message_contents: str
+    # Resolved with whether every part of the message was delivered
+    delivery_future: asyncio.Future[bool]
+
+def encode_text_component(text: str, color: str | None = None) -> str:
+    """Returns the JSON of a text component showing `text` (in `color`, if given), escaped by a real JSON encoder so quotes and backslashes can't break the command."""
+    text_component: dict[str, str] = {"text": text}
+    if color is not None:
+        text_component["color"] = color
+
+    return json.dumps(text_component, ensure_ascii=False, separators=(",", ":"))
+
+def encode_chat_message(sender_name: str, message_contents: str) -> str:
+    """Returns the text components (joined with commas) of one chat message: the sender's name in color, then the message."""
+    return f"{encode_text_component(f'[{sender_name}] ', SENDER_NAME_COLOR)},{encode_text_component(message_contents)}"
+
+def build_tellraw_command(encoded_chat_messages: list[str]) -> str:
+    """Returns a `/tellraw` command showing every one of `encoded_chat_messages` (see `encode_chat_message`), each on its own line."""
+    line_break = encode_text_component("\n")
+    return TELLRAW_COMMAND_PREFIX + '[""' + "".join(f",{line_break},{encoded_chat_message}" if index > 0 else f",{encoded_chat_message}" for index, encoded_chat_message in enumerate(encoded_chat_messages)) + "]"
+
+def get_command_size(encoded_chat_messages: list[str]) -> int:
+    return len(build_tellraw_command(encoded_chat_messages).encode("utf-8"))
+
+def split_chat_message(sender_name: str, message_contents: str, max_command_size: int = MAX_COMMAND_PAYLOAD_SIZE) -> list[str]:
+    """
+    Encodes one chat message (see `encode_chat_message`), split over as many parts as it takes for each to fit in a `/tellraw` command of `max_command_size` bytes.
+
+    Raises `ValueError` if even the sender's name doesn't fit.
+    """
+    encoded_chat_message = encode_chat_message(sender_name, message_contents)
+    if get_command_size([encoded_chat_message]) <= max_command_size:
+        return [encoded_chat_message]
+
+    available_size = max_command_size - get_command_size([encode_chat_message(sender_name, "")])
+    if available_size <= 0:
+        raise ValueError(f"The sender name {sender_name!r} is too long to fit in a command.")
+
+    # Split on characters, counting each one as the bytes it takes once escaped
+    encoded_chat_messages: list[str] = []
+    part_start = 0
+    part_size = 0
+    for index, character in enumerate(message_contents):
+        character_size = len(json.dumps(character, ensure_ascii=False)[1:-1].encode("utf-8"))
+        if part_size + character_size > available_size:
+            encoded_chat_messages.append(encode_chat_message(sender_name, message_contents[part_start:index]))
+            part_start = index
+            part_size = 0
+        part_size += character_size
+    encoded_chat_messages.append(encode_chat_message(sender_name, message_contents[part_start:]))
+
+    return encoded_chat_messages
+
+class ChatRelay:
+    send_command: typing.Callable[[str], typing.Awaitable[str]]
+    coalesce_seconds: float
+    max_command_size: int
+    server_name: str
+    pending_messages: collections.deque[PendingChatMessage]
+    messages_queued: asyncio.Event
+    flush_task: asyncio.Task | None
+
+    def __init__(self, send_command: typing.Callable[[str], typing.Awaitable[str]], coalesce_seconds: float = 0.1, max_command_size: int = MAX_COMMAND_PAYLOAD_SIZE, server_name: str = "") -> None:
+        """
+        Initialize `ChatRelay` object, which sends chat messages to the server as `/tellraw` commands.
+
+        :param Callable send_command: Sends a console command to the server (e.g. `RconClient.command`), raising if it fails.
+        :param float coalesce_seconds: How long to wait for more messages after one arrives, so a burst of them goes in one command, default 0.1
+        :param int max_command_size: The longest command the server accepts, in bytes, default `MAX_COMMAND_PAYLOAD_SIZE`
+        :param str server_name: The name of the server in metrics, default ""
+
+        Messages are sent in the order they arrive, as many to a command as fit. A message too long for one command is split over several.
+        """
+        self.send_command = send_command
+        self.coalesce_seconds = coalesce_seconds
+        self.max_command_size = max_command_size
+        self.server_name = server_name
+
+        self.pending_messages = collections.deque()
+        self.messages_queued = asyncio.Event()
+        self.flush_task = None
+
+    def submit(self, sender_name: str, message_contents: str) -> asyncio.Future[bool]:
+        """
+        Queues a chat message to be sent with the next flush, starting the flush task if it isn't running.
+
+        Returns a future resolved with True once the whole message was delivered, or False if any part of it couldn't be.
+        """
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush_pending_messages())
+
+        delivery_future = asyncio.get_running_loop().create_future()
+        self.pending_messages.append(PendingChatMessage(sender_name, message_contents, delivery_future))
+        self.messages_queued.set()
+
+        return delivery_future
+
+    async def send(self, sender_name: str, message_contents: str) -> bool:
+        """Sends a chat message with the next flush (see `submit`), returning True once it was delivered, False if it couldn't be."""
+        return await self.submit(sender_name, message_contents)
+
+    def _take_commands(self) -> tuple[list[str], list[PendingChatMessage]]:
+        """
+        Takes as many pending messages (from the front of the queue) as fit into one command, returning the commands to send and the messages taken.
+
+        A message too long for a command on its own is taken alone, and split over as many commands as it takes.
+        """
+        encoded_chat_messages: list[str] = []
+        taken_messages: list[PendingChatMessage] = []
+
+        while len(self.pending_messages) > 0:
+            pending_message = self.pending_messages[0]
+            try:
+                message_parts = split_chat_message(pending_message.sender_name, pending_message.message_contents, self.max_command_size)
+            except ValueError as exception:
+                logging.error(f"Can't send a chat message to the server: {exception}")
+                self.pending_messages.popleft()
+                pending_message.delivery_future.set_result(False)
+                continue
+
+            if len(message_parts) > 1:
+                if len(taken_messages) > 0:
+                    break
+                self.pending_messages.popleft()
+                return [build_tellraw_command([message_part]) for message_part in message_parts], [pending_message]
+
+            if len(encoded_chat_messages) > 0 and get_command_size(encoded_chat_messages + message_parts) > self.max_command_size:
+                break
+
+            self.pending_messages.popleft()
+            encoded_chat_messages.extend(message_parts)
+            taken_messages.append(pending_message)
+
+        if len(taken_messages) == 0:
+            return [], []
+
+        return [build_tellraw_command(encoded_chat_messages)], taken_messages
+
+    async def _send(self, command: str) -> bool:
+        """Sends one command, returning True if it was sent successfully, False otherwise."""
+        did_send_successfully = True
+
+        command_start_time = time.perf_counter()
+        try:
+            await self.send_command(command)
+        except Exception as exception:
+            did_send_successfully = False
+            metrics.pipeline.rcon_command_failures_total.inc(self.server_name, "chat")
+            logging.error(f"Unhandled exception sending chat messages to the server: {exception}")
+        metrics.pipeline.rcon_command_seconds.observe(time.perf_counter() - command_start_time, self.server_name, "chat")
+
+        return did_send_successfully
+
+    async def _flush_pending_messages(self) -> None:
+        """Sends pending messages in order, as few commands as possible per flush, until cancelled."""
+        while True:
+            await self.messages_queued.wait()
+            # Messages arriving while waiting here go into the same command
+            await asyncio.sleep(self.coalesce_seconds)
+            self.messages_queued.clear()
+
+            while len(self.pending_messages) > 0:
+                commands, taken_messages = self._take_commands()
+
+                did_send_successfully = True
+                for command in commands:
+                    logging.debug(command)
+                    did_send_successfully = await self._send(command) and did_send_successfully
+
+                for pending_message in taken_messages:
+                    if pending_message.delivery_future.done() is False:
+                        pending_message.delivery_future.set_result(did_send_successfully)
@@ -0,0 +1,169 @@
+import aiofiles
+import aiofiles.os
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import typing
+from dataclasses import dataclass
+from log_tailer import LogPosition
+
+def hash_log_line(log_line: str) -> str:
+    """Returns a short, stable hash of `log_line` (ignoring its trailing new line) for recognizing it later without storing it."""
+    return hashlib.sha1(log_line.rstrip("\n").encode("utf-8")).hexdigest()
+
+@dataclass
+class LogCheckpoint:
+    file_identity: tuple[int, int] | None
+    byte_offset: int
+    line_count: int
+    last_line_hash: str | None
+
+    @staticmethod
+    def from_log_position(log_position: LogPosition) -> "LogCheckpoint":
+        """Creates a `LogCheckpoint` recording `log_position`, keeping only a hash of its last line."""
+        return LogCheckpoint(
+            file_identity = log_position.file_identity,
+            byte_offset = log_position.byte_offset,
+            line_count = log_position.line_count,
+            last_line_hash = hash_log_line(log_position.last_line) if log_position.last_line is not None else None
+        )
+
+    def is_last_line(self, log_line: str | None) -> bool:
+        """Returns True if `log_line` is the last line this checkpoint was taken after, False otherwise."""
+        if log_line is None or self.last_line_hash is None:
+            return log_line is None and self.last_line_hash is None
+
+        return hash_log_line(log_line) == self.last_line_hash
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "file_identity": list(self.file_identity) if self.file_identity is not None else None,
+            "byte_offset": self.byte_offset,
+            "line_count": self.line_count,
+            "last_line_hash": self.last_line_hash,
+        })
+
+    @staticmethod
+    def from_json(checkpoint_json: str) -> "LogCheckpoint":
+        """Parses a checkpoint written by `to_json`. Raises `ValueError`/`KeyError`/`TypeError` if it is malformed."""
+        checkpoint_record = json.loads(checkpoint_json)
+        file_identity = checkpoint_record["file_identity"]
+        return LogCheckpoint(
+            file_identity = (int(file_identity[0]), int(file_identity[1])) if file_identity is not None else None,
+            byte_offset = int(checkpoint_record["byte_offset"]),
+            line_count = int(checkpoint_record["line_count"]),
+            last_line_hash = checkpoint_record["last_line_hash"]
+        )
+
+class CheckpointStore:
+    file_name: str
+    min_write_interval_seconds: float
+    last_write_time: float | None
+    written_checkpoint: LogCheckpoint | None
+    pending_checkpoint: LogCheckpoint | None
+    before_write: typing.Callable[[], typing.Awaitable[None]] | None
+
+    def __init__(self, file_name: str, min_write_interval_seconds: float = 5.0, before_write: typing.Callable[[], typing.Awaitable[None]] | None = None) -> None:
+        """
+        Initialize `CheckpointStore` object.
+
+        :param str file_name: The location/file name of the checkpoint file.
+        :param float min_write_interval_seconds: The minimum time between two writes of the checkpoint file, default 5.0
+        :param before_write: Awaited before each write of the checkpoint file, e.g. to make sure what the checkpoint moves past is on disk first, default None
+
+        Checkpoints saved more often than that are held in memory and written once the interval has passed (or on `flush`).
+        """
+        self.file_name = file_name
+        self.min_write_interval_seconds = min_write_interval_seconds
+        self.before_write = before_write
+        self.last_write_time = None
+        self.written_checkpoint = None
+        self.pending_checkpoint = None
+
+    async def load(self) -> LogCheckpoint | None:
+        """
+        Reads the checkpoint from the file specified by `self.file_name` and returns it.
+
+        Returns None if the file does not exist or can't be parsed.
+        """
+        checkpoint = None
+
+        try:
+            async with aiofiles.open(self.file_name, "r") as checkpoint_file:
+                checkpoint = LogCheckpoint.from_json(await checkpoint_file.read())
+        except FileNotFoundError as exception:
+            logging.info(f"Checkpoint file {self.file_name} not found, starting without one. {exception}")
+        except Exception as exception:
+            logging.error(f"Unhandled exception reading checkpoint file! {exception}")
+
+        self.written_checkpoint = checkpoint
+
+        return checkpoint
+
+    async def _write(self, checkpoint: LogCheckpoint) -> bool:
+        """
+        Writes `checkpoint` to a temporary file and renames it over `self.file_name`, so the checkpoint file is always either the old or the new checkpoint in full.
+
+        Returns True if the write was successful, False otherwise.
+        """
+        did_write_successfully = True
+        temporary_file_name = f"{self.file_name}.tmp"
+
+        try:
+            async with aiofiles.open(temporary_file_name, "w") as temporary_file:
+                await temporary_file.write(checkpoint.to_json())
+                await temporary_file.flush()
+                await asyncio.to_thread(os.fsync, temporary_file.fileno())
+            await aiofiles.os.replace(temporary_file_name, self.file_name)
+        except Exception as exception:
+            logging.error(f"Unhandled exception writing checkpoint file! {exception}")
+            did_write_successfully = False
+
+        return did_write_successfully
+
+    async def save(self, checkpoint: LogCheckpoint) -> bool | None:
+        """
+        Saves `checkpoint`, writing it to disk if at least `self.min_write_interval_seconds` have passed since the last write.
+
+        Returns the result of the write if one happened, or None if the checkpoint was unchanged or is being held until the interval passes.
+        """
+        if checkpoint == self.written_checkpoint:
+            self.pending_checkpoint = None
+            return None
+
+        self.pending_checkpoint = checkpoint
+
+        if self.last_write_time is not None and time.monotonic() - self.last_write_time < self.min_write_interval_seconds:
+            return None
+
+        return await self.flush()
+
+    async def flush(self) -> bool | None:
+        """
+        Writes the pending checkpoint (if there is one) regardless of when the last write was.
+
+        Returns the result of the write if one happened, or None if there was nothing to write.
+        """
+        if self.pending_checkpoint is None:
+            return None
+
+        checkpoint = self.pending_checkpoint
+        self.last_write_time = time.monotonic()
+        if self.before_write is not None:
+            try:
+                await self.before_write()
+            except Exception as exception:
+                # Don't move the checkpoint past something that might not be on disk
+                logging.error(f"Unhandled exception before writing checkpoint file! {exception}")
+                return False
+        did_write_successfully = await self._write(checkpoint)
+
+        if did_write_successfully is True:
+            self.written_checkpoint = checkpoint
+            if self.pending_checkpoint is checkpoint:
+                self.pending_checkpoint = None
+
+        return did_write_successfully
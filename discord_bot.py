@@ -5,27 +5,23 @@ from disnake.message import Message
 import platform
 import os
 import observer
+from send_scheduler import DELIVERY_FAILED, ChannelSendQueue, SendScheduler
+from routing import CHAT_SINK, LOG_DUMP_SINK
+from admin_console import AdminCommandExecutor
+from loop_watchdog import LoopWatchdog
+import log_packer
+import metrics
 import logging
 import asyncio
 import typing
+import hashlib
+import io
+import re
+import time
 
-bot_intents = disnake.Intents.default()
-bot_intents.message_content = True
-bot = Bot(command_prefix="!observer ", intents=bot_intents)
-bot.remove_command("help")
+# DM this (after the server name, with several servers) to cancel the admin's console commands that are still running or waiting
+CANCEL_ADMIN_COMMANDS = "!cancel"
 
-@bot.event
-async def on_ready() -> None:
-    """
-    The code in this event is executed when the bot is ready
-    """
-    print(f"Logged in as {bot.user.name}")
-    print(f"disnake API version: {disnake.__version__}")
-    print(f"Python version: {platform.python_version()}")
-    print(f"Running on: {platform.system()} {platform.release()} ({os.name})")
-    print("-------------------")
-
-@bot.slash_command(name="create_status_display_message", description="Sends a message in this channel that can be used as the status display message.")
 async def create_status_message(interaction: disnake.ApplicationCommandInteraction) -> None:
     """
     A command that responds in the channel with a message that can be used as the status display message.
@@ -41,6 +37,57 @@ async def create_status_message(interaction: disnake.ApplicationCommandInteracti
     except Exception as exception:
         logging.error(f"Unhandled exception sending 'Hello': {exception}")
 
+async def send_loop_stall_report(interaction: disnake.ApplicationCommandInteraction, loop_watchdog: LoopWatchdog, admin_id: int | None) -> None:
+    """A command that responds (only visibly to whoever used it) with the loop watchdog's report of what has been holding up the event loop."""
+    try:
+        if admin_id is not None and interaction.author.id != admin_id:
+            await interaction.response.send_message("Only the admin can see this.", ephemeral=True)
+            return
+
+        stall_report = loop_watchdog.format_report()
+        if len(stall_report) + 6 <= 2000:
+            await interaction.response.send_message(f"```\n{stall_report}```", ephemeral=True)
+        else:
+            await interaction.response.send_message(file=disnake.File(io.BytesIO(stall_report.encode("utf-8")), filename="loop_stalls.txt"), ephemeral=True)
+    except Exception as exception:
+        logging.error(f"Unhandled exception sending the loop stall report: {exception}")
+
+def create_bot(loop_watchdog: LoopWatchdog | None = None, admin_id: int | None = None) -> Bot:
+    """
+    Creates the Discord bot, with its commands and events. It doesn't connect to anything until it is started (`Bot.start`).
+
+    Created on demand rather than when this module is imported, so it is made on the event loop it runs on.
+
+    :param LoopWatchdog loop_watchdog: If given, the bot gets a `/loop_stall_report` command showing its report, default None
+    :param int admin_id: The ID of the only Discord user who can use `/loop_stall_report`, default None (anyone)
+    """
+    bot_intents = disnake.Intents.default()
+    bot_intents.message_content = True
+    discord_bot = Bot(command_prefix="!observer ", intents=bot_intents)
+    discord_bot.remove_command("help")
+
+    async def on_ready() -> None:
+        """
+        The code in this event is executed when the bot is ready
+        """
+        print(f"Logged in as {discord_bot.user.name}")
+        print(f"disnake API version: {disnake.__version__}")
+        print(f"Python version: {platform.python_version()}")
+        print(f"Running on: {platform.system()} {platform.release()} ({os.name})")
+        print("-------------------")
+        logging.info(f"Connected to Discord {time.monotonic() - metrics.launch_time:.2f} seconds after launch.")
+
+    discord_bot.add_listener(on_ready, "on_ready")
+    discord_bot.slash_command(name="create_status_display_message", description="Sends a message in this channel that can be used as the status display message.")(create_status_message)
+
+    if loop_watchdog is not None:
+        async def loop_stall_report(interaction: disnake.ApplicationCommandInteraction) -> None:
+            await send_loop_stall_report(interaction, loop_watchdog, admin_id)
+
+        discord_bot.slash_command(name="loop_stall_report", description="Shows what has been holding up the bridge's event loop.")(loop_stall_report)
+
+    return discord_bot
+
 class DiscordBotWrapper:
     discord_bot: Bot
     status_message_channel_id: int
@@ -49,9 +96,23 @@ class DiscordBotWrapper:
     chat_dump_channel_id: int
     bot_id: int
     admin_id: int
+    server_name: str | None
+    send_scheduler: SendScheduler
+    # Where logs routed to each sink are sent (see `routing.RoutingTable`), other than the log dump and chat channels
+    log_sinks: dict[str, ChannelSendQueue]
+    status_update_min_interval_seconds: float
+    status_message: Message | None
+    status_display_fingerprint: str | None
+    pending_status_display_content: str | None
+    last_status_edit_time: float | None
+    status_update_task: asyncio.Task | None
     # send_chat_message_callback: typing.Callable[[str, str], typing.Awaitable[bool]]
     send_chat_message_callback: typing.Callable[[str, str], typing.Awaitable[bool]]
     run_console_command_callback: typing.Callable[[str], typing.Awaitable[str | None]]
+    admin_command_executor: AdminCommandExecutor
+    max_admin_response_pages: int
+    # Kept so they aren't garbage collected while they run
+    admin_command_tasks: set[asyncio.Task]
 
     def __init__(
             self, status_message_channel_id: int,
@@ -61,7 +122,15 @@ class DiscordBotWrapper:
             bot_id: int,
             admin_id: int,
             send_chat_message_callback: typing.Callable[[str, str], typing.Awaitable[bool]],
-            run_console_command_callback: typing.Callable[[str], typing.Awaitable[str | None]]
+            run_console_command_callback: typing.Callable[[str], typing.Awaitable[str | None]],
+            max_queued_lines: int = 10000,
+            status_update_min_interval_seconds: float = 5.0,
+            discord_bot: Bot | None = None,
+            send_scheduler: SendScheduler | None = None,
+            server_name: str | None = None,
+            log_sinks: dict[str, ChannelSendQueue] | None = None,
+            admin_command_executor: AdminCommandExecutor | None = None,
+            max_admin_response_pages: int = 3
         ) -> None:
         """
         Initializing the DiscordBotWrapper object.
@@ -72,9 +141,19 @@ class DiscordBotWrapper:
         :param int chat_dump_channel_id: The ID of the channel in which chat logs should be dumped (and messages from this channel will be sent to the server).
         :param int bot_id: The ID of the Discord user of the bot itself.
         :param int admin_id: The ID of the Discord user who should be able to DM the bot and have those DMs work as server commands sent straight to the server console.
+        :param int max_queued_lines: How many lines can be waiting to be sent to one channel before sending more lines waits for them, default 10000
+        :param float status_update_min_interval_seconds: The minimum time between two edits of the status message, default 5.0
+        :param Bot discord_bot: The Discord bot to use, default None (a new one, see `create_bot`) - several wrappers (one per server) can share one bot
+        :param SendScheduler send_scheduler: The scheduler to queue outgoing logs with, default None (a new one) - wrappers sharing a bot should share this too
+        :param str server_name: The name of the server this wrapper is for when there are several, default None (the only server) - if set, the admin's DMs
+            are only run as commands on this server if they start with its name (e.g. `survival list`)
+        :param dict log_sinks: The queues (from `send_scheduler`, e.g. a webhook's) logs routed to each sink are sent through, default None (none) -
+            one named `log_dump` or `chat` replaces the log dump or chat channel
+        :param AdminCommandExecutor admin_command_executor: Runs the admin's console commands, default None (a new one running `run_console_command_callback`)
+        :param int max_admin_response_pages: The most messages a console command's response is sent as - a longer one is attached as a file instead, default 3
 
         """
-        self.discord_bot = bot
+        self.discord_bot = discord_bot if discord_bot is not None else create_bot()
 
         self.status_message_channel_id = status_message_channel_id
         self.status_message_message_id = status_message_message_id
@@ -82,139 +161,332 @@ class DiscordBotWrapper:
         self.chat_dump_channel_id = chat_dump_channel_id
         self.bot_id = bot_id
         self.admin_id = admin_id
+        self.server_name = server_name
+
+        self.send_scheduler = send_scheduler if send_scheduler is not None else SendScheduler(self.discord_bot.get_channel, max_queued_lines, self.discord_bot.wait_until_ready)
+        self.log_sinks = log_sinks if log_sinks is not None else {}
+
+        self.status_update_min_interval_seconds = status_update_min_interval_seconds
+        self.status_message = None
+        self.status_display_fingerprint = None
+        self.pending_status_display_content = None
+        self.last_status_edit_time = None
+        self.status_update_task = None
 
         self.send_chat_message_callback = send_chat_message_callback
         self.run_console_command_callback = run_console_command_callback
+        self.admin_command_executor = admin_command_executor if admin_command_executor is not None else AdminCommandExecutor(run_console_command_callback)
+        self.max_admin_response_pages = max_admin_response_pages
+        self.admin_command_tasks = set()
+
+        # Handle messages (as a listener rather than with `@bot.event`, so every wrapper sharing the bot gets them)
+        self.discord_bot.add_listener(self.on_message, "on_message")
+
+    def get_admin_console_command(self, message_content: str) -> str | None:
+        """
+        Returns the console command the admin's DM `message_content` should run on this wrapper's server, or None if it isn't meant for this server.
+
+        Without a `self.server_name` every DM is a command. With one, the DM has to start with the server name, which is stripped off.
+        """
+        if self.server_name is None:
+            return message_content
 
-        # Handle messages
-        @bot.event
-        async def on_message(message: disnake.Message) -> None:
-            if message.guild is None and message.author.id == self.admin_id:
-                # Run message as a command
-                console_command_feedback = await self.run_console_command_callback(message.content)
-
-                if console_command_feedback is None:
-                    console_command_feedback = "An error occurred."
-                
-                try:
-                    response_send_response = await message.channel.send(console_command_feedback)
-                except Exception as exception:
-                    logging.error(f"Unhandled exception when responding to admin's console command direct message: {exception}")
+        target_server_name, _, console_command = message_content.partition(" ")
+        if target_server_name != self.server_name:
+            return None
+
+        return console_command
+
+    async def on_message(self, message: disnake.Message) -> None:
+        if message.guild is None and message.author.id == self.admin_id:
+            console_command = self.get_admin_console_command(message.content)
+            if console_command is None:
                 return
-            
-            if message.channel.id == self.chat_dump_channel_id and message.author.id != self.bot_id:
-                # Send message to server
-                logging.debug(message)
-                message_send_response = await self.send_chat_message_callback(message.author.name, message.clean_content)
 
-                # NOTE: Maybe do something with the response here?
+            if console_command.strip() == CANCEL_ADMIN_COMMANDS:
+                cancelled_command_count = self.admin_command_executor.cancel_all()
+                await self.send_admin_response(message.channel, f"Cancelled {cancelled_command_count} console command(s).")
                 return
 
+            # Run message as a command, in the background so a slow command doesn't hold up the next message
+            admin_command_task = asyncio.create_task(self.run_admin_command(message.channel, console_command))
+            self.admin_command_tasks.add(admin_command_task)
+            admin_command_task.add_done_callback(self.admin_command_tasks.discard)
+            return
+        
+        # Webhook posts are left out too, since the chat sink can be a webhook posting the server's own chat here (which would be sent straight back)
+        if message.channel.id == self.chat_dump_channel_id and message.author.id != self.bot_id and message.webhook_id is None:
+            # Send message to server
+            logging.debug(message)
+            message_send_response = await self.send_chat_message_callback(message.author.name, message.clean_content)
+
+            # NOTE: Maybe do something with the response here?
             return
 
-    async def update_status_display(self, status_information: observer.ServerStatusResponse) -> bool:
-        """Use information from the provided `status_information` to craft a message and edit the message specified by `self.status_message_message_id`."""
-        did_update_successfully = False
+        return
+
+    async def run_admin_command(self, channel: disnake.abc.Messageable, console_command: str) -> bool:
+        """
+        Runs the admin's `console_command` (see `AdminCommandExecutor`) and sends the response (or what went wrong) to `channel`.
+
+        Returns True if the response was sent successfully, False otherwise.
+        """
+        command_result = await self.admin_command_executor.run(console_command)
+
+        # Named after the command, e.g. `datapack.txt`, in case it has to be attached
+        command_name = re.sub(r"[^A-Za-z0-9_-]", "_", console_command.strip().lstrip("/").split(" ", 1)[0])[:32]
+        did_respond_successfully = await self.send_admin_response(channel, command_result.describe(), f"{command_name or 'response'}.txt")
+
+        return did_respond_successfully
+
+    async def send_admin_response(self, channel: disnake.abc.Messageable, response: str, file_name: str = "response.txt", max_message_size: int = 2000) -> bool:
+        """
+        Sends `response` to the admin's DM `channel`, split over as few messages of at most `max_message_size` as it takes (see `log_packer.pack_logs`),
+        or attached as the file `file_name` if that would take more than `self.max_admin_response_pages` messages.
+
+        With several servers, each message starts with the name of the server.
+
+        Returns True if the response was sent successfully, False otherwise.
+        """
+        did_send_successfully = False
+        message_prefix = f"[{self.server_name}] " if self.server_name is not None else ""
 
         try:
-            # Try loading message from cache first
-            status_message = self.discord_bot.get_message(self.status_message_message_id)
-            # If message was not in cache, load it 
-            if status_message is None:
-                logging.debug("Status message not found in bot cache.")
-                channel = self.discord_bot.get_channel(self.status_message_channel_id)
-                assert type(channel) == TextChannel, "The status message channel ID should be the ID of a text channel."
-                status_message = await channel.fetch_message(self.status_message_message_id)
+            response_pages = list(log_packer.pack_logs(response.split("\n"), max_message_size - len(message_prefix)))
+            if len(response_pages) <= self.max_admin_response_pages:
+                for response_page in response_pages:
+                    await channel.send(message_prefix + response_page)
             else:
-                logging.debug("Status message successfully loaded from bot cache!")
-            new_message_content = ""
-            server_status_content = f"Server Status: {'Online :white_check_mark:' if status_information.is_online is True else 'Offline :no_entry_sign:'}\n"
-            new_message_content += server_status_content
-
-            if status_information.is_online == True:
-                version_content = f"Version: {status_information.version}\n"
-                new_message_content += version_content
-                player_list_content = ""
-                if status_information.online_player_count == 0:
-                    player_list_content = "Nobody is online...\n"
-                else:
-                    player_list_content = "Players Online:\n" + "\n".join([f'**{player_name}**' for player_name in status_information.online_player_names])
-                new_message_content += player_list_content
-
-            new_message = await status_message.edit(new_message_content)
-            # did_update_successfully = (new_message.content == new_message_content) # Not doing this because maybe Discord edits a message slightly (Markup or something) and that's shouldn't be considered a failure to update the message
+                response_file = disnake.File(io.BytesIO(response.encode("utf-8")), filename=file_name)
+                await channel.send(content=f"{message_prefix}The response is {len(response)} characters long, so here it is as a file:", file=response_file)
+            did_send_successfully = True
+        except Exception as exception:
+            logging.error(f"Unhandled exception when responding to admin's console command direct message: {exception}")
+
+        return did_send_successfully
+
+    @staticmethod
+    def render_status_display(status_information: observer.ServerStatusResponse) -> str:
+        """
+        Crafts the content of the status message from the provided `status_information` and returns it.
+
+        Players are listed in alphabetical order, so the same players online always render the same way.
+        """
+        new_message_content = ""
+        server_status_content = f"Server Status: {'Online :white_check_mark:' if status_information.is_online is True else 'Offline :no_entry_sign:'}\n"
+        new_message_content += server_status_content
+
+        if status_information.is_online == True:
+            version_content = f"Version: {status_information.version}\n"
+            new_message_content += version_content
+            player_list_content = ""
+            if status_information.online_player_count == 0:
+                player_list_content = "Nobody is online...\n"
+            else:
+                player_list_content = "Players Online:\n" + "\n".join([f'**{player_name}**' for player_name in sorted(status_information.online_player_names, key=str.lower)])
+            new_message_content += player_list_content
+
+        return new_message_content
+
+    @staticmethod
+    def fingerprint_status_display(status_display_content: str) -> str:
+        """Returns a fingerprint of the rendered status message content, for telling whether an edit would change anything."""
+        return hashlib.sha1(status_display_content.encode("utf-8")).hexdigest()
+
+    async def get_status_message(self) -> Message:
+        """
+        Returns the status message specified by `self.status_message_message_id`, fetching it only if it isn't already cached.
+        """
+        if self.status_message is not None:
+            return self.status_message
+
+        # Try loading message from the bot's cache first
+        status_message = self.discord_bot.get_message(self.status_message_message_id)
+        # If message was not in cache, load it 
+        if status_message is None:
+            logging.debug("Status message not found in bot cache.")
+            channel = self.discord_bot.get_channel(self.status_message_channel_id)
+            assert type(channel) == TextChannel, "The status message channel ID should be the ID of a text channel."
+            status_message = await channel.fetch_message(self.status_message_message_id)
+        else:
+            logging.debug("Status message successfully loaded from bot cache!")
+
+        self.status_message = status_message
+
+        return status_message
+
+    async def edit_status_display(self, new_message_content: str) -> bool:
+        """
+        Edits the message specified by `self.status_message_message_id` to have `new_message_content`.
+
+        Returns True if the message was edited successfully, False otherwise.
+        """
+        did_update_successfully = False
+
+        try:
+            status_message = await self.get_status_message()
+            edit_start_time = time.perf_counter()
+            self.status_message = await status_message.edit(new_message_content)
+            metrics.pipeline.discord_send_seconds.observe(time.perf_counter() - edit_start_time, str(self.status_message_channel_id))
+            # Not checking new_message.content == new_message_content because maybe Discord edits a message slightly (Markup or something) and that's shouldn't be considered a failure to update the message
             did_update_successfully = True
+            self.status_display_fingerprint = self.fingerprint_status_display(new_message_content)
         except Exception as exception:
+            # The cached message may be the problem (e.g. it was deleted), so fetch it again next time
+            self.status_message = None
             logging.error(f"Unhandled exception when trying to update status display! {exception}")
 
         return did_update_successfully
-    
-    @staticmethod
-    def condense_logs(logs: list[str], max_message_size: int = 2000) -> list[str]:
+
+    async def update_status_display(self, status_information: observer.ServerStatusResponse) -> bool:
+        """Use information from the provided `status_information` to craft a message and edit the message specified by `self.status_message_message_id`."""
+        did_update_successfully = await self.edit_status_display(self.render_status_display(status_information))
+
+        return did_update_successfully
+
+    def request_status_display_update(self, status_information: observer.ServerStatusResponse) -> bool:
         """
-        Condense the lines in `logs` into a smaller number of elements of maximum size `max_message_size` - each line is still separated by a new line.
+        Schedules an edit of the status message to show `status_information`, unless the rendered message would be the same as what it already shows.
+
+        Edits happen at most once every `self.status_update_min_interval_seconds` - if several updates are requested in between, only the latest one is applied.
 
-        By default the `max_message_size` is 2000 because I remember that's what Discord says it is.
+        Returns True if an edit was scheduled, False if the message already shows (or is about to show) this content.
         """
-        condensed_messages: list[str] = []
-        while len(logs) > 0:
-            condensed_message = ""
-            while len(logs) > 0 and len(condensed_message) + len(logs[0] + "\n") < max_message_size:
-                condensed_message += (logs.pop(0) + "\n")
-            condensed_messages.append(condensed_message)
+        new_message_content = self.render_status_display(status_information)
+        new_message_fingerprint = self.fingerprint_status_display(new_message_content)
+
+        if self.pending_status_display_content is not None:
+            if self.fingerprint_status_display(self.pending_status_display_content) == new_message_fingerprint:
+                return False
+        elif new_message_fingerprint == self.status_display_fingerprint:
+            return False
+
+        self.pending_status_display_content = new_message_content
+
+        if self.status_update_task is None or self.status_update_task.done():
+            self.status_update_task = asyncio.create_task(self.apply_status_display_updates())
+
+        return True
 
-        return condensed_messages
-    
-    async def update_server_log_display(self, new_server_logs: list[str]) -> bool:
+    async def apply_status_display_updates(self) -> None:
+        """Applies pending status message edits, waiting out `self.status_update_min_interval_seconds` between edits, until none are pending."""
+        # The status message can't be edited until the bot has connected
+        await self.discord_bot.wait_until_ready()
+
+        while self.pending_status_display_content is not None:
+            if self.last_status_edit_time is not None:
+                delay_seconds = self.last_status_edit_time + self.status_update_min_interval_seconds - time.monotonic()
+                if delay_seconds > 0:
+                    await asyncio.sleep(delay_seconds)
+
+            # Whatever was requested most recently wins
+            new_message_content = self.pending_status_display_content
+            self.pending_status_display_content = None
+
+            if self.fingerprint_status_display(new_message_content) == self.status_display_fingerprint:
+                continue
+
+            self.last_status_edit_time = time.monotonic()
+            did_update_successfully = await self.edit_status_display(new_message_content)
+            if did_update_successfully is True:
+                logging.debug("Updated status display successfully.")
+            elif self.pending_status_display_content is None:
+                # Try again after the interval, unless something newer came in meanwhile
+                self.pending_status_display_content = new_message_content
+
+    def get_queue_depths(self) -> dict[int, int]:
+        """Returns how many lines are waiting to be sent to each channel."""
+        return self.send_scheduler.get_queue_depths()
+
+    def get_log_sink(self, sink_name: str) -> ChannelSendQueue:
         """
-        Sends the `new_server_logs` messages to the Discord channel specified by `self.logs_dump_channel_id` in as few messages as possible (via `condense_logs`).
+        Returns the queue logs routed to the sink `sink_name` are sent through: the one given for it in `self.log_sinks`,
+        or else the log dump or chat channel's for `log_dump` and `chat`.
 
-        Returns True if the display was successfully updated, False otherwise.
+        Raises `KeyError` if there is no such sink.
         """
-        did_update_successfully = True
+        if sink_name in self.log_sinks:
+            return self.log_sinks[sink_name]
+        if sink_name == LOG_DUMP_SINK:
+            return self.send_scheduler.get_channel_send_queue(self.logs_dump_channel_id)
+        if sink_name == CHAT_SINK:
+            return self.send_scheduler.get_channel_send_queue(self.chat_dump_channel_id)
+
+        raise KeyError(f"No log sink named {sink_name!r}.")
+
+    async def queue_sink_lines(self, log_sink: ChannelSendQueue | str, lines: list[str], on_delivered: typing.Callable[[list[str]], None] | None = None) -> bool:
+        """
+        Queues `lines` to be sent through `log_sink` (or the sink with that name, see `get_log_sink`), calling `on_delivered` (if given) with what became of each of them once they were dealt with (see `ChannelSendQueue.enqueue`).
+
+        Returns True if the lines were queued successfully, False otherwise.
+        """
+        did_queue_successfully = True
 
         try:
-            server_logs_display_channel = self.discord_bot.get_channel(self.logs_dump_channel_id)
-            assert type(server_logs_display_channel) == TextChannel, "The server logs dump channel ID should be the ID of a text channel."
-            condensed_server_logs = self.condense_logs(new_server_logs)
-            
-            server_log_write_tasks = [server_logs_display_channel.send(content=log) for log in condensed_server_logs]
-
-            log_update_responses: list[Message | BaseException] = await asyncio.gather(*server_log_write_tasks, return_exceptions=True)
-
-            for response in log_update_responses:
-                if isinstance(response, BaseException):
-                    did_update_successfully = False
-                    logging.error(f"Error when updating server log display: {response}")
+            if isinstance(log_sink, str):
+                log_sink = self.get_log_sink(log_sink)
+            delivery_future = await log_sink.enqueue(lines)
+            if on_delivered is not None:
+                delivery_future.add_done_callback(lambda delivery_future: on_delivered(delivery_future.result()))
         except Exception as exception:
-            did_update_successfully = False
-            logging.error(f"Unhandled exception when trying to update server log display! {exception}")
+            did_queue_successfully = False
+            logging.error(f"Unhandled exception when trying to queue lines for {log_sink if isinstance(log_sink, str) else log_sink.channel_label}! {exception}")
+            if on_delivered is not None:
+                on_delivered([DELIVERY_FAILED] * len(lines))
+
+        return did_queue_successfully
+
+    async def update_server_log_display(self, new_server_logs: list[str], on_delivered: typing.Callable[[list[str]], None] | None = None) -> bool:
+        """
+        Queues the `new_server_logs` messages to be sent to the Discord channel specified by `self.logs_dump_channel_id` (see `SendScheduler`), or the `log_dump` sink replacing it.
+
+        They are sent in order, packed into as few messages as possible, as fast as the channel's rate limit allows.
+        If too many lines are already waiting to be sent, this waits until there is room for them.
+        `on_delivered` (if given) is called with what became of each of them (see `ChannelSendQueue.enqueue`), once they were dealt with.
+
+        Returns True if the logs were queued successfully, False otherwise.
+        """
+        did_update_successfully = await self.queue_sink_lines(LOG_DUMP_SINK, new_server_logs, on_delivered)
 
         return did_update_successfully
 
-    async def update_chat_log_display(self, new_chat_logs: list[str]) -> bool:
+    async def update_chat_log_display(self, new_chat_logs: list[str], on_delivered: typing.Callable[[list[str]], None] | None = None) -> bool:
         """
-        Sends the `new_chat_logs` messages to the Discord channel specified by `self.chat_dump_channel_id` in as few messages as possible (via `condense_logs`).
+        Queues the `new_chat_logs` messages to be sent to the Discord channel specified by `self.chat_dump_channel_id` (see `SendScheduler`), or the `chat` sink replacing it.
 
-        Returns True if the display was successfully updated, False otherwise.
+        They are sent in order, packed into as few messages as possible, as fast as the channel's rate limit allows.
+        If too many lines are already waiting to be sent, this waits until there is room for them.
+        `on_delivered` (if given) is called with what became of each of them (see `ChannelSendQueue.enqueue`), once they were dealt with.
+
+        Returns True if the logs were queued successfully, False otherwise.
         """
-        did_update_successfully = True
+        did_update_successfully = await self.queue_sink_lines(CHAT_SINK, new_chat_logs, on_delivered)
+
+        return did_update_successfully
+
+    async def upload_chat_log_file(self, file_name: str, chat_logs: list[str]) -> bool:
+        """
+        Sends `chat_logs` to the Discord channel specified by `self.chat_dump_channel_id` as one attached file named `file_name`, for when there are too many to send as messages.
+
+        Waits for the chat logs already queued to be sent first, so everything stays in order.
+
+        Returns True if the file was sent successfully, False otherwise.
+        """
+        did_upload_successfully = False
 
         try:
-            chat_logs_display_channel = self.discord_bot.get_channel(self.chat_dump_channel_id)
-            assert type(chat_logs_display_channel) == TextChannel, "The chat logs dump channel ID should be the ID of a text channel."
-            condensed_server_logs = self.condense_logs(new_chat_logs)
-            
-            chat_log_write_tasks = [chat_logs_display_channel.send(content=log) for log in condensed_server_logs]
-
-            chat_log_update_responses: list[Message | BaseException] = await asyncio.gather(*chat_log_write_tasks, return_exceptions=True)
-
-            for response in chat_log_update_responses:
-                if isinstance(response, BaseException):
-                    did_update_successfully = False
-                    logging.error(f"Error when updating chat log display: {response}")
+            await self.get_log_sink(CHAT_SINK).wait_until_sent()
+            await self.discord_bot.wait_until_ready()
+            channel = self.discord_bot.get_channel(self.chat_dump_channel_id)
+            assert type(channel) == TextChannel, "The chat dump channel ID should be the ID of a text channel."
+
+            chat_log_file = disnake.File(io.BytesIO("\n".join(chat_logs).encode("utf-8")), filename=file_name)
+            send_start_time = time.perf_counter()
+            await channel.send(content=f"{len(chat_logs)} chat messages from {file_name}:", file=chat_log_file)
+            metrics.pipeline.discord_send_seconds.observe(time.perf_counter() - send_start_time, str(self.chat_dump_channel_id))
+            metrics.pipeline.discord_messages_sent_total.inc(str(self.chat_dump_channel_id))
+            did_upload_successfully = True
         except Exception as exception:
-            did_update_successfully = False
-            logging.error(f"Unhandled exception when trying to update chat log display! {exception}")
+            logging.error(f"Unhandled exception when trying to upload chat logs file! {exception}")
 
-        return did_update_successfully
+        return did_upload_successfully
@@ -0,0 +1,20 @@
+class LogLine:
+    """One line of the server logs, without its line break. Slotted, since there can be a lot of them."""
+    __slots__ = ("line_number", "text")
+
+    line_number: int
+    text: str
+
+    def __init__(self, line_number: int, text: str) -> None:
+        """
+        :param int line_number: Which line of the log file this is, counting from 1
+        :param str text: The line itself, without its line break
+        """
+        self.line_number = line_number
+        self.text = text
+
+    def __repr__(self) -> str:
+        return f"LogLine({self.line_number}, {self.text!r})"
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, LogLine) and self.line_number == other.line_number and self.text == other.text
@@ -0,0 +1,82 @@
+import re
+import typing
+
+CODE_BLOCK_FENCE = "```"
+# Put between the backticks of a fence inside a log so it doesn't close the code block the log is in
+ZERO_WIDTH_SPACE = "\u200b"
+BACKTICK_RUN_PATTERN = re.compile(r"`(?=`)")
+
+def split_long_log(log: str, max_length: int) -> list[str]:
+    """Splits `log` into pieces of at most `max_length` characters (just `[log]` if it already fits)."""
+    if len(log) <= max_length:
+        return [log]
+
+    return [log[piece_start:piece_start + max_length] for piece_start in range(0, len(log), max_length)]
+
+def escape_code_block_fences(log: str) -> str:
+    """Breaks up any code block fences in `log`, so it can't end the code block it is put in."""
+    if CODE_BLOCK_FENCE not in log:
+        return log
+
+    # Separating every two adjacent backticks, so no run of backticks of any length is left
+    return BACKTICK_RUN_PATTERN.sub(f"`{ZERO_WIDTH_SPACE}", log)
+
+def pack_log_messages(logs: typing.Iterable[str], max_message_size: int = 2000, max_lines: int | None = None, code_block_language: str | None = None) -> typing.Iterator[tuple[str, int]]:
+    """
+    Packs the lines in `logs` into as few messages as possible, each line followed by a new line, yielding each message as soon as it is full
+    along with how many of `logs` it finishes (a line split over several messages counts towards the last one).
+
+    Runs in O(total characters) and doesn't modify `logs`, which can be any iterable (including a generator).
+
+    :param Iterable logs: The lines to pack, in order.
+    :param int max_message_size: The maximum size of a message, default 2000 because that's Discord's limit.
+    :param int max_lines: The maximum number of lines in a message, default None (no limit) - a line split into pieces counts once per piece.
+    :param str code_block_language: If not None, each message is wrapped in a code block with this language (use "" for no language),
+        and fences inside the logs are broken up so they can't end it, default None
+
+    Lines too long to fit in a message on their own are split into pieces that do.
+    """
+    message_prefix = ""
+    message_suffix = ""
+    if code_block_language is not None:
+        message_prefix = f"{CODE_BLOCK_FENCE}{code_block_language}\n"
+        message_suffix = CODE_BLOCK_FENCE
+
+    # Room for the lines themselves, including each one's new line
+    line_budget = max_message_size - len(message_prefix) - len(message_suffix)
+    if line_budget < 2:
+        raise ValueError(f"max_message_size {max_message_size} leaves no room for any logs.")
+
+    message_parts: list[str] = []
+    message_size = 0
+    finished_log_count = 0
+
+    for log in logs:
+        if code_block_language is not None:
+            log = escape_code_block_fences(log)
+
+        log_pieces = split_long_log(log, line_budget - 1)
+        for piece_index, log_piece in enumerate(log_pieces):
+            piece_size = len(log_piece) + 1
+            if len(message_parts) > 0 and (message_size + piece_size > line_budget or len(message_parts) == max_lines):
+                yield message_prefix + "".join(message_parts) + message_suffix, finished_log_count
+                message_parts = []
+                message_size = 0
+                finished_log_count = 0
+
+            message_parts.append(log_piece + "\n")
+            message_size += piece_size
+            if piece_index == len(log_pieces) - 1:
+                finished_log_count += 1
+
+    if len(message_parts) > 0:
+        yield message_prefix + "".join(message_parts) + message_suffix, finished_log_count
+
+def pack_logs(logs: typing.Iterable[str], max_message_size: int = 2000, max_lines: int | None = None, code_block_language: str | None = None) -> typing.Iterator[str]:
+    """
+    Packs the lines in `logs` into as few messages as possible, each line followed by a new line, yielding each message as soon as it is full.
+
+    See `pack_log_messages` for the parameters.
+    """
+    for message, _ in pack_log_messages(logs, max_message_size, max_lines, code_block_language):
+        yield message
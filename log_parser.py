@@ -0,0 +1,112 @@
+import re
+import typing
+from log_buffer import LogLine
+
+# [13:13:49] [Server thread/INFO]: <body> (the timestamp is optional, and the body is whatever comes after the match)
+LOG_HEADER_PATTERN = re.compile(r"(?:\[(?P<timestamp>[^\]]*)\] )?\[(?P<thread>[^\]/]+)/(?P<level>[A-Z]+)\]: ")
+
+class LogRecord:
+    """
+    One entry of the server logs: a line with a `[time] [thread/LEVEL]: ` header, plus any lines after it without one (e.g. a stack trace).
+    Slotted, since there can be a lot of them.
+    """
+    __slots__ = ("line_number", "line_count", "text", "timestamp", "thread", "level", "body_start", "is_continuation")
+
+    line_number: int
+    line_count: int
+    # The raw lines of the entry joined with line breaks - for a single line, the line itself rather than a copy of it
+    text: str
+    timestamp: str | None
+    thread: str | None
+    level: str | None
+    # Where the body starts in `text` (0 if there is no header)
+    body_start: int
+    # True if these are lines continuing an entry from an earlier batch of logs (the thread and level are that entry's)
+    is_continuation: bool
+
+    def __init__(self, line_number: int, line_count: int, text: str, timestamp: str | None, thread: str | None, level: str | None, body_start: int, is_continuation: bool = False) -> None:
+        self.line_number = line_number
+        self.line_count = line_count
+        self.text = text
+        self.timestamp = timestamp
+        self.thread = thread
+        self.level = level
+        self.body_start = body_start
+        self.is_continuation = is_continuation
+
+    def __repr__(self) -> str:
+        return f"LogRecord({self.line_number}, {self.text!r})"
+
+    @property
+    def body(self) -> str:
+        """Everything after the header, continuation lines included."""
+        return self.text[self.body_start:] if self.body_start > 0 else self.text
+
+    @property
+    def first_line_body(self) -> str:
+        """The part of the first line after the header."""
+        first_line_end = self.text.find("\n", self.body_start)
+        return self.text[self.body_start:first_line_end] if first_line_end != -1 else self.body
+
+class LogParser:
+    last_timestamp: str | None
+    last_thread: str | None
+    last_level: str | None
+
+    def __init__(self) -> None:
+        """
+        Initialize `LogParser` object, which turns server log lines into `LogRecord`s.
+
+        It remembers the header of the last entry it parsed, so lines continuing it in the next batch of logs are still attributed to its thread and level.
+        """
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the last entry, e.g. when the log file was rotated."""
+        self.last_timestamp = None
+        self.last_thread = None
+        self.last_level = None
+
+    def _make_record(self, log_lines: list[LogLine], header_match: re.Match | None) -> LogRecord:
+        text = log_lines[0].text if len(log_lines) == 1 else "\n".join(log_line.text for log_line in log_lines)
+
+        if header_match is None:
+            return LogRecord(log_lines[0].line_number, len(log_lines), text, self.last_timestamp, self.last_thread, self.last_level, 0, is_continuation=True)
+
+        timestamp, thread, level = header_match.group("timestamp", "thread", "level")
+        self.last_timestamp = timestamp
+        self.last_thread = thread
+        self.last_level = level
+
+        return LogRecord(log_lines[0].line_number, len(log_lines), text, timestamp, thread, level, header_match.end())
+
+    def parse(self, log_lines: typing.Iterable[LogLine]) -> typing.Iterator[LogRecord]:
+        """
+        Yields the entries in `log_lines` (consecutive lines of the log, in order), matching each line's header exactly once.
+
+        An entry is only yielded once the next one starts (or `log_lines` ends), so its continuation lines can be added to it first.
+        """
+        entry_lines: list[LogLine] = []
+        entry_header_match: re.Match | None = None
+
+        for log_line in log_lines:
+            header_match = LOG_HEADER_PATTERN.match(log_line.text)
+            if header_match is not None and len(entry_lines) > 0:
+                yield self._make_record(entry_lines, entry_header_match)
+                entry_lines = []
+
+            if len(entry_lines) == 0:
+                entry_header_match = header_match
+            entry_lines.append(log_line)
+
+        if len(entry_lines) > 0:
+            yield self._make_record(entry_lines, entry_header_match)
+
+def filter_records(log_records: typing.Iterable[LogRecord], levels: set[str] | None = None, threads: set[str] | None = None) -> typing.Iterator[LogRecord]:
+    """Yields the records of `log_records` logged at one of `levels` by one of `threads` (either being None means any)."""
+    for log_record in log_records:
+        if levels is not None and log_record.level not in levels:
+            continue
+        if threads is not None and log_record.thread not in threads:
+            continue
+        yield log_record
@@ -0,0 +1,308 @@
+import aiofiles
+import aiofiles.os
+import asyncio
+import gzip
+import logging
+import os
+import time
+import typing
+from dataclasses import dataclass, field
+
+# How many of the most recently modified files in the log folder to check when looking for the file `latest.log` was rotated into
+MAX_ROTATED_LOG_CANDIDATES = 3
+
+@dataclass
+class LogPosition:
+    file_identity: tuple[int, int] | None = None
+    byte_offset: int = 0
+    line_count: int = 0
+    last_line: str | None = None
+
+@dataclass
+class LogTailResult:
+    new_lines: list[str] = field(default_factory=list)
+    is_rotated: bool = False
+    has_more: bool = False
+
+class LogTailer:
+    file_name: str
+    encoding: str
+    max_read_bytes: int | None
+    rotation_grace_seconds: float
+    file_identity: tuple[int, int] | None
+    byte_offset: int
+    partial_line: bytes
+    line_count: int
+    last_line: str | None
+    rotation_start_time: float | None
+    rotated_log_file: typing.BinaryIO | None
+    is_rotated_log_finished: bool
+
+    def __init__(self, file_name: str, encoding: str = "utf-8", max_read_bytes: int | None = 4 * 1024 * 1024, rotation_grace_seconds: float = 5.0) -> None:
+        """
+        Initialize `LogTailer` object.
+
+        :param str file_name: The location/file name of the log file to tail (e.g. `latest.log`).
+        :param str encoding: The encoding the log file is written in, default utf-8
+        :param int max_read_bytes: The most bytes one call to `read_new_lines` reads, default 4 MiB (None for no limit) - a bigger backlog is read over several calls, so memory use doesn't depend on how much was written
+
+        :param float rotation_grace_seconds: After the file is rotated, how long to keep looking for the file it was rotated into (it may still be being compressed), default 5.0
+
+        The tailer remembers how far into the file it has read, so each call to `read_new_lines` only reads the bytes appended since the previous call.
+
+        When the file is rotated (e.g. Minecraft moving `latest.log` into `2023-06-01-1.log.gz`), the rest of the old file is read
+        from the rotated file first - renamed or gzipped - so nothing written just before the rotation is missed.
+        """
+        self.file_name = file_name
+        self.encoding = encoding
+        self.max_read_bytes = max_read_bytes
+        self.rotation_grace_seconds = rotation_grace_seconds
+
+        self.rotation_start_time = None
+        self.rotated_log_file = None
+        self.is_rotated_log_finished = False
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the read position so the next read starts from the beginning of the file."""
+        self._close_rotated_log_file()
+        self.rotation_start_time = None
+        self.is_rotated_log_finished = False
+        self.file_identity = None
+        self.byte_offset = 0
+        self.partial_line = b""
+        self.line_count = 0
+        self.last_line = None
+
+    def get_position(self) -> LogPosition:
+        """Returns how far into the file the tailer has read, up to the end of the last complete line."""
+        return LogPosition(
+            file_identity = self.file_identity,
+            byte_offset = self.byte_offset - len(self.partial_line),
+            line_count = self.line_count,
+            last_line = self.last_line
+        )
+
+    def set_position(self, position: LogPosition) -> None:
+        """Continue reading from `position` - the next read only returns lines after it."""
+        self.reset()
+        self.file_identity = position.file_identity
+        self.byte_offset = position.byte_offset
+        self.line_count = position.line_count
+        self.last_line = position.last_line
+
+    async def read_line_ending_at(self, byte_offset: int, max_line_length: int = 65536) -> str | None:
+        """
+        Reads the complete line that ends (with its line break) right at `byte_offset` in the current file and returns it.
+
+        Returns None if `byte_offset` is not the end of a line, or the line is longer than `max_line_length` bytes.
+        Reads at most `max_line_length` bytes, no matter how big the file is.
+        """
+        if byte_offset <= 0:
+            return None
+
+        window_start = max(0, byte_offset - max_line_length)
+
+        async with aiofiles.open(self.file_name, "rb") as log_file:
+            await log_file.seek(window_start)
+            window = await log_file.read(byte_offset - window_start)
+
+        return self._find_line_ending_window(window, window_start, byte_offset)
+
+    def _find_line_ending_window(self, window: bytes, window_start: int, byte_offset: int) -> str | None:
+        """Returns the complete line at the end of `window` (the bytes from `window_start` up to `byte_offset` of a file), or None if there isn't one."""
+        if len(window) != byte_offset - window_start or window.endswith(b"\n") is False:
+            return None
+
+        window = window[:-1]
+        line_break_index = window.rfind(b"\n")
+        if line_break_index == -1 and window_start > 0:
+            return None
+
+        return self.decode_line(window[line_break_index + 1:])
+
+    def decode_line(self, raw_line: bytes) -> str:
+        """Decodes a complete raw line (without its line break) into the same form `readlines()` in text mode would produce."""
+        return raw_line.rstrip(b"\r").decode(self.encoding, errors="replace") + "\n"
+
+    def _add_bytes(self, new_bytes: bytes, tail_result: LogTailResult) -> None:
+        """Splits `new_bytes` (read right after everything read so far) into lines, adding the complete ones to `tail_result` and holding back the incomplete one at the end."""
+        self.byte_offset += len(new_bytes)
+
+        raw_lines = (self.partial_line + new_bytes).split(b"\n")
+        # The last element is whatever came after the final line break - an incomplete line (or b"" if the data ended on a line break)
+        self.partial_line = raw_lines.pop()
+
+        new_lines = [self.decode_line(raw_line) for raw_line in raw_lines]
+        tail_result.new_lines.extend(new_lines)
+
+        self.line_count += len(new_lines)
+        if len(new_lines) > 0:
+            self.last_line = new_lines[-1]
+
+    def _close_rotated_log_file(self) -> None:
+        if self.rotated_log_file is not None:
+            self.rotated_log_file.close()
+            self.rotated_log_file = None
+
+    def _open_rotated_log_file(self) -> typing.BinaryIO | None:
+        """
+        Finds the file the log file was rotated into and opens it, positioned right after what was already read. Blocking, so run it in a thread.
+
+        Only the few most recently modified logs in the folder are considered. A file with the old file's identity (renamed but not compressed yet) is used straight away;
+        a gzipped log is used if the line before our position in it is the last line we read. Gzipped logs are decompressed as a stream, never loaded whole.
+
+        Returns None if no such file was found (yet).
+        """
+        folder_name = os.path.dirname(os.path.abspath(self.file_name))
+        log_file_base_name = os.path.basename(self.file_name)
+
+        candidates: list[tuple[float, str, os.stat_result]] = []
+        with os.scandir(folder_name) as folder_entries:
+            for folder_entry in folder_entries:
+                if folder_entry.name != log_file_base_name and (folder_entry.name.endswith(".log") or folder_entry.name.endswith(".log.gz")) and folder_entry.is_file():
+                    file_stats = folder_entry.stat()
+                    candidates.append((file_stats.st_mtime, folder_entry.path, file_stats))
+
+        candidates = sorted(candidates, reverse=True)[:MAX_ROTATED_LOG_CANDIDATES]
+
+        for _, candidate_file_name, file_stats in candidates:
+            if (file_stats.st_dev, file_stats.st_ino) == self.file_identity:
+                rotated_log_file = open(candidate_file_name, "rb")
+                rotated_log_file.seek(self.byte_offset)
+                return rotated_log_file
+
+        # The line we read last, which should end right before the partial line we are holding back
+        complete_byte_offset = self.byte_offset - len(self.partial_line)
+        window_start = max(0, complete_byte_offset - 65536)
+
+        for _, candidate_file_name, _ in candidates:
+            if candidate_file_name.endswith(".gz") is False:
+                continue
+
+            rotated_log_file = gzip.open(candidate_file_name, "rb")
+            try:
+                rotated_log_file.seek(window_start)
+                window = rotated_log_file.read(complete_byte_offset - window_start)
+                if self._find_line_ending_window(window, window_start, complete_byte_offset) == self.last_line:
+                    rotated_log_file.seek(self.byte_offset)
+                    return rotated_log_file
+            except (OSError, EOFError) as exception:
+                # Not a (complete) gzip file, maybe because it is still being written
+                logging.debug(f"Can't read {candidate_file_name} as a rotated log: {exception}")
+
+            rotated_log_file.close()
+
+        return None
+
+    async def _read_rotated_log(self) -> LogTailResult:
+        """
+        Reads the next part of the file the log file was rotated into, from where we were in the log file before it was rotated.
+
+        Once it has all been read, the next call reports the rotation (`is_rotated`) and reading starts over with the new log file.
+        """
+        tail_result = LogTailResult()
+
+        if self.is_rotated_log_finished is True:
+            self.reset()
+            tail_result.is_rotated = True
+            tail_result.has_more = True
+            return tail_result
+
+        if self.rotated_log_file is None:
+            try:
+                self.rotated_log_file = await asyncio.to_thread(self._open_rotated_log_file)
+            except Exception as exception:
+                logging.error(f"Unhandled exception looking for the file {self.file_name} was rotated into! {exception}")
+
+            if self.rotated_log_file is not None:
+                logging.info(f"Reading the rest of {self.file_name} from {self.rotated_log_file.name}, the file it was rotated into.")
+            else:
+                if time.monotonic() - self.rotation_start_time < self.rotation_grace_seconds:
+                    # Try again next time, it may still be being compressed
+                    return tail_result
+
+                logging.warning(f"Couldn't find the file {self.file_name} was rotated into, so anything logged right before it was rotated may be missing.")
+                self.is_rotated_log_finished = True
+                tail_result.has_more = True
+                return tail_result
+
+        try:
+            new_bytes = await asyncio.to_thread(self.rotated_log_file.read, self.max_read_bytes if self.max_read_bytes is not None else -1)
+        except (OSError, EOFError) as exception:
+            logging.warning(f"Error reading the rest of the rotated log file, anything logged right before it was rotated may be missing. {exception}")
+            new_bytes = b""
+
+        self._add_bytes(new_bytes, tail_result)
+
+        if len(new_bytes) == 0 or self.max_read_bytes is None:
+            # The rotated file is complete, so whatever is after its last line break is a whole line too
+            if len(self.partial_line) > 0:
+                self._add_bytes(b"\n", tail_result)
+            self._close_rotated_log_file()
+            self.is_rotated_log_finished = True
+
+        tail_result.has_more = True
+        return tail_result
+
+    def _start_rotation(self) -> bool:
+        """
+        Starts reading the rest of the old log file from the file it was rotated into, if there is anything to read it for.
+
+        Returns True if it was started, False if reading should just restart from the beginning of the new file.
+        """
+        # Without a last line there is nothing to recognise the rotated file by (and nothing read from it yet to lose)
+        if self.byte_offset == 0 or self.last_line is None:
+            return False
+
+        self.rotation_start_time = time.monotonic()
+        return True
+
+    async def read_new_lines(self) -> LogTailResult:
+        """
+        Reads whatever was appended to the file since the last call and returns the complete lines found in it.
+
+        A trailing line without a line break is held back until the rest of it is written.
+        At most `self.max_read_bytes` are read - if more than that was appended, `has_more` is True and the rest is read by the next call.
+
+        If the file was replaced (different inode/device) or truncated (smaller than our offset), the rest of the old file is read first
+        from the file it was rotated into if it can be found (see `_open_rotated_log_file`). Then `is_rotated` is True and reading restarts from the beginning of the new file.
+
+        Raises `FileNotFoundError` if the file does not exist.
+        """
+        if self.rotation_start_time is not None:
+            return await self._read_rotated_log()
+
+        tail_result = LogTailResult()
+
+        file_stats = await aiofiles.os.stat(self.file_name)
+        current_file_identity = (file_stats.st_dev, file_stats.st_ino)
+
+        if self.file_identity is not None and (current_file_identity != self.file_identity or file_stats.st_size < self.byte_offset):
+            # A truncated file may have been copied somewhere first (or a new file may have been given the old one's inode), so look for the rest of it either way
+            if self._start_rotation() is True:
+                return await self._read_rotated_log()
+
+            tail_result.is_rotated = True
+            self.reset()
+
+        self.file_identity = current_file_identity
+
+        # Nothing was appended, so there is nothing to read
+        if file_stats.st_size == self.byte_offset:
+            return tail_result
+
+        async with aiofiles.open(self.file_name, "rb") as log_file:
+            # The file could have been replaced between the stat and the open - make sure we are reading what we stat'd
+            opened_file_stats = os.fstat(log_file.fileno())
+            if (opened_file_stats.st_dev, opened_file_stats.st_ino) != current_file_identity:
+                # The next read will see the new file and handle the rotation
+                return tail_result
+
+            await log_file.seek(self.byte_offset)
+            appended_bytes = await log_file.read(self.max_read_bytes if self.max_read_bytes is not None else -1)
+
+        self._add_bytes(appended_bytes, tail_result)
+        tail_result.has_more = self.byte_offset < file_stats.st_size
+
+        return tail_result
@@ -0,0 +1,168 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+WATCHED_EVENTS_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+class LogWatcher:
+    log_file_name: str
+    coalesce_seconds: float
+    poll_interval_seconds: float
+    is_inotify_allowed: bool
+    mode: str | None
+    change_event: asyncio.Event
+    inotify_file_descriptor: int | None
+    poll_task: asyncio.Task | None
+
+    def __init__(self, log_file_name: str, coalesce_seconds: float = 0.02, poll_interval_seconds: float = 0.25, is_inotify_allowed: bool = True) -> None:
+        """
+        Initialize `LogWatcher` object.
+
+        :param str log_file_name: The location/file name of the log file to watch (e.g. `latest.log`).
+        :param float coalesce_seconds: After a change, how long to wait for more changes before reporting them all as one, default 0.02
+        :param float poll_interval_seconds: How often to check the file for changes when filesystem notifications aren't available, default 0.25
+        :param bool is_inotify_allowed: Whether to use inotify filesystem notifications if they are available, default True
+
+        The folder containing the file is watched rather than the file itself, so the file being replaced (when the server rotates its logs) is noticed too.
+        """
+        self.log_file_name = log_file_name
+        self.coalesce_seconds = coalesce_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.is_inotify_allowed = is_inotify_allowed
+
+        self.mode = None
+        self.change_event = asyncio.Event()
+        self.inotify_file_descriptor = None
+        self.poll_task = None
+
+    def start(self) -> str:
+        """
+        Starts watching the log file with inotify if possible, or by polling it otherwise. Must be called from within the running event loop.
+
+        Returns the mode the watcher is running in ("inotify" or "poll").
+        """
+        if self.mode is not None:
+            return self.mode
+
+        if self.is_inotify_allowed is True and self._start_inotify() is True:
+            self.mode = "inotify"
+        else:
+            self.poll_task = asyncio.create_task(self._poll_log_file())
+            self.mode = "poll"
+
+        logging.info(f"Watching {self.log_file_name} for changes ({self.mode}).")
+
+        return self.mode
+
+    def close(self) -> None:
+        """Stops watching the log file."""
+        if self.inotify_file_descriptor is not None:
+            asyncio.get_running_loop().remove_reader(self.inotify_file_descriptor)
+            os.close(self.inotify_file_descriptor)
+            self.inotify_file_descriptor = None
+
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+            self.poll_task = None
+
+        self.mode = None
+
+    def _start_inotify(self) -> bool:
+        """
+        Sets up an inotify watch on the folder of the log file and registers it with the event loop.
+
+        Returns True if successful, False if inotify isn't available here.
+        """
+        if sys.platform.startswith("linux") is False:
+            return False
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            inotify_file_descriptor = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if inotify_file_descriptor < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+            folder_name = os.path.dirname(os.path.abspath(self.log_file_name))
+            watch_descriptor = libc.inotify_add_watch(inotify_file_descriptor, os.fsencode(folder_name), WATCHED_EVENTS_MASK)
+            if watch_descriptor < 0:
+                os.close(inotify_file_descriptor)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder_name}")
+
+            asyncio.get_running_loop().add_reader(inotify_file_descriptor, self._read_inotify_events)
+            self.inotify_file_descriptor = inotify_file_descriptor
+        except Exception as exception:
+            logging.warning(f"Could not watch the server logs with inotify, falling back to polling. {exception}")
+            return False
+
+        return True
+
+    def _read_inotify_events(self) -> None:
+        """Reads the pending inotify events and flags a change if any of them were about the log file."""
+        try:
+            event_buffer = os.read(self.inotify_file_descriptor, 65536)
+        except BlockingIOError:
+            return
+
+        log_file_base_name = os.fsencode(os.path.basename(self.log_file_name))
+
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(event_buffer):
+            _, mask, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(event_buffer, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            name = event_buffer[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+
+            # On an overflow we don't know what changed, so assume the log file did
+            if mask & IN_Q_OVERFLOW or name == log_file_base_name:
+                self.change_event.set()
+
+    async def _poll_log_file(self) -> None:
+        """With a delay of `self.poll_interval_seconds` between checks, flags a change whenever the log file's identity, size or modification time changes."""
+        previous_file_signature = None
+
+        while True:
+            try:
+                file_stats = os.stat(self.log_file_name)
+                file_signature = (file_stats.st_dev, file_stats.st_ino, file_stats.st_size, file_stats.st_mtime_ns)
+            except FileNotFoundError:
+                file_signature = None
+
+            if file_signature != previous_file_signature:
+                self.change_event.set()
+                previous_file_signature = file_signature
+
+            await asyncio.sleep(self.poll_interval_seconds)
+
+    async def wait_for_change(self, timeout_seconds: float) -> bool:
+        """
+        Waits until the log file changes, or `timeout_seconds` pass.
+
+        Once a change is seen, waits another `self.coalesce_seconds` so a burst of writes is reported as one change.
+
+        Returns True if the log file changed, False if the timeout passed first.
+        """
+        try:
+            await asyncio.wait_for(self.change_event.wait(), timeout_seconds)
+        except asyncio.TimeoutError:
+            return False
+
+        await asyncio.sleep(self.coalesce_seconds)
+        self.change_event.clear()
+
+        return True
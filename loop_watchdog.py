@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+import metrics
+
+# Frames in these files are the bridge's own code, which is where a blocking call is reported as coming from
+PROJECT_FOLDER = os.path.dirname(os.path.abspath(__file__))
+# How many frames of a stalled stack to keep for the report
+MAX_REPORTED_STACK_FRAMES = 12
+
+@dataclass
+class StallSite:
+    # Where the bridge's code was when the event loop was stalled, e.g. `observer.py:208 in ping_server_logs`
+    call_site: str
+    # The innermost frames of the first stack seen stalled here
+    stack: list[str]
+    stall_count: int = 0
+    total_stall_seconds: float = 0.0
+    max_stall_seconds: float = 0.0
+
+def describe_frame(frame_summary: traceback.FrameSummary) -> str:
+    return f"{os.path.relpath(frame_summary.filename, PROJECT_FOLDER) if frame_summary.filename.startswith(PROJECT_FOLDER) else frame_summary.filename}:{frame_summary.lineno} in {frame_summary.name}"
+
+def trim_event_loop_frames(stack: traceback.StackSummary) -> list[traceback.FrameSummary]:
+    """Returns the frames of `stack` inside the callback the event loop is running, leaving out the event loop's own frames around it."""
+    for frame_index in range(len(stack) - 1, -1, -1):
+        if stack[frame_index].name == "_run" and stack[frame_index].filename == asyncio.events.__file__:
+            return list(stack[frame_index + 1:])
+
+    return list(stack)
+
+def find_call_site(stack: traceback.StackSummary) -> str:
+    """Returns the innermost frame of `stack` in the bridge's own code (or the innermost frame, if none of it is), described by `describe_frame`."""
+    for frame_summary in reversed(stack):
+        if frame_summary.filename.startswith(PROJECT_FOLDER) and frame_summary.filename != __file__:
+            return describe_frame(frame_summary)
+
+    return describe_frame(stack[-1]) if len(stack) > 0 else "<unknown>"
+
+class LoopWatchdog:
+    threshold_seconds: float
+    heartbeat_interval_seconds: float
+    check_interval_seconds: float
+    loop_thread_id: int | None
+    last_heartbeat_time: float
+    # The call site sampled during the stall going on now, until the heartbeat comes back and says how long it was
+    pending_stall_site: StallSite | None
+    stall_sites: dict[str, StallSite]
+    unsampled_stall_count: int
+    lock: threading.Lock
+    heartbeat_task: asyncio.Task | None
+    sampler_thread: threading.Thread | None
+    is_stopped: threading.Event
+
+    def __init__(self, threshold_seconds: float = 0.25, heartbeat_interval_seconds: float = 0.05) -> None:
+        """
+        Initialize `LoopWatchdog` object, which notices when something holds the event loop (e.g. a blocking call) and finds out what.
+
+        :param float threshold_seconds: How long the event loop can be held up before it counts as a stall, default 0.25
+        :param float heartbeat_interval_seconds: How often the event loop checks in, default 0.05 - how late it is to do so is the loop lag
+
+        A task on the event loop records the time every `heartbeat_interval_seconds`. A thread watches that time, and once the loop has gone
+        `threshold_seconds` without checking in, takes the event loop thread's stack. The stall is counted against the bridge code on that stack
+        (its call site) once the loop checks in again and how long it was held up is known, so `format_report` can list the worst offenders.
+        """
+        self.threshold_seconds = threshold_seconds
+        self.heartbeat_interval_seconds = heartbeat_interval_seconds
+        self.check_interval_seconds = threshold_seconds / 4
+
+        self.loop_thread_id = None
+        self.last_heartbeat_time = time.monotonic()
+        self.pending_stall_site = None
+        self.stall_sites = {}
+        self.unsampled_stall_count = 0
+        self.lock = threading.Lock()
+        self.heartbeat_task = None
+        self.sampler_thread = None
+        self.is_stopped = threading.Event()
+
+    def start(self) -> None:
+        """Starts watching the running event loop. Call this from a coroutine running on it."""
+        self.loop_thread_id = threading.get_ident()
+        self.last_heartbeat_time = time.monotonic()
+        self.is_stopped.clear()
+
+        self.heartbeat_task = asyncio.create_task(self._beat())
+        self.sampler_thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.sampler_thread.start()
+        logging.info(f"Watching for the event loop being held up for more than {self.threshold_seconds} seconds.")
+
+    def stop(self) -> None:
+        self.is_stopped.set()
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+
+    async def _beat(self) -> None:
+        """Records the time every `self.heartbeat_interval_seconds`, and how late it was to do so, until cancelled."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval_seconds)
+            now = time.monotonic()
+            lag_seconds = max(0.0, now - self.last_heartbeat_time - self.heartbeat_interval_seconds)
+            self.last_heartbeat_time = now
+            metrics.pipeline.event_loop_lag_seconds.observe(lag_seconds)
+
+            if lag_seconds >= self.threshold_seconds:
+                self._record_stall(lag_seconds)
+            elif self.pending_stall_site is not None:
+                # Sampled right as the loop caught up, so it wasn't held up long enough to count
+                with self.lock:
+                    self.pending_stall_site = None
+
+    def _record_stall(self, stall_seconds: float) -> None:
+        with self.lock:
+            stall_site = self.pending_stall_site
+            self.pending_stall_site = None
+
+            if stall_site is None:
+                # Over before the thread got to look at it
+                self.unsampled_stall_count += 1
+                call_site = "<unsampled>"
+            else:
+                stall_site = self.stall_sites.setdefault(stall_site.call_site, stall_site)
+                stall_site.stall_count += 1
+                stall_site.total_stall_seconds += stall_seconds
+                stall_site.max_stall_seconds = max(stall_site.max_stall_seconds, stall_seconds)
+                call_site = stall_site.call_site
+
+        metrics.pipeline.event_loop_stalls_total.inc(call_site)
+        logging.warning(f"The event loop was held up for {stall_seconds:.3f} seconds at {call_site}.")
+
+    def _watch(self) -> None:
+        """Runs in its own thread: takes the event loop thread's stack whenever the loop has gone too long without checking in."""
+        while self.is_stopped.wait(self.check_interval_seconds) is False:
+            if time.monotonic() - self.last_heartbeat_time - self.heartbeat_interval_seconds < self.threshold_seconds:
+                continue
+
+            with self.lock:
+                # Only the first look at each stall counts
+                if self.pending_stall_site is not None:
+                    continue
+
+                loop_frame = sys._current_frames().get(self.loop_thread_id)
+                if loop_frame is None:
+                    continue
+                stack = traceback.extract_stack(loop_frame)
+                callback_stack = trim_event_loop_frames(stack)
+                self.pending_stall_site = StallSite(find_call_site(stack), [describe_frame(frame_summary) for frame_summary in callback_stack[-MAX_REPORTED_STACK_FRAMES:]])
+
+    def format_report(self, max_sites: int = 10) -> str:
+        """Returns a report of the call sites that held up the event loop the longest in total, worst first."""
+        with self.lock:
+            stall_sites = sorted(self.stall_sites.values(), key=lambda stall_site: stall_site.total_stall_seconds, reverse=True)
+            unsampled_stall_count = self.unsampled_stall_count
+
+        if len(stall_sites) == 0 and unsampled_stall_count == 0:
+            return f"The event loop hasn't been held up for more than {self.threshold_seconds} seconds."
+
+        report_lines = [f"Event loop held up for more than {self.threshold_seconds} seconds {sum(stall_site.stall_count for stall_site in stall_sites) + unsampled_stall_count} time(s):"]
+        for stall_site in stall_sites[:max_sites]:
+            report_lines.append(f"{stall_site.call_site}: {stall_site.stall_count} time(s), {stall_site.total_stall_seconds:.3f}s in total, {stall_site.max_stall_seconds:.3f}s at most")
+            report_lines.extend(f"    {frame_description}" for frame_description in stall_site.stack)
+        if len(stall_sites) > max_sites:
+            report_lines.append(f"... and {len(stall_sites) - max_sites} more call site(s)")
+        if unsampled_stall_count > 0:
+            report_lines.append(f"{unsampled_stall_count} stall(s) were over before their stack could be taken")
+
+        return "\n".join(report_lines)
+
+    def log_report(self) -> None:
+        logging.warning(self.format_report())
@@ -0,0 +1,294 @@
+import asyncio
+import bisect
+import logging
+import time
+import typing
+
+# In seconds, from a fast local read up to a timed out request
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+INFINITE_BUCKET_LABEL = 'le="+Inf"'
+
+# When the bridge was launched (near enough - this module is imported first thing), for measuring how long startup takes
+launch_time = time.monotonic()
+
+def format_labels(label_names: tuple[str, ...], label_values: tuple[str, ...], extra_label: str = "") -> str:
+    """Formats the labels of one sample the way Prometheus expects, e.g. `{server="survival",le="0.5"}` (or "" if there are none)."""
+    labels = [f'{label_name}="{escape_label_value(str(label_value))}"' for label_name, label_value in zip(label_names, label_values)]
+    if extra_label != "":
+        labels.append(extra_label)
+
+    if len(labels) == 0:
+        return ""
+
+    return "{" + ",".join(labels) + "}"
+
+def escape_label_value(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class Counter:
+    name: str
+    documentation: str
+    label_names: tuple[str, ...]
+    values: dict[tuple[str, ...], float]
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        """Adds `amount` to the counter with the given label values (one per label name, in order)."""
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {value}")
+
+        return lines
+
+class Histogram:
+    name: str
+    documentation: str
+    label_names: tuple[str, ...]
+    buckets: tuple[float, ...]
+    # For each set of label values: the count of observations falling in each bucket (not cumulative, the last one being +Inf), then the sum of all observations
+    values: dict[tuple[str, ...], list[float]]
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Records one observation of `value` in the histogram with the given label values (one per label name, in order)."""
+        bucket_counts = self.values.get(label_values)
+        if bucket_counts is None:
+            bucket_counts = [0.0] * (len(self.buckets) + 2)
+            self.values[label_values] = bucket_counts
+
+        bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        bucket_counts[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, bucket_counts in self.values.items():
+            cumulative_count = 0.0
+            for bucket, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative_count += bucket_count
+                bucket_label = f'le="{bucket}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, label_values, bucket_label)} {cumulative_count}")
+
+            cumulative_count += bucket_counts[-2]
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names, label_values, INFINITE_BUCKET_LABEL)} {cumulative_count}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, label_values)} {bucket_counts[-1]}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, label_values)} {cumulative_count}")
+
+        return lines
+
+class Gauge:
+    name: str
+    documentation: str
+    label_names: tuple[str, ...]
+    values: dict[tuple[str, ...], float]
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.values = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        """Sets the gauge with the given label values (one per label name, in order) to `value`."""
+        self.values[label_values] = value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {value}")
+
+        return lines
+
+class CallbackGauge:
+    name: str
+    documentation: str
+    label_names: tuple[str, ...]
+    get_values: typing.Callable[[], dict[tuple[str, ...], float]]
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...], get_values: typing.Callable[[], dict[tuple[str, ...], float]]) -> None:
+        """
+        Initialize `CallbackGauge` object, a gauge whose values are only worked out (by calling `get_values`) when the metrics are scraped.
+
+        :param Callable get_values: Returns the current value for each set of label values.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.get_values = get_values
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            for label_values, value in self.get_values().items():
+                lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {value}")
+        except Exception as exception:
+            logging.error(f"Unhandled exception getting the values of gauge {self.name}! {exception}")
+
+        return lines
+
+class NullMetric:
+    """Stands in for every metric while metrics are disabled, so recording a metric does nothing."""
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        pass
+
+    def observe(self, value: float, *label_values: str) -> None:
+        pass
+
+    def set(self, value: float, *label_values: str) -> None:
+        pass
+
+NULL_METRIC = NullMetric()
+
+class MetricsRegistry:
+    metrics: list[Counter | Histogram | Gauge | CallbackGauge]
+    server: asyncio.AbstractServer | None
+
+    def __init__(self) -> None:
+        self.metrics = []
+        self.server = None
+
+    @property
+    def is_enabled(self) -> bool:
+        return True
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Counter | NullMetric:
+        counter = Counter(name, documentation, label_names)
+        self.metrics.append(counter)
+        return counter
+
+    def histogram(self, name: str, documentation: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS) -> Histogram | NullMetric:
+        histogram = Histogram(name, documentation, label_names, buckets)
+        self.metrics.append(histogram)
+        return histogram
+
+    def gauge(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Gauge | NullMetric:
+        gauge = Gauge(name, documentation, label_names)
+        self.metrics.append(gauge)
+        return gauge
+
+    def callback_gauge(self, name: str, documentation: str, label_names: tuple[str, ...], get_values: typing.Callable[[], dict[tuple[str, ...], float]]) -> None:
+        self.metrics.append(CallbackGauge(name, documentation, label_names, get_values))
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+    async def _handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers one HTTP request, with the metrics for `GET /metrics` and a 404 for anything else."""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5.0)
+            # Skip the headers
+            while (await asyncio.wait_for(reader.readline(), 5.0)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            request_parts = request_line.decode("latin-1").split()
+            if len(request_parts) >= 2 and request_parts[0] == "GET" and request_parts[1].split("?")[0] == "/metrics":
+                status = "200 OK"
+                body = self.render().encode("utf-8")
+            else:
+                status = "404 Not Found"
+                body = b"Not found, try /metrics\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except Exception as exception:
+            logging.warning(f"Error answering a metrics request: {exception}")
+        finally:
+            writer.close()
+
+    async def start_server(self, host: str, port: int) -> None:
+        """Starts serving the metrics over HTTP at `http://{host}:{port}/metrics`."""
+        self.server = await asyncio.start_server(self._handle_request, host, port)
+        logging.info(f"Serving metrics at http://{host}:{port}/metrics")
+
+class NullMetricsRegistry(MetricsRegistry):
+    """A registry for when metrics are disabled - every metric it hands out is `NULL_METRIC` and nothing is ever served."""
+
+    @property
+    def is_enabled(self) -> bool:
+        return False
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Counter | NullMetric:
+        return NULL_METRIC
+
+    def histogram(self, name: str, documentation: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS) -> Histogram | NullMetric:
+        return NULL_METRIC
+
+    def gauge(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Gauge | NullMetric:
+        return NULL_METRIC
+
+    def callback_gauge(self, name: str, documentation: str, label_names: tuple[str, ...], get_values: typing.Callable[[], dict[tuple[str, ...], float]]) -> None:
+        pass
+
+    async def start_server(self, host: str, port: int) -> None:
+        pass
+
+class PipelineMetrics:
+    """Every metric recorded by the bridge, created in `registry`."""
+    registry: MetricsRegistry
+    first_line_relayed_seconds: float | None
+
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self.registry = registry
+        self.first_line_relayed_seconds = None
+
+        self.status_ping_seconds = registry.histogram("bridge_status_ping_seconds", "Time taken to ping the server status.", ("server",))
+        self.status_pings_total = registry.counter("bridge_status_pings_total", "Server status pings, by whether the server answered.", ("server", "result"))
+        self.log_read_seconds = registry.histogram("bridge_log_read_seconds", "Time taken to read new lines from the server log file.", ("server",))
+        self.log_read_bytes_total = registry.counter("bridge_log_read_bytes_total", "Bytes read from the server log file.", ("server",))
+        self.log_lines_read_total = registry.counter("bridge_log_lines_read_total", "New lines read from the server log file.", ("server",))
+        self.parse_logs_seconds = registry.histogram("bridge_parse_logs_seconds", "Time taken to parse the new logs into records.", ("server",))
+        self.chat_classify_seconds = registry.histogram("bridge_chat_classify_seconds", "Time taken to pick the chat logs out of a batch of new logs.", ("server",))
+        self.chat_lines_total = registry.counter("bridge_chat_lines_total", "Chat logs found in the server logs.", ("server",))
+        self.discord_update_seconds = registry.histogram("bridge_discord_update_seconds", "Time taken by the DiscordBotWrapper update_* calls (including waiting for room in a full send queue, and for spooled logs to be sent).", ("server", "display"))
+        self.discord_send_seconds = registry.histogram("bridge_discord_send_seconds", "Time taken by one Discord message send or edit.", ("channel",))
+        self.discord_messages_sent_total = registry.counter("bridge_discord_messages_sent_total", "Messages sent to Discord.", ("channel",))
+        self.discord_send_retries_total = registry.counter("bridge_discord_send_retries_total", "Failed attempts to send a message to Discord that were retried.", ("channel",))
+        self.discord_lines_dropped_total = registry.counter("bridge_discord_lines_dropped_total", "Lines given up on after failing to send them to Discord.", ("channel",))
+        self.presence_events_total = registry.counter("bridge_presence_events_total", "Players joining and leaving, and the server going online or offline or changing version.", ("server", "event"))
+        self.spool_replayed_lines_total = registry.counter("bridge_spool_replayed_lines_total", "Spooled lines sent again after they couldn't be sent the first time (or were left over from the last run).", ("server", "display"))
+        self.rcon_command_seconds = registry.histogram("bridge_rcon_command_seconds", "Round trip time of RCON commands.", ("server", "kind"))
+        self.rcon_command_failures_total = registry.counter("bridge_rcon_command_failures_total", "RCON commands that failed.", ("server", "kind"))
+        self.event_loop_lag_seconds = registry.histogram("bridge_event_loop_lag_seconds", "How late the event loop was to run a callback scheduled for a given time (only measured with the loop watchdog on).")
+        self.event_loop_stalls_total = registry.counter("bridge_event_loop_stalls_total", "Times the event loop was held up for longer than the loop watchdog's threshold, by the bridge code it was held up in.", ("site",))
+        self.time_to_first_relayed_line_seconds = registry.gauge("bridge_time_to_first_relayed_line_seconds", "Time from launching the bridge to sending the first message to Discord.")
+
+    def record_line_relayed(self) -> None:
+        """Records how long after launch the first message was sent to Discord (once - later calls do nothing)."""
+        if self.first_line_relayed_seconds is not None:
+            return
+
+        self.first_line_relayed_seconds = time.monotonic() - launch_time
+        self.time_to_first_relayed_line_seconds.set(self.first_line_relayed_seconds)
+        logging.info(f"Sent the first message to Discord {self.first_line_relayed_seconds:.2f} seconds after launch.")
+
+# Replaced by `enable_metrics` - until then recording any of these does nothing
+pipeline = PipelineMetrics(NullMetricsRegistry())
+
+def enable_metrics() -> PipelineMetrics:
+    """Starts recording metrics (they are only served once `pipeline.registry.start_server` is called). Call this before anything is recorded."""
+    global pipeline
+    if pipeline.registry.is_enabled is False:
+        pipeline = PipelineMetrics(MetricsRegistry())
+
+    return pipeline
@@ -4,8 +4,15 @@ import asyncio
 import logging
 from dataclasses import dataclass, field
 import datetime
-import aiofiles
-from mcrcon import MCRcon
+import time
+import metrics
+from rcon_client import RconClient
+from chat_relay import ChatRelay
+from address_resolver import AddressResolver
+import aiofiles.os
+from log_tailer import LogTailer, LogPosition
+from log_buffer import LogLine
+from checkpoint import LogCheckpoint
 
 @dataclass
 class ServerStatusResponse:
@@ -16,61 +23,13 @@ class ServerStatusResponse:
     online_player_names: list[str] = field(default_factory=list)
     version: str = ""
 
-    def is_equal_to(self, other_status_response: "ServerStatusResponse") -> bool:
-        """
-        Compares this object to another `ServerStatusResponse` object and returns True if their contents (all fields besides `timestamp`) are identical, False otherwise
-        """
-        is_equal = True
-
-        if any([
-            self.is_online != other_status_response.is_online,
-            self.online_player_count != other_status_response.online_player_count,
-            self.online_player_limit != other_status_response.online_player_limit,
-            len(set(self.online_player_names) ^ set(other_status_response.online_player_names)) > 0, # Checking if the two online_player_names lists have any unique elements in each
-            self.version != other_status_response.version
-        ]):
-            is_equal = False
-
-        return is_equal
-
 @dataclass
 class ServerLogsResponse:
     timestamp: float
-    server_logs: list[str] = field(default_factory=list)
-
-    def is_equal_to(self, other_logs_response: "ServerLogsResponse") -> bool:
-        """
-        Compares this object to another `ServerLogsResponse` object and returns True if their contents (all fields besides `timestamp`) are identical, False otherwise
-        """
-        is_equal = True
-
-        if any([
-            len(self.server_logs) != len(other_logs_response.server_logs),
-            len(set(self.server_logs) ^ set(other_logs_response.server_logs)) > 0, # Checking if the two server_logs lists have any unique elements in each
-        ]):
-            is_equal = False
-
-        return is_equal
-
-@dataclass
-class ServerResponse:
-    timestamp: float
-    status_info: ServerStatusResponse
-    logs_info: ServerLogsResponse
-
-    def is_equal_to(self, other_server_response: "ServerResponse") -> bool:
-        """
-        Compares this object to another `ServerResponse` object and returns True if their contents (all fields besides `timestamp`) are identical, False otherwise
-        """
-        is_equal = True
-
-        if any([
-            self.status_info.is_equal_to(other_server_response.status_info) is False,
-            self.logs_info.is_equal_to(other_server_response.logs_info) is False,
-        ]):
-            is_equal = False
-
-        return is_equal
+    new_logs: list[LogLine] = field(default_factory=list)
+    log_position: LogPosition = field(default_factory=LogPosition)
+    is_rotated: bool = False
+    has_more: bool = False
 
 def get_current_timestamp() -> float:
     """Returns the current POSIX timestamp. Shorthand."""
@@ -78,17 +37,22 @@ def get_current_timestamp() -> float:
     return datetime.datetime.now().timestamp()
 
 class Server:
+    name: str
     ip: str
     port: int
     rcon_password: str
     rcon_port: int
+    rcon_client: RconClient
+    # A connection of its own for the admin's console commands, so a slow one can't hold up chat
+    console_rcon_client: RconClient
+    chat_relay: ChatRelay
     is_query_enabled: bool
     server_log_file_name: str
-    server: mcstatus.JavaServer
-    player_list: list[str]
-    most_recent_response: ServerResponse | None
+    log_tailer: LogTailer
+    address_resolver: AddressResolver
+    server: mcstatus.JavaServer | None
 
-    def __init__(self, ip: str, rcon_password: str, server_log_file_name: str, port: int = 25565, rcon_port: int = 25575, is_query_enabled: bool = False) -> None:
+    def __init__(self, ip: str, rcon_password: str, server_log_file_name: str, port: int = 25565, rcon_port: int = 25575, is_query_enabled: bool = False, name: str | None = None, chat_relay_coalesce_seconds: float = 0.1, console_command_timeout_seconds: float = 5.0) -> None:
         """
         Initialize `Server` object.
 
@@ -98,26 +62,41 @@ class Server:
         :param str rcon_password: The password for using rcon with the server
         :param bool is_query_enabled: Whether the server is configured to accept queries (see the `enable-query` line in `server.properties`), default False
         :param str server_log_file_name: The location/file name of the `latest.log` file to read from.
+        :param str name: The name of the server in logs and metrics, default None (its address)
+        :param float chat_relay_coalesce_seconds: How long to wait for more chat messages to send to the server in the same command, default 0.1 (see `ChatRelay`)
+        :param float console_command_timeout_seconds: How long a console command (see `run_console_command`) can take before giving up on it, default 5.0
 
         If queries are enabled it enables us to read the entirety of the player list rather than a small selection.
         """
         self.ip = ip
         self.port = port
+        self.name = name if name is not None else f"{ip}:{port}"
 
-        SERVER_ADDRESS = f"{ip}:{port}"
-        self.server = mcstatus.JavaServer.lookup(SERVER_ADDRESS)
+        # Resolved when the server is first pinged rather than here, so creating a `Server` never blocks on DNS
+        self.address_resolver = AddressResolver(ip)
+        self.server = None
 
         self.server_log_file_name = server_log_file_name
+        self.log_tailer = LogTailer(server_log_file_name)
 
         self.rcon_password = rcon_password
         self.rcon_port = rcon_port
+        self.rcon_client = RconClient(host=ip, port=rcon_port, password=rcon_password)
+        self.chat_relay = ChatRelay(self.rcon_client.command, chat_relay_coalesce_seconds, server_name=self.name)
+        self.console_rcon_client = RconClient(host=ip, port=rcon_port, password=rcon_password, command_timeout_seconds=console_command_timeout_seconds)
 
         self.is_query_enabled = is_query_enabled
-
-        self.player_list = []
-        self.most_recent_response = None
     
-    async def _ping_server_status(self) -> ServerStatusResponse:
+    async def get_java_server(self) -> mcstatus.JavaServer:
+        """Returns the `mcstatus.JavaServer` to ping, at the server's current address (see `AddressResolver`)."""
+        resolved_ip = await self.address_resolver.resolve()
+
+        if self.server is None or self.server.address.host != resolved_ip:
+            self.server = mcstatus.JavaServer(resolved_ip, self.port)
+
+        return self.server
+
+    async def ping_server_status(self) -> ServerStatusResponse:
         """
         Pings the server via query protocol if possible or ping protocol otherwise, returning information about the server.
         """
@@ -129,14 +108,15 @@ class Server:
         version = ""
 
         try:
+            server = await self.get_java_server()
             if self.is_query_enabled:
-                query = await self.server.async_query()
+                query = await server.async_query()
                 online_player_limit = query.players.max
                 online_player_count = query.players.online
                 online_player_names = query.players.names
                 version = query.software.version
             else:
-                status = await self.server.async_status()
+                status = await server.async_status()
                 online_player_limit = status.players.max
                 online_player_count = status.players.online
                 online_player_names = [player.name for player in (status.players.sample or [])]
@@ -158,15 +138,28 @@ class Server:
 
         return server_status_response
 
-    async def _ping_server_logs(self) -> ServerLogsResponse:
+    async def ping_server_logs(self) -> ServerLogsResponse:
         """
-        Reads the file of server logs and returns them with some auxiliary information.
+        Reads whatever was appended to the file of server logs since the last read and returns the new logs with some auxiliary information.
+
+        Only the appended bytes are read (see `LogTailer`), and nothing holds on to the logs once they are returned,
+        so neither the cost of this nor memory use grows with the size of the file.
+        If the file can't be read, there are no new logs.
         """
-        all_server_logs: list[str] = []
+        new_logs: list[LogLine] = []
+        is_rotated = False
+        has_more = False
 
         try:
-            async with aiofiles.open(self.server_log_file_name, "r") as server_log_file:
-                all_server_logs = await server_log_file.readlines()
+            tail_result = await self.log_tailer.read_new_lines()
+            is_rotated = tail_result.is_rotated
+            has_more = tail_result.has_more
+
+            if tail_result.is_rotated is True:
+                logging.info(f"Server log file {self.server_log_file_name} was rotated or truncated, reading it from the start.")
+
+            first_line_number = self.log_tailer.line_count - len(tail_result.new_lines) + 1
+            new_logs = [LogLine(first_line_number + index, line.rstrip("\n")) for index, line in enumerate(tail_result.new_lines)]
         except FileNotFoundError as exception:
             logging.error(f"Server log file {self.server_log_file_name} not found! {exception}")
         except Exception as exception:
@@ -174,68 +167,75 @@ class Server:
 
         server_logs_response = ServerLogsResponse(
             timestamp = get_current_timestamp(),
-            server_logs = all_server_logs,
+            new_logs = new_logs,
+            log_position = self.log_tailer.get_position(),
+            is_rotated = is_rotated,
+            has_more = has_more,
         )
 
         return server_logs_response
 
-    async def ping_server(self) -> ServerResponse:
+    async def resume_from_checkpoint(self, checkpoint: LogCheckpoint) -> bool:
         """
-        Pings server status and server logs, combines them into one data object, and returns it
+        If `checkpoint` was taken in the current server log file, continue reading the logs from where it was taken,
+        so logs that were already processed before a restart aren't read (or sent) again.
+
+        Only the line before the checkpoint's offset is read to verify it, no matter how big the file is.
+
+        Returns True if reading will resume from the checkpoint, False if the logs will be read from the start.
         """
-        status_response = ServerStatusResponse(timestamp=get_current_timestamp())
-        logs_response = ServerLogsResponse(timestamp=get_current_timestamp())
+        did_resume = False
 
-        ping_status_task = self._ping_server_status()
-        ping_logs_task = self._ping_server_logs()
         try:
-            status_response, logs_response = await asyncio.gather(ping_status_task, ping_logs_task)
+            file_stats = await aiofiles.os.stat(self.server_log_file_name)
+            if checkpoint.file_identity == (file_stats.st_dev, file_stats.st_ino) and checkpoint.byte_offset <= file_stats.st_size:
+                last_line = None
+                if checkpoint.byte_offset > 0:
+                    last_line = await self.log_tailer.read_line_ending_at(checkpoint.byte_offset)
+
+                if checkpoint.is_last_line(last_line) is True:
+                    self.log_tailer.set_position(LogPosition(
+                        file_identity = checkpoint.file_identity,
+                        byte_offset = checkpoint.byte_offset,
+                        line_count = checkpoint.line_count,
+                        last_line = last_line
+                    ))
+                    did_resume = True
+        except FileNotFoundError as exception:
+            logging.error(f"Server log file {self.server_log_file_name} not found! {exception}")
         except Exception as exception:
-            logging.error(f"Unhandled exception pinging server! {exception}")
+            logging.error(f"Unhandled exception resuming from checkpoint! {exception}")
 
-        server_response_object = ServerResponse(
-            timestamp = get_current_timestamp(),
-            status_info = status_response,
-            logs_info = logs_response
-        )
-
-        self.most_recent_response = server_response_object
-
-        return server_response_object
+        return did_resume
 
     async def send_chat_message(self, sender_name: str, message_contents: str) -> bool:
         """
         Attempts to use RCON to send the chat message to the server.
 
+        Messages sent close together are shown with one `/tellraw` command (see `ChatRelay`), so this waits for the next flush.
+
         Returns True if successful, False if not.
         """
-        did_successfully_send_message = True
-
-        command = '/tellraw @a ["",{"text":"' + f"[{sender_name}] " + '","color":"aqua"},{"text":"' + message_contents + '"}]'
-        logging.debug(f"{command}")
-
-        try:
-            with MCRcon(host=self.ip, port=self.rcon_port, password=self.rcon_password) as mcr:
-                response = mcr.command(command)
-        except Exception as exception:
-            did_successfully_send_message = False
-            logging.error(f"Unhandled exception sending a chat message to the server: {exception}")
+        did_successfully_send_message = await self.chat_relay.send(sender_name, message_contents)
 
         return did_successfully_send_message
     
     async def run_console_command(self, command: str) -> str | None:
         """
-        Attempts to use RCON to send a console command to the server.
+        Attempts to use RCON to send a console command to the server, over a connection of its own (the server answers the commands
+        on a connection in order, so a slow command would otherwise hold up chat messages sent after it).
 
         Returns the response, or None if something went wrong.
         """
         response = None
 
+        command_start_time = time.perf_counter()
         try:
-            with MCRcon(host=self.ip, port=self.rcon_port, password=self.rcon_password) as mcr:
-                response = mcr.command(command)
+            response = await self.console_rcon_client.command(command)
         except Exception as exception:
-            logging.error(f"Unhandled exception sending a chat message to the server: {exception}")
+            metrics.pipeline.rcon_command_failures_total.inc(self.name, "console")
+            logging.error(f"Unhandled exception sending a console command to the server: {exception}")
+        metrics.pipeline.rcon_command_seconds.observe(time.perf_counter() - command_start_time, self.name, "console")
 
         return response
     
\ No newline at end of file
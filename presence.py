@@ -0,0 +1,170 @@
+import logging
+import typing
+from dataclasses import dataclass
+import observer
+
+@dataclass(frozen=True, slots=True)
+class StatusSnapshot:
+    timestamp: float
+    is_online: bool
+    online_player_count: int
+    online_player_limit: int
+    # Sorted, so the same players always make the same snapshot
+    online_player_names: tuple[str, ...]
+    version: str
+    # Of everything above besides `timestamp`, so two snapshots can be compared with one integer comparison
+    fingerprint: int
+
+    @classmethod
+    def from_status_response(cls, status_response: observer.ServerStatusResponse) -> "StatusSnapshot":
+        online_player_names = tuple(sorted(status_response.online_player_names))
+        fingerprint = hash((status_response.is_online, status_response.online_player_count, status_response.online_player_limit, online_player_names, status_response.version))
+
+        return cls(
+            timestamp = status_response.timestamp,
+            is_online = status_response.is_online,
+            online_player_count = status_response.online_player_count,
+            online_player_limit = status_response.online_player_limit,
+            online_player_names = online_player_names,
+            version = status_response.version,
+            fingerprint = fingerprint,
+        )
+
+    @property
+    def is_player_list_complete(self) -> bool:
+        """Whether every online player is named - without queries enabled the server only names a sample of them."""
+        return len(self.online_player_names) == self.online_player_count
+
+    def to_status_response(self) -> observer.ServerStatusResponse:
+        return observer.ServerStatusResponse(
+            timestamp = self.timestamp,
+            is_online = self.is_online,
+            online_player_count = self.online_player_count,
+            online_player_limit = self.online_player_limit,
+            online_player_names = list(self.online_player_names),
+            version = self.version,
+        )
+
+@dataclass(frozen=True, slots=True)
+class PlayerJoined:
+    kind: typing.ClassVar[str] = "join"
+    timestamp: float
+    player_name: str
+
+    def describe(self) -> str:
+        return f"{self.player_name} joined the server"
+
+@dataclass(frozen=True, slots=True)
+class PlayerLeft:
+    kind: typing.ClassVar[str] = "leave"
+    timestamp: float
+    player_name: str
+
+    def describe(self) -> str:
+        return f"{self.player_name} left the server"
+
+@dataclass(frozen=True, slots=True)
+class ServerOnline:
+    kind: typing.ClassVar[str] = "online"
+    timestamp: float
+    version: str
+
+    def describe(self) -> str:
+        return f"The server is online (version {self.version})"
+
+@dataclass(frozen=True, slots=True)
+class ServerOffline:
+    kind: typing.ClassVar[str] = "offline"
+    timestamp: float
+
+    def describe(self) -> str:
+        return "The server is offline"
+
+@dataclass(frozen=True, slots=True)
+class VersionChanged:
+    kind: typing.ClassVar[str] = "version"
+    timestamp: float
+    previous_version: str
+    version: str
+
+    def describe(self) -> str:
+        return f"The server version changed from {self.previous_version} to {self.version}"
+
+PresenceEvent = PlayerJoined | PlayerLeft | ServerOnline | ServerOffline | VersionChanged
+PRESENCE_EVENT_KINDS = (PlayerJoined.kind, PlayerLeft.kind, ServerOnline.kind, ServerOffline.kind, VersionChanged.kind)
+
+PresenceSubscriber = typing.Callable[[StatusSnapshot, list[PresenceEvent]], typing.Awaitable[None]]
+
+def diff_snapshots(previous_snapshot: StatusSnapshot, snapshot: StatusSnapshot) -> list[PresenceEvent]:
+    """
+    Returns what happened between `previous_snapshot` and `snapshot`, in the order it should be told.
+
+    Joins and leaves are only worked out while the server is online in both snapshots and both name every online player -
+    otherwise a player missing from the sample the server sent would look like they left.
+    """
+    events: list[PresenceEvent] = []
+    timestamp = snapshot.timestamp
+
+    if previous_snapshot.is_online is False and snapshot.is_online is True:
+        events.append(ServerOnline(timestamp, snapshot.version))
+    elif previous_snapshot.is_online is True and snapshot.is_online is False:
+        events.append(ServerOffline(timestamp))
+        return events
+
+    if previous_snapshot.is_online is True and snapshot.is_online is True and previous_snapshot.version != snapshot.version:
+        events.append(VersionChanged(timestamp, previous_snapshot.version, snapshot.version))
+
+    if snapshot.is_online is True and snapshot.is_player_list_complete is True:
+        # Everyone on a server that just came online has just joined
+        previous_player_names = previous_snapshot.online_player_names if previous_snapshot.is_online is True else ()
+        if previous_snapshot.is_online is False or previous_snapshot.is_player_list_complete is True:
+            # The names are sorted, so this keeps the events in alphabetical order
+            previous_player_name_set = set(previous_player_names)
+            player_name_set = set(snapshot.online_player_names)
+            events.extend(PlayerLeft(timestamp, player_name) for player_name in previous_player_names if player_name not in player_name_set)
+            events.extend(PlayerJoined(timestamp, player_name) for player_name in snapshot.online_player_names if player_name not in previous_player_name_set)
+
+    return events
+
+class PresenceTracker:
+    previous_snapshot: StatusSnapshot | None
+    subscribers: list[PresenceSubscriber]
+
+    def __init__(self) -> None:
+        """
+        Initialize `PresenceTracker` object, which turns a series of server statuses into events (players joining and leaving,
+        the server going online or offline, its version changing) and tells its subscribers about them.
+        """
+        self.previous_snapshot = None
+        self.subscribers = []
+
+    def subscribe(self, subscriber: PresenceSubscriber) -> None:
+        """
+        Calls `subscriber` with the new snapshot and the events that led to it every time the status changes (including the first status, with no events).
+
+        Statuses identical to the previous one (besides their timestamp) don't reach subscribers at all.
+        """
+        self.subscribers.append(subscriber)
+
+    async def update(self, status_response: observer.ServerStatusResponse) -> list[PresenceEvent]:
+        """
+        Compares `status_response` to the previous status, tells the subscribers if anything changed, and returns the events found.
+
+        The first status is only remembered to compare against, so it has no events.
+        """
+        snapshot = StatusSnapshot.from_status_response(status_response)
+        previous_snapshot = self.previous_snapshot
+
+        if previous_snapshot is not None and previous_snapshot.fingerprint == snapshot.fingerprint:
+            return []
+
+        self.previous_snapshot = snapshot
+        events = diff_snapshots(previous_snapshot, snapshot) if previous_snapshot is not None else []
+
+        for subscriber in self.subscribers:
+            try:
+                await subscriber(snapshot, events)
+            except Exception as exception:
+                logging.error(f"Unhandled exception in a presence subscriber! {exception}")
+
+        return events
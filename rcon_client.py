@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import struct
+import time
+from dataclasses import dataclass, field
+
+# Packet types, see https://wiki.vg/RCON
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+# Minecraft drops RCON connections sending a payload any longer than this (in bytes)
+MAX_COMMAND_PAYLOAD_SIZE = 1446
+
+@dataclass
+class PendingCommand:
+    response_future: asyncio.Future
+    fragments: list[bytes] = field(default_factory=list)
+
+class RconError(Exception):
+    pass
+
+class RconAuthenticationError(RconError):
+    pass
+
+class RconClient:
+    host: str
+    port: int
+    password: str
+    command_timeout_seconds: float
+    min_reconnect_delay_seconds: float
+    max_reconnect_delay_seconds: float
+    reader: asyncio.StreamReader | None
+    writer: asyncio.StreamWriter | None
+    read_task: asyncio.Task | None
+    connect_lock: asyncio.Lock
+    next_request_id: int
+    pending_commands: dict[int, PendingCommand]
+    pending_authentication: tuple[int, asyncio.Future] | None
+    reconnect_delay_seconds: float
+    next_connect_time: float
+
+    def __init__(self, host: str, port: int, password: str, command_timeout_seconds: float = 5.0, min_reconnect_delay_seconds: float = 0.5, max_reconnect_delay_seconds: float = 30.0) -> None:
+        """
+        Initialize `RconClient` object.
+
+        :param str host: The IP address of the server (no port number) - this can be `localhost`
+        :param int port: The port on which the server accepts rcon
+        :param str password: The password for using rcon with the server
+        :param float command_timeout_seconds: How long a command (including connecting, if needed) can take before giving up on it, default 5.0
+        :param float min_reconnect_delay_seconds: How long to wait before reconnecting after the first failed connection attempt, default 0.5
+        :param float max_reconnect_delay_seconds: The longest to wait before reconnecting - the wait doubles with every failed attempt up to this, default 30.0
+
+        The client keeps one authenticated connection open and reuses it for every command.
+        Commands sent at the same time are all written to the connection straight away, and their responses are matched back up by request ID.
+        """
+        self.host = host
+        self.port = port
+        self.password = password
+        self.command_timeout_seconds = command_timeout_seconds
+        self.min_reconnect_delay_seconds = min_reconnect_delay_seconds
+        self.max_reconnect_delay_seconds = max_reconnect_delay_seconds
+
+        self.reader = None
+        self.writer = None
+        self.read_task = None
+        self.connect_lock = asyncio.Lock()
+        self.next_request_id = 1
+        self.pending_commands = {}
+        self.pending_authentication = None
+        self.reconnect_delay_seconds = min_reconnect_delay_seconds
+        self.next_connect_time = 0.0
+
+    @property
+    def is_connected(self) -> bool:
+        return self.writer is not None and self.writer.is_closing() is False
+
+    def _get_request_id(self) -> int:
+        """
+        Returns an unused request ID. IDs are handed out two at a time, so the ID after the one returned is free too (for a command's terminator packet).
+        """
+        request_id = self.next_request_id
+        # Request IDs are signed 32-bit integers, and -1 means authentication failed
+        self.next_request_id = self.next_request_id + 2 if self.next_request_id < 2**31 - 3 else 1
+        return request_id
+
+    def _write_packet(self, request_id: int, packet_type: int, payload: bytes) -> None:
+        packet = struct.pack("<ii", request_id, packet_type) + payload + b"\0\0"
+        self.writer.write(struct.pack("<i", len(packet)) + packet)
+
+    async def _read_packets(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Reads packets from the connection until it closes, handing each response to whoever is waiting for it."""
+        try:
+            while True:
+                packet_length_bytes = await reader.readexactly(4)
+                (packet_length,) = struct.unpack("<i", packet_length_bytes)
+                packet = await reader.readexactly(packet_length)
+                request_id, packet_type = struct.unpack_from("<ii", packet)
+                payload = packet[8:-2]
+
+                if request_id == -1:
+                    # Authentication failed, so the connection is no use - drop it and wait before trying again
+                    self._fail_pending(RconAuthenticationError("RCON authentication failed, check the RCON password."))
+                    self._close_connection()
+                    self._back_off_reconnecting()
+                    return
+                elif request_id in self.pending_commands:
+                    # One fragment of a command's response (long responses are split over several packets)
+                    self.pending_commands[request_id].fragments.append(payload)
+                elif request_id - 1 in self.pending_commands:
+                    # The response to the terminator packet sent after a command - the command's response is complete
+                    pending_command = self.pending_commands.pop(request_id - 1)
+                    if pending_command.response_future.done() is False:
+                        pending_command.response_future.set_result(b"".join(pending_command.fragments).decode("utf-8", errors="replace"))
+                elif self.pending_authentication is not None and request_id == self.pending_authentication[0]:
+                    _, authentication_future = self.pending_authentication
+                    self.pending_authentication = None
+                    if authentication_future.done() is False:
+                        authentication_future.set_result(None)
+                else:
+                    logging.debug(f"Ignoring RCON packet for unknown request {request_id} (type {packet_type}).")
+        except (asyncio.IncompleteReadError, ConnectionError) as exception:
+            logging.warning(f"RCON connection to {self.host}:{self.port} was lost. {exception}")
+        except Exception as exception:
+            logging.error(f"Unhandled exception reading from RCON connection! {exception}")
+        finally:
+            # Only clean up if this is still the current connection (and not one that was already replaced)
+            if self.writer is writer:
+                self._fail_pending(RconError("The RCON connection was closed."))
+                self._close_connection()
+
+    def _fail_pending(self, exception: Exception) -> None:
+        """Fails every request that is waiting on a response with `exception`."""
+        response_futures = [pending_command.response_future for pending_command in self.pending_commands.values()]
+        if self.pending_authentication is not None:
+            response_futures.append(self.pending_authentication[1])
+
+        for response_future in response_futures:
+            if response_future.done() is False:
+                response_future.set_exception(exception)
+
+        self.pending_commands.clear()
+        self.pending_authentication = None
+
+    def _back_off_reconnecting(self) -> None:
+        """Holds off the next connection attempt for the current reconnect delay, and doubles the delay for the one after (up to `self.max_reconnect_delay_seconds`)."""
+        self.next_connect_time = time.monotonic() + self.reconnect_delay_seconds
+        self.reconnect_delay_seconds = min(self.reconnect_delay_seconds * 2, self.max_reconnect_delay_seconds)
+
+    def _close_connection(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self) -> None:
+        """
+        Opens and authenticates a connection if there isn't one open, waiting out the reconnect backoff first if the previous attempt failed.
+
+        Raises `RconError` (or `OSError`) if connecting or authenticating fails.
+        """
+        async with self.connect_lock:
+            if self.is_connected is True:
+                return
+
+            delay_seconds = self.next_connect_time - time.monotonic()
+            if delay_seconds > 0:
+                await asyncio.sleep(delay_seconds)
+
+            try:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                self.read_task = asyncio.create_task(self._read_packets(self.reader, self.writer))
+
+                request_id = self._get_request_id()
+                authentication_future = asyncio.get_running_loop().create_future()
+                self.pending_authentication = (request_id, authentication_future)
+                self._write_packet(request_id, SERVERDATA_AUTH, self.password.encode("utf-8"))
+                await self.writer.drain()
+                await authentication_future
+            except BaseException:
+                # Including being cancelled (e.g. by `command` timing out) while authenticating, so a connection that never authenticated isn't left looking usable
+                if self.read_task is not None:
+                    self.read_task.cancel()
+                    self.read_task = None
+                self.pending_authentication = None
+                self._close_connection()
+                # Unless the reader already backed off (authentication failed)
+                if self.next_connect_time <= time.monotonic():
+                    self._back_off_reconnecting()
+                raise
+
+            self.reconnect_delay_seconds = self.min_reconnect_delay_seconds
+            self.next_connect_time = 0.0
+            logging.info(f"Connected to RCON at {self.host}:{self.port}.")
+
+    async def _command(self, command: str) -> str:
+        await self._connect()
+
+        request_id = self._get_request_id()
+        terminator_request_id = request_id + 1
+        response_future = asyncio.get_running_loop().create_future()
+        self.pending_commands[request_id] = PendingCommand(response_future)
+
+        try:
+            # The server answers packets in order, so by the time it answers the (invalid) terminator packet it has sent every fragment of the command's response
+            self._write_packet(request_id, SERVERDATA_EXECCOMMAND, command.encode("utf-8"))
+            self._write_packet(terminator_request_id, SERVERDATA_RESPONSE_VALUE, b"")
+            await self.writer.drain()
+            return await response_future
+        finally:
+            self.pending_commands.pop(request_id, None)
+
+    async def command(self, command: str) -> str:
+        """
+        Sends `command` to the server console and returns the response, connecting first if needed.
+
+        Raises `ValueError` if the command is too long for the server to accept,
+        `asyncio.TimeoutError` if it takes longer than `self.command_timeout_seconds`,
+        and `RconError` (or `OSError`) if the connection fails.
+        """
+        if len(command.encode("utf-8")) > MAX_COMMAND_PAYLOAD_SIZE:
+            raise ValueError(f"RCON commands can be at most {MAX_COMMAND_PAYLOAD_SIZE} bytes long.")
+
+        return await asyncio.wait_for(self._command(command), self.command_timeout_seconds)
+
+    async def close(self) -> None:
+        """Closes the connection (if it is open)."""
+        if self.read_task is not None:
+            self.read_task.cancel()
+            self.read_task = None
+        self._fail_pending(RconError("The RCON client was closed."))
+        self._close_connection()
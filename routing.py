@@ -0,0 +1,160 @@
+import json
+import re
+import typing
+from dataclasses import dataclass
+from log_parser import LogRecord
+
+# The sink every server log not matched by a route goes to: the server's log dump channel
+LOG_DUMP_SINK = "log_dump"
+# The sink chat logs go to: the server's chat channel (only chat logs can go there, but it can be replaced with a webhook)
+CHAT_SINK = "chat"
+# Sink names become part of their spool's file name, so they're kept to characters that are safe in one
+SINK_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+# The spools of the server's own log dump and chat channels already use these names
+RESERVED_SINK_NAMES = {"server_logs", "chat_logs"}
+
+@dataclass
+class LogRoute:
+    # The sink to send matching logs to, or None to leave them out altogether
+    sink: str | None
+    # Which levels (e.g. `{"WARN", "ERROR"}`) and threads a log has to be from to match, None for any
+    levels: set[str] | None = None
+    threads: set[str] | None = None
+    # A regular expression searched for in the log after its header (e.g. `Can't keep up`), None to match any
+    pattern: str | None = None
+
+@dataclass
+class SinkConfig:
+    name: str
+    # Exactly one of these is set
+    channel_id: int | None = None
+    webhook_url: str | None = None
+    # Post each chat message under the name of the player who sent it (webhooks only) - only `<PikaGoku> hello` chat has a name,
+    # and the default chat rules (`chat_classifier.DEFAULT_CHAT_RULES`) leave that out, so the chat sink needs chat rules that don't
+    use_player_names: bool = False
+
+@dataclass
+class RoutingConfig:
+    sinks: dict[str, SinkConfig]
+    routes: list[LogRoute]
+
+def load_routing_config(file_name: str) -> RoutingConfig:
+    """
+    Reads the sinks and routes of a server from the JSON file `file_name`, like
+
+    `{"sinks": {"alerts": {"channel_id": 123}, "chat": {"webhook_url": "https://discord.com/api/webhooks/...", "use_player_names": true}},
+      "routes": [{"levels": ["WARN", "ERROR"], "sink": "alerts"}, {"pattern": "\\\\[Dynmap\\\\]", "sink": null}]}`
+
+    Routes can also have a list of `threads`. Defining a sink named `log_dump` or `chat` replaces the server's log dump or chat channel.
+
+    Sink names can only have letters, digits, underscores and dashes, and can't be `server_logs` or `chat_logs`.
+
+    Raises `ValueError` if a sink's name isn't allowed, a sink isn't exactly one of a channel or a webhook, or a route goes to a sink that isn't defined (or to `chat`).
+    """
+    with open(file_name, "r", encoding="utf-8") as routing_file:
+        routing_json: dict[str, typing.Any] = json.load(routing_file)
+
+    sinks: dict[str, SinkConfig] = {}
+    for sink_name, sink_json in routing_json.get("sinks", {}).items():
+        if SINK_NAME_PATTERN.fullmatch(sink_name) is None:
+            raise ValueError(f"Sink name {sink_name!r} in {file_name} should only have letters, digits, underscores and dashes.")
+        if sink_name in RESERVED_SINK_NAMES:
+            raise ValueError(f"Sink name {sink_name!r} in {file_name} is reserved, choose another one.")
+        sink_config = SinkConfig(
+            name = str(sink_name),
+            channel_id = int(sink_json["channel_id"]) if "channel_id" in sink_json else None,
+            webhook_url = str(sink_json["webhook_url"]) if "webhook_url" in sink_json else None,
+            use_player_names = bool(sink_json.get("use_player_names", False)),
+        )
+        if (sink_config.channel_id is None) == (sink_config.webhook_url is None):
+            raise ValueError(f"Sink {sink_name!r} in {file_name} should have either a channel_id or a webhook_url.")
+        sinks[sink_config.name] = sink_config
+
+    routes: list[LogRoute] = []
+    for route_json in routing_json.get("routes", []):
+        route = LogRoute(
+            sink = str(route_json["sink"]) if route_json["sink"] is not None else None,
+            levels = {str(level).upper() for level in route_json["levels"]} if "levels" in route_json else None,
+            threads = {str(thread) for thread in route_json["threads"]} if "threads" in route_json else None,
+            pattern = str(route_json["pattern"]) if "pattern" in route_json else None,
+        )
+        if route.sink == CHAT_SINK:
+            raise ValueError(f"Routes in {file_name} can't go to the {CHAT_SINK!r} sink, which only chat logs go to.")
+        if route.sink is not None and route.sink != LOG_DUMP_SINK and route.sink not in sinks:
+            raise ValueError(f"A route in {file_name} goes to sink {route.sink!r}, which isn't one of its sinks.")
+        routes.append(route)
+
+    return RoutingConfig(sinks, routes)
+
+class RoutingTable:
+    routes: list[LogRoute]
+    default_sink: str
+    compiled_patterns: list[re.Pattern | None]
+    # For each thread and level seen so far, the routes that can match logs from them: each one's pattern (if it has one) and sink
+    candidate_routes: dict[tuple[str | None, str | None], list[tuple[re.Pattern | None, str | None]]]
+
+    def __init__(self, routes: list[LogRoute] | None = None, default_sink: str = LOG_DUMP_SINK) -> None:
+        """
+        Initialize `RoutingTable` object, which decides which sink each server log goes to, compiling every route's pattern once.
+
+        :param list routes: The routes to try, in order - a log goes to the sink of the first route it matches, default None (no routes)
+        :param str default_sink: The sink logs matching no route go to, default `LOG_DUMP_SINK`
+
+        The routes that can match a thread and level are worked out the first time a log from them comes along, so most logs only need the patterns of those routes checked.
+        """
+        self.routes = routes if routes is not None else []
+        self.default_sink = default_sink
+        self.compiled_patterns = [re.compile(route.pattern) if route.pattern is not None else None for route in self.routes]
+        self.candidate_routes = {}
+
+    @property
+    def sink_names(self) -> set[str]:
+        """The sinks logs can be routed to."""
+        return {route.sink for route in self.routes if route.sink is not None} | {self.default_sink}
+
+    def get_candidate_routes(self, thread: str | None, level: str | None) -> list[tuple[re.Pattern | None, str | None]]:
+        candidate_routes = self.candidate_routes.get((thread, level))
+        if candidate_routes is not None:
+            return candidate_routes
+
+        candidate_routes = []
+        for route, compiled_pattern in zip(self.routes, self.compiled_patterns):
+            if route.levels is not None and level not in route.levels:
+                continue
+            if route.threads is not None and thread not in route.threads:
+                continue
+            candidate_routes.append((compiled_pattern, route.sink))
+            # Every log from this thread and level matches this route, so none after it are ever tried
+            if compiled_pattern is None:
+                break
+        self.candidate_routes[(thread, level)] = candidate_routes
+
+        return candidate_routes
+
+    def get_sink(self, log_record: LogRecord) -> str | None:
+        """Returns the sink `log_record` goes to, or None if it is left out."""
+        body: str | None = None
+
+        for compiled_pattern, sink in self.get_candidate_routes(log_record.thread, log_record.level):
+            if compiled_pattern is None:
+                return sink
+            if body is None:
+                body = log_record.body
+            if compiled_pattern.search(body) is not None:
+                return sink
+
+        return self.default_sink
+
+    def route(self, log_records: typing.Iterable[LogRecord]) -> dict[str, list[LogRecord]]:
+        """Groups `log_records` by the sink each one goes to (see `get_sink`), keeping them in order and leaving out the ones going nowhere."""
+        routed_records: dict[str, list[LogRecord]] = {}
+
+        for log_record in log_records:
+            sink = self.get_sink(log_record)
+            if sink is None:
+                continue
+            if sink not in routed_records:
+                routed_records[sink] = []
+            routed_records[sink].append(log_record)
+
+        return routed_records
@@ -0,0 +1,483 @@
+import asyncio
+import collections
+import logging
+import re
+import time
+import typing
+from dataclasses import dataclass
+import aiohttp
+import disnake
+from disnake.channel import TextChannel
+import log_packer
+import metrics
+
+# https://discord.com/api/webhooks/<webhook ID>/<token> - only the ID is ever logged
+WEBHOOK_URL_PATTERN = re.compile(r"/webhooks/(?P<webhook_id>\d+)/")
+# <PikaGoku> hello
+PLAYER_CHAT_PATTERN = re.compile(r"<(?P<player_name>[^<>\s]{1,80})> (?P<message>.*)", re.DOTALL)
+
+# What became of lines queued to be sent
+DELIVERY_SENT = "sent"
+# Given up on after a few attempts, but sending them again later might work (e.g. during a Discord outage)
+DELIVERY_FAILED = "failed"
+# Discord refused them in a way sending them again won't change (e.g. the channel is gone, or a player name a webhook doesn't allow)
+DELIVERY_REJECTED = "rejected"
+
+class RateLimitBucket:
+    capacity: int
+    window_seconds: float
+    send_times: collections.deque[float]
+    blocked_until: float
+
+    def __init__(self, capacity: int = 5, window_seconds: float = 5.0) -> None:
+        """
+        Initialize `RateLimitBucket` object.
+
+        :param int capacity: How many sends are allowed per window, default 5 (Discord's limit for messages in one channel)
+        :param float window_seconds: The length of the window, default 5.0
+        """
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self.send_times = collections.deque()
+        self.blocked_until = 0.0
+
+    def get_delay(self) -> float:
+        """Returns how long to wait before the next send is allowed (0 if it is allowed now)."""
+        now = time.monotonic()
+        while len(self.send_times) > 0 and now - self.send_times[0] >= self.window_seconds:
+            self.send_times.popleft()
+
+        delay = max(0.0, self.blocked_until - now)
+        if len(self.send_times) >= self.capacity:
+            delay = max(delay, self.send_times[0] + self.window_seconds - now)
+
+        return delay
+
+    async def acquire(self) -> None:
+        """Waits until a send is allowed and records it."""
+        delay = self.get_delay()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.get_delay()
+
+        self.send_times.append(time.monotonic())
+
+    def block_for(self, seconds: float) -> None:
+        """Blocks sends for `seconds` (e.g. after Discord says we were rate limited anyway)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+@dataclass
+class QueuedDelivery:
+    """Tracks one `enqueue` call's lines through the queue, to tell the caller what became of each of them."""
+    delivery_future: asyncio.Future[list[str]]
+    # What became of each line - for a line split into pieces, the worst of what became of them: rejected, then failed, then sent
+    line_outcomes: list[str]
+    remaining_piece_count: int
+    # Whether a message with some of its lines was given up on, so the rest of them are too (see `ChannelSendQueue._send_queued_lines`)
+    did_fail: bool = False
+
+class ChannelSendQueue:
+    channel_id: int
+    channel_label: str
+    get_channel: typing.Callable[[int], typing.Any]
+    wait_until_ready: typing.Callable[[], typing.Awaitable[None]] | None
+    max_message_size: int
+    max_lines_per_message: int | None
+    max_queued_lines: int
+    max_send_attempts: int
+    rate_limit_bucket: RateLimitBucket
+    queued_lines: collections.deque[str]
+    # The delivery each queued line (or piece of one) belongs to and the index of its line in it, in step with `queued_lines`
+    queued_deliveries: collections.deque[tuple[QueuedDelivery, int]]
+    queue_changed: asyncio.Condition
+    sender_task: asyncio.Task | None
+    sent_message_count: int
+    dropped_line_count: int
+
+    def __init__(self, channel_id: int, get_channel: typing.Callable[[int], typing.Any], max_message_size: int = 2000, max_lines_per_message: int | None = None, max_queued_lines: int = 10000, max_send_attempts: int = 5, wait_until_ready: typing.Callable[[], typing.Awaitable[None]] | None = None) -> None:
+        """
+        Initialize `ChannelSendQueue` object.
+
+        :param int channel_id: The ID of the Discord channel to send to.
+        :param Callable get_channel: Returns the channel with the given ID, or None if it isn't available (yet).
+        :param int max_message_size: The maximum size of one message, default 2000 (Discord's limit)
+        :param int max_lines_per_message: The maximum number of lines in one message, default None (no limit)
+        :param int max_queued_lines: How many lines can be waiting to be sent before `enqueue` waits for some to be sent, default 10000
+        :param int max_send_attempts: How many times to try sending a message before giving up on it, default 5
+        :param Callable wait_until_ready: Waits until the bot is connected and its channels can be gotten, default None (don't wait) -
+            so lines queued while the bot is still logging in are sent as soon as it can, rather than used up on retries
+
+        Lines are sent in order by a single sender task. Lines queued while the sender waits for the rate limit are packed into the same message.
+        """
+        self.channel_id = channel_id
+        self.channel_label = str(channel_id)
+        self.get_channel = get_channel
+        self.wait_until_ready = wait_until_ready
+        self.max_message_size = max_message_size
+        self.max_lines_per_message = max_lines_per_message
+        self.max_queued_lines = max_queued_lines
+        self.max_send_attempts = max_send_attempts
+
+        self.rate_limit_bucket = RateLimitBucket()
+        self.queued_lines = collections.deque()
+        self.queued_deliveries = collections.deque()
+        self.queue_changed = asyncio.Condition()
+        self.sender_task = None
+        self.sent_message_count = 0
+        self.dropped_line_count = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """How many lines are waiting to be sent."""
+        return len(self.queued_lines)
+
+    async def enqueue(self, lines: list[str]) -> asyncio.Future[list[str]]:
+        """
+        Adds `lines` to the end of the queue, starting the sender task if it isn't running.
+
+        If the queue is full, waits until enough lines have been sent to make room for all of them - this is what slows the caller down when Discord can't keep up.
+
+        Lines too long for one message are queued as several lines that each fit.
+
+        Returns a future resolved once every one of `lines` was dealt with, with what became of each of them: `DELIVERY_SENT`, `DELIVERY_FAILED`
+        if it was given up on (and might be sent later), or `DELIVERY_REJECTED` if Discord refused it for good. Once a message is given up on,
+        the rest of `lines` after it are too rather than sent out of order, so the lines that failed are always the last ones.
+        """
+        if self.sender_task is None or self.sender_task.done():
+            self.sender_task = asyncio.create_task(self._send_queued_lines())
+
+        line_pieces: list[str] = []
+        piece_line_indexes: list[int] = []
+        for line_index, line in enumerate(lines):
+            for line_piece in log_packer.split_long_log(line, self.max_message_size - 1):
+                line_pieces.append(line_piece)
+                piece_line_indexes.append(line_index)
+        queued_delivery = QueuedDelivery(asyncio.get_running_loop().create_future(), [DELIVERY_SENT] * len(lines), len(line_pieces))
+        if len(line_pieces) == 0:
+            queued_delivery.delivery_future.set_result([])
+
+        async with self.queue_changed:
+            # The lines go in all at once, so lines queued by another caller at the same time never end up in between them -
+            # a batch bigger than the whole queue waits for it to be empty instead
+            await self.queue_changed.wait_for(lambda: len(self.queued_lines) + len(line_pieces) <= self.max_queued_lines or len(self.queued_lines) == 0)
+            self.queued_lines.extend(line_pieces)
+            self.queued_deliveries.extend((queued_delivery, line_index) for line_index in piece_line_indexes)
+            self.queue_changed.notify_all()
+
+        return queued_delivery.delivery_future
+
+    async def wait_until_sent(self) -> None:
+        """Waits until every line queued so far has been sent (or given up on)."""
+        async with self.queue_changed:
+            await self.queue_changed.wait_for(lambda: len(self.queued_lines) == 0)
+
+    def _take_message(self) -> tuple[str, int]:
+        """
+        Packs as many queued lines (from the front of the queue) as fit into one message, without removing them from the queue.
+
+        Returns the message and how many lines it holds.
+        """
+        # Only packs as far as the first message, however long the queue is
+        message, line_count = next(log_packer.pack_log_messages(self.queued_lines, self.max_message_size, self.max_lines_per_message))
+
+        return message, line_count
+
+    async def _send_queued_lines(self) -> None:
+        """
+        Sends queued lines in order, as fast as the rate limit allows, until cancelled.
+
+        If sending fails in a way `_send_message` doesn't handle, every line waiting is given up on (see `_give_up_on_queued_lines`)
+        rather than left waiting on a sender that is gone, and sending carries on with whatever is queued after.
+        """
+        if self.wait_until_ready is not None:
+            await self.wait_until_ready()
+
+        while True:
+            try:
+                await self._send_next_message()
+            except Exception as exception:
+                logging.error(f"Unhandled exception sending to {self.channel_label}, giving up on the {len(self.queued_lines)} line(s) waiting! {exception}")
+                await self._give_up_on_queued_lines()
+
+    async def _send_next_message(self) -> None:
+        """Waits until there are lines queued, then sends as many of them as fit in one message once the rate limit allows."""
+        async with self.queue_changed:
+            await self.queue_changed.wait_for(lambda: len(self.queued_lines) > 0)
+
+            # The rest of the lines of a delivery one of whose messages was given up on would arrive out of order, so they are given up on too
+            skipped_line_count = 0
+            while len(self.queued_deliveries) > 0 and self.queued_deliveries[0][0].did_fail is True:
+                self.queued_lines.popleft()
+                self._finish_line(*self.queued_deliveries.popleft(), DELIVERY_FAILED)
+                skipped_line_count += 1
+            if skipped_line_count > 0:
+                self.queue_changed.notify_all()
+                self.dropped_line_count += skipped_line_count
+                metrics.pipeline.discord_lines_dropped_total.inc(self.channel_label, amount=skipped_line_count)
+                return
+
+        # Lines queued while waiting here get packed into the message too
+        await self.rate_limit_bucket.acquire()
+
+        message, line_count = self._take_message()
+        delivery_outcome = await self._send_message(message)
+
+        async with self.queue_changed:
+            for _ in range(line_count):
+                self.queued_lines.popleft()
+                self._finish_line(*self.queued_deliveries.popleft(), delivery_outcome)
+            self.queue_changed.notify_all()
+
+        if delivery_outcome == DELIVERY_SENT:
+            self.sent_message_count += 1
+            metrics.pipeline.discord_messages_sent_total.inc(self.channel_label)
+            metrics.pipeline.record_line_relayed()
+        else:
+            self.dropped_line_count += line_count
+            metrics.pipeline.discord_lines_dropped_total.inc(self.channel_label, amount=line_count)
+
+    async def _give_up_on_queued_lines(self) -> None:
+        """Gives up on every line waiting to be sent, resolving their deliveries as failed (so spooled lines are sent again later)."""
+        async with self.queue_changed:
+            line_count = len(self.queued_lines)
+            self.queued_lines.clear()
+            while len(self.queued_deliveries) > 0:
+                self._finish_line(*self.queued_deliveries.popleft(), DELIVERY_FAILED)
+            self.queue_changed.notify_all()
+
+        self.dropped_line_count += line_count
+        metrics.pipeline.discord_lines_dropped_total.inc(self.channel_label, amount=line_count)
+
+    @staticmethod
+    def _finish_line(queued_delivery: QueuedDelivery, line_index: int, delivery_outcome: str) -> None:
+        """Records what became of a piece of the line `line_index` of `queued_delivery`, resolving its future once that was its last piece."""
+        queued_delivery.remaining_piece_count -= 1
+        # Sending a line again is no use if Discord refused any piece of it
+        if delivery_outcome == DELIVERY_REJECTED or (delivery_outcome == DELIVERY_FAILED and queued_delivery.line_outcomes[line_index] == DELIVERY_SENT):
+            queued_delivery.line_outcomes[line_index] = delivery_outcome
+        if delivery_outcome == DELIVERY_FAILED:
+            queued_delivery.did_fail = True
+
+        if queued_delivery.remaining_piece_count == 0 and queued_delivery.delivery_future.done() is False:
+            queued_delivery.delivery_future.set_result(queued_delivery.line_outcomes)
+
+    async def _send_message(self, message: str) -> str:
+        """
+        Sends `message` to the channel, retrying with a growing delay if the channel isn't available yet or sending fails.
+
+        Returns `DELIVERY_SENT` if the message was sent, `DELIVERY_REJECTED` if Discord refused it for good (e.g. the bot can't see the channel),
+        or `DELIVERY_FAILED` if it was given up on.
+        """
+        retry_delay_seconds = 1.0
+        for attempt in range(1, self.max_send_attempts + 1):
+            wait_seconds = retry_delay_seconds
+            try:
+                channel = self.get_channel(self.channel_id)
+                assert type(channel) == TextChannel, f"Channel {self.channel_id} should be a text channel (or the bot isn't ready yet)."
+                send_start_time = time.perf_counter()
+                await channel.send(content=message)
+                metrics.pipeline.discord_send_seconds.observe(time.perf_counter() - send_start_time, self.channel_label)
+                return DELIVERY_SENT
+            except (disnake.Forbidden, disnake.NotFound) as exception:
+                logging.error(f"Can't send to channel {self.channel_id}, dropping message: {exception}")
+                return DELIVERY_REJECTED
+            except disnake.HTTPException as exception:
+                if exception.status == 429:
+                    # Wait as long as Discord says to, if it says
+                    retry_after = getattr(exception, "retry_after", None)
+                    if retry_after is not None:
+                        wait_seconds = float(retry_after)
+                    self.rate_limit_bucket.block_for(wait_seconds)
+                elif exception.status < 500:
+                    # Sending it again won't go any differently
+                    logging.error(f"Discord refused a message to channel {self.channel_id}, dropping it: {exception}")
+                    return DELIVERY_REJECTED
+                logging.warning(f"Error sending to channel {self.channel_id} (attempt {attempt}/{self.max_send_attempts}): {exception}")
+            except Exception as exception:
+                logging.warning(f"Error sending to channel {self.channel_id} (attempt {attempt}/{self.max_send_attempts}): {exception}")
+
+            if attempt < self.max_send_attempts:
+                metrics.pipeline.discord_send_retries_total.inc(self.channel_label)
+                await asyncio.sleep(wait_seconds)
+                retry_delay_seconds *= 2
+
+        logging.error(f"Giving up on sending a message to channel {self.channel_id} after {self.max_send_attempts} attempts.")
+        return DELIVERY_FAILED
+
+@dataclass
+class WebhookMessage:
+    content: str
+    # The name to post the message under, or None for the webhook's own
+    username: str | None = None
+
+def get_player_chat(line: str) -> tuple[str | None, str]:
+    """Splits a chat log like `<PikaGoku> hello` into the player's name and the message, or returns None and `line` as it is if it isn't one."""
+    chat_match = PLAYER_CHAT_PATTERN.fullmatch(line)
+    if chat_match is None:
+        return None, line
+
+    return chat_match.group("player_name"), chat_match.group("message")
+
+class WebhookSendQueue(ChannelSendQueue):
+    webhook_url: str
+    use_player_names: bool
+    request_timeout_seconds: float
+    session: aiohttp.ClientSession | None
+
+    def __init__(self, webhook_url: str, max_message_size: int = 2000, max_queued_lines: int = 10000, max_send_attempts: int = 5, use_player_names: bool = False, request_timeout_seconds: float = 10.0, rate_limit_bucket: RateLimitBucket | None = None) -> None:
+        """
+        Initialize `WebhookSendQueue` object, a `ChannelSendQueue` that posts to a Discord webhook instead of sending as the bot.
+
+        :param str webhook_url: The URL of the webhook to post to (anything serving the same API works, e.g. a local stand-in).
+        :param int max_message_size: The maximum size of one message, default 2000 (Discord's limit)
+        :param int max_queued_lines: How many lines can be waiting to be posted before `enqueue` waits for some to be posted, default 10000
+        :param int max_send_attempts: How many times to try posting a message before giving up on it, default 5
+        :param bool use_player_names: Post chat logs like `<PikaGoku> hello` as `hello` under the name `PikaGoku`, default False -
+            each message then only holds lines from one player. The default chat rules leave such logs out of the chat channel (see `chat_classifier.DEFAULT_CHAT_RULES`)
+        :param float request_timeout_seconds: How long to wait for one post, default 10.0
+        :param RateLimitBucket rate_limit_bucket: The webhook's rate limit, to share it with other queues posting to the same webhook, default None (a new one)
+
+        Webhooks have their own rate limit (5 posts every 2 seconds each), separate from the bot's and from the channel they post in,
+        and don't need the bot to be connected.
+        """
+        webhook_id_match = WEBHOOK_URL_PATTERN.search(webhook_url)
+        super().__init__(int(webhook_id_match.group("webhook_id")) if webhook_id_match is not None else 0, lambda _: None, max_message_size=max_message_size, max_queued_lines=max_queued_lines, max_send_attempts=max_send_attempts)
+
+        self.webhook_url = webhook_url
+        self.use_player_names = use_player_names
+        self.request_timeout_seconds = request_timeout_seconds
+        self.channel_label = f"webhook:{self.channel_id}"
+        self.rate_limit_bucket = rate_limit_bucket if rate_limit_bucket is not None else RateLimitBucket(capacity=5, window_seconds=2.0)
+        self.session = None
+
+    def _take_message(self) -> tuple[WebhookMessage, int]:
+        """
+        Packs as many queued lines (from the front of the queue) as fit into one message, without removing them from the queue.
+
+        With `self.use_player_names`, only the lines from the same player as the first one go in, without their `<name> ` prefix.
+        """
+        if self.use_player_names is False:
+            message, line_count = super()._take_message()
+            return WebhookMessage(message), line_count
+
+        player_name, _ = get_player_chat(self.queued_lines[0])
+
+        def iter_player_messages():
+            for line in self.queued_lines:
+                line_player_name, message = get_player_chat(line)
+                if line_player_name != player_name:
+                    return
+                yield message
+
+        message, line_count = next(log_packer.pack_log_messages(iter_player_messages(), self.max_message_size, self.max_lines_per_message))
+
+        return WebhookMessage(message, player_name), line_count
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.request_timeout_seconds))
+
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _send_message(self, message: WebhookMessage) -> str:
+        """
+        Posts `message` to the webhook, retrying with a growing delay (or as long as Discord says to wait, if rate limited) if posting fails.
+
+        Only rate limits (429), server errors (5xx) and connection errors are retried - any other error response means the message is dropped.
+
+        Returns `DELIVERY_SENT` if the message was posted, `DELIVERY_REJECTED` if Discord refused it for good, or `DELIVERY_FAILED` if it was given up on.
+        """
+        webhook_payload: dict = {"content": message.content, "allowed_mentions": {"parse": []}}
+        if message.username is not None:
+            webhook_payload["username"] = message.username
+
+        retry_delay_seconds = 1.0
+        for attempt in range(1, self.max_send_attempts + 1):
+            wait_seconds = retry_delay_seconds
+            try:
+                send_start_time = time.perf_counter()
+                async with self.get_session().post(self.webhook_url, json=webhook_payload) as response:
+                    if response.status < 300:
+                        metrics.pipeline.discord_send_seconds.observe(time.perf_counter() - send_start_time, self.channel_label)
+                        # Don't go over the limit in the first place, if Discord says it was reached
+                        if response.headers.get("X-RateLimit-Remaining") == "0":
+                            self.rate_limit_bucket.block_for(float(response.headers.get("X-RateLimit-Reset-After", self.rate_limit_bucket.window_seconds)))
+                        return DELIVERY_SENT
+
+                    if response.status == 429:
+                        rate_limit_json = await response.json(content_type=None)
+                        wait_seconds = float(rate_limit_json.get("retry_after", wait_seconds))
+                        self.rate_limit_bucket.block_for(wait_seconds)
+                    elif response.status < 500:
+                        # Posting it again won't go any differently (e.g. 400 for a player name Discord doesn't allow, like one with "discord" in it)
+                        logging.error(f"Can't post to webhook {self.channel_id} (HTTP {response.status}), dropping message: {await response.text()}")
+                        return DELIVERY_REJECTED
+                    logging.warning(f"Error posting to webhook {self.channel_id} (attempt {attempt}/{self.max_send_attempts}): HTTP {response.status}")
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exception:
+                logging.warning(f"Error posting to webhook {self.channel_id} (attempt {attempt}/{self.max_send_attempts}): {exception}")
+
+            if attempt < self.max_send_attempts:
+                metrics.pipeline.discord_send_retries_total.inc(self.channel_label)
+                await asyncio.sleep(wait_seconds)
+                retry_delay_seconds *= 2
+
+        logging.error(f"Giving up on posting a message to webhook {self.channel_id} after {self.max_send_attempts} attempts.")
+        return DELIVERY_FAILED
+
+class SendScheduler:
+    get_channel: typing.Callable[[int], typing.Any]
+    max_queued_lines: int
+    wait_until_ready: typing.Callable[[], typing.Awaitable[None]] | None
+    channel_send_queues: dict[int, ChannelSendQueue]
+    # Keyed by webhook URL and whether the queue posts under player names, since the same webhook can be used both ways
+    webhook_send_queues: dict[tuple[str, bool], WebhookSendQueue]
+    # One per webhook URL, shared by its queues
+    webhook_rate_limit_buckets: dict[str, RateLimitBucket]
+
+    def __init__(self, get_channel: typing.Callable[[int], typing.Any], max_queued_lines: int = 10000, wait_until_ready: typing.Callable[[], typing.Awaitable[None]] | None = None) -> None:
+        """
+        Initialize `SendScheduler` object, which keeps one `ChannelSendQueue` per channel (and one `WebhookSendQueue` per webhook).
+
+        :param Callable get_channel: Returns the channel with the given ID, or None if it isn't available (yet).
+        :param int max_queued_lines: How many lines can be waiting to be sent to one channel before `ChannelSendQueue.enqueue` waits, default 10000
+        :param Callable wait_until_ready: Waits until the bot is connected, default None (don't wait) - see `ChannelSendQueue`
+        """
+        self.get_channel = get_channel
+        self.max_queued_lines = max_queued_lines
+        self.wait_until_ready = wait_until_ready
+        self.channel_send_queues = {}
+        self.webhook_send_queues = {}
+        self.webhook_rate_limit_buckets = {}
+
+    def get_channel_send_queue(self, channel_id: int) -> ChannelSendQueue:
+        if channel_id not in self.channel_send_queues:
+            self.channel_send_queues[channel_id] = ChannelSendQueue(channel_id, self.get_channel, max_queued_lines=self.max_queued_lines, wait_until_ready=self.wait_until_ready)
+
+        return self.channel_send_queues[channel_id]
+
+    def get_webhook_send_queue(self, webhook_url: str, use_player_names: bool = False) -> WebhookSendQueue:
+        """Returns the queue posting to the webhook `webhook_url` (under player names or not) - queues posting to the same webhook share its rate limit."""
+        if (webhook_url, use_player_names) not in self.webhook_send_queues:
+            if webhook_url not in self.webhook_rate_limit_buckets:
+                self.webhook_rate_limit_buckets[webhook_url] = RateLimitBucket(capacity=5, window_seconds=2.0)
+            self.webhook_send_queues[(webhook_url, use_player_names)] = WebhookSendQueue(webhook_url, max_queued_lines=self.max_queued_lines, use_player_names=use_player_names, rate_limit_bucket=self.webhook_rate_limit_buckets[webhook_url])
+
+        return self.webhook_send_queues[(webhook_url, use_player_names)]
+
+    def get_queue_depths(self) -> dict[int, int]:
+        """Returns how many lines are waiting to be sent to each channel (and each webhook, by its ID)."""
+        queue_depths = {channel_id: channel_send_queue.queue_depth for channel_id, channel_send_queue in self.channel_send_queues.items()}
+        for webhook_send_queue in self.webhook_send_queues.values():
+            queue_depths[webhook_send_queue.channel_id] = queue_depths.get(webhook_send_queue.channel_id, 0) + webhook_send_queue.queue_depth
+
+        return queue_depths
+
+    async def close(self) -> None:
+        """Closes the webhooks' HTTP sessions."""
+        for webhook_send_queue in self.webhook_send_queues.values():
+            await webhook_send_queue.close()
@@ -0,0 +1,111 @@
+import json
+import os
+from dataclasses import dataclass
+from routing import SINK_NAME_PATTERN
+
+@dataclass
+class ServerConfig:
+    name: str | None
+    server_ip: str
+    server_port: int
+    rcon_port: int
+    rcon_password: str
+    is_query_enabled: bool
+    server_logs_folder: str
+    status_channel_id: int
+    status_message_id: int
+    log_dump_channel_id: int
+    chat_dump_channel_id: int
+    server_ping_interval_seconds: float
+    chat_rules_file: str | None = None
+    log_routes_file: str | None = None
+
+    @property
+    def server_log_file_name(self) -> str:
+        return f"{self.server_logs_folder}/latest.log"
+
+    @property
+    def checkpoint_file_name(self) -> str:
+        return f"{self.server_logs_folder}/bridge_checkpoint.json"
+
+    def get_spool_file_name(self, display_name: str) -> str:
+        """
+        Returns the location/file name of the spool of logs waiting to be sent to the display `display_name` (e.g. `chat_logs`).
+
+        Raises `ValueError` if `display_name` has anything but letters, digits, underscores and dashes (e.g. a path separator).
+        """
+        if SINK_NAME_PATTERN.fullmatch(display_name) is None:
+            raise ValueError(f"Display name {display_name!r} can't be used in a spool file name.")
+        return f"{self.server_logs_folder}/bridge_spool_{display_name}.jsonl"
+
+    @classmethod
+    def from_env(cls) -> "ServerConfig":
+        """Reads the configuration of a single server from the environment variables (see the README), for running the bridge for just one server."""
+        return cls(
+            name = None,
+            server_ip = os.environ["SERVER_IP"],
+            server_port = int(os.environ["SERVER_PORT"]),
+            rcon_port = int(os.environ["RCON_PORT"]),
+            rcon_password = os.environ["RCON_PASSWORD"],
+            is_query_enabled = (os.environ["IS_QUERY_ENABLED"].lower() == "true"),
+            server_logs_folder = os.environ["SERVER_LOGS_FOLDER"],
+            status_channel_id = int(os.environ["STATUS_CHANNEL_ID"]),
+            status_message_id = int(os.environ["STATUS_MESSAGE_ID"]),
+            log_dump_channel_id = int(os.environ["LOG_DUMP_CHANNEL_ID"]),
+            chat_dump_channel_id = int(os.environ["CHAT_DUMP_CHANNEL_ID"]),
+            server_ping_interval_seconds = float(os.environ.get("SERVER_PING_MIN_INTERVAL_SECONDS", os.environ["SERVER_PING_INTERVAL_SECONDS"])),
+            chat_rules_file = os.environ.get("CHAT_RULES_FILE"),
+            log_routes_file = os.environ.get("LOG_ROUTES_FILE"),
+        )
+
+    @classmethod
+    def from_json(cls, server_json: dict, default_server_ping_interval_seconds: float | None = None) -> "ServerConfig":
+        """
+        Reads the configuration of one server from an entry of the servers config file.
+
+        Keys are the lowercase names of the matching environment variables (plus `name`), e.g. `{"name": "survival", "server_ip": "localhost", ...}`.
+        `server_ping_interval_seconds`, `chat_rules_file` and `log_routes_file` are optional.
+        """
+        if len(str(server_json["name"]).split()) != 1:
+            raise ValueError(f"Server name {server_json['name']!r} should be one word, since the admin's DMs start with it to pick the server.")
+
+        server_ping_interval_seconds = server_json.get("server_ping_interval_seconds", default_server_ping_interval_seconds)
+        if server_ping_interval_seconds is None:
+            raise ValueError(f"No server_ping_interval_seconds for server {server_json.get('name')}, and no SERVER_PING_INTERVAL_SECONDS to fall back on.")
+
+        return cls(
+            name = str(server_json["name"]),
+            server_ip = str(server_json["server_ip"]),
+            server_port = int(server_json.get("server_port", 25565)),
+            rcon_port = int(server_json.get("rcon_port", 25575)),
+            rcon_password = str(server_json["rcon_password"]),
+            is_query_enabled = bool(server_json.get("is_query_enabled", False)),
+            server_logs_folder = str(server_json["server_logs_folder"]),
+            status_channel_id = int(server_json["status_channel_id"]),
+            status_message_id = int(server_json["status_message_id"]),
+            log_dump_channel_id = int(server_json["log_dump_channel_id"]),
+            chat_dump_channel_id = int(server_json["chat_dump_channel_id"]),
+            server_ping_interval_seconds = float(server_ping_interval_seconds),
+            chat_rules_file = server_json.get("chat_rules_file", os.environ.get("CHAT_RULES_FILE")),
+            log_routes_file = server_json.get("log_routes_file", os.environ.get("LOG_ROUTES_FILE")),
+        )
+
+def load_server_configs(file_name: str, default_server_ping_interval_seconds: float | None = None) -> list[ServerConfig]:
+    """
+    Loads the configuration of every server to observe from the JSON file `file_name`, which should contain a list of servers (see `ServerConfig.from_json`).
+
+    Raises `ValueError` if the file isn't a non-empty list, or if two servers have the same name.
+    """
+    with open(file_name, "r", encoding="utf-8") as servers_file:
+        servers_json = json.load(servers_file)
+
+    if isinstance(servers_json, list) is False or len(servers_json) == 0:
+        raise ValueError(f"{file_name} should contain a list of at least one server.")
+
+    server_configs = [ServerConfig.from_json(server_json, default_server_ping_interval_seconds) for server_json in servers_json]
+
+    server_names = [server_config.name for server_config in server_configs]
+    if len(set(server_names)) != len(server_names):
+        raise ValueError(f"Every server in {file_name} should have a different name.")
+
+    return server_configs
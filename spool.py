@@ -0,0 +1,356 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import typing
+from dataclasses import dataclass
+
+# How often to warn that a full spool is dropping lines, rather than once per batch appended
+DROPPED_LINES_WARNING_INTERVAL_SECONDS = 60.0
+# How many times to try sending an entry (after the first) before giving up on it, by default
+DEFAULT_MAX_DELIVERY_ATTEMPTS = 50
+
+@dataclass
+class SpoolEntry:
+    sequence_number: int
+    lines: list[str]
+
+class Spool:
+    file_name: str
+    max_bytes: int
+    min_compaction_bytes: int
+    max_delivery_attempts: int
+    spool_file: typing.TextIO | None
+    file_size: int
+    # Whether everything written to the spool file is known to be on disk (see `sync`)
+    is_synced: bool
+    next_sequence_number: int
+    # For each entry not acknowledged yet, in order: its size in the file and how many lines it has
+    pending_entries: dict[int, tuple[int, int]]
+    pending_bytes: int
+    # Entries to send again (left over from a previous run, or whose send failed), rather than entries still on their way to Discord
+    replayable_sequence_numbers: set[int]
+    # For each pending entry whose send failed: how many of its lines Discord has dealt with (from the start), and how many times sending the rest failed
+    delivery_progress: dict[int, tuple[int, int]]
+    unwritten_acknowledgements: list[int]
+    unwritten_progress_sequence_numbers: set[int]
+    lock: asyncio.Lock
+    dropped_line_count: int
+    # When dropping lines was last warned about, and how many had been dropped by then
+    last_drop_warning_time: float | None
+    last_drop_warning_line_count: int
+
+    def __init__(self, file_name: str, max_bytes: int = 16 * 1024 * 1024, min_compaction_bytes: int = 1024 * 1024, max_delivery_attempts: int = DEFAULT_MAX_DELIVERY_ATTEMPTS) -> None:
+        """
+        Initialize `Spool` object, an append-only file of batches of lines waiting to be sent to Discord.
+
+        :param str file_name: The location/file name of the spool file.
+        :param int max_bytes: The most unacknowledged lines to keep, in bytes, default 16 MiB - past that, the oldest entries are dropped
+        :param int min_compaction_bytes: How many bytes of acknowledged entries the file can hold before it is compacted, default 1 MiB
+        :param int max_delivery_attempts: How many times sending an entry can fail before the rest of its lines are dropped, default 50
+
+        Every batch is written to the spool before the log checkpoint moves past it, and only acknowledged once Discord has it,
+        so lines that couldn't be sent (the bot not being connected yet, a Discord outage, a restart) are sent later instead of lost.
+        Acknowledgements (and how far into each entry a failed send got) are appended to the file too,
+        and the file is rewritten without the acknowledged entries every so often.
+        """
+        self.file_name = file_name
+        self.max_bytes = max_bytes
+        self.min_compaction_bytes = min_compaction_bytes
+        self.max_delivery_attempts = max_delivery_attempts
+
+        self.spool_file = None
+        self.file_size = 0
+        self.is_synced = True
+        self.next_sequence_number = 1
+        self.pending_entries = {}
+        self.pending_bytes = 0
+        self.replayable_sequence_numbers = set()
+        self.delivery_progress = {}
+        self.unwritten_acknowledgements = []
+        self.unwritten_progress_sequence_numbers = set()
+        self.lock = asyncio.Lock()
+        self.dropped_line_count = 0
+        self.last_drop_warning_time = None
+        self.last_drop_warning_line_count = 0
+
+    @staticmethod
+    def encode_record(record: dict[str, typing.Any]) -> str:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def _read_records(self) -> typing.Iterator[tuple[dict[str, typing.Any], int]]:
+        """Yields each record in the spool file with its size in bytes, skipping a line cut short by a crash. Blocking, so run it in a thread."""
+        try:
+            with open(self.file_name, "r", encoding="utf-8") as spool_file:
+                for record_line in spool_file:
+                    try:
+                        record = json.loads(record_line)
+                    except json.JSONDecodeError:
+                        logging.warning(f"Skipping a damaged record in spool file {self.file_name}.")
+                        continue
+                    yield record, len(record_line.encode("utf-8"))
+        except FileNotFoundError:
+            return
+
+    def _load(self) -> None:
+        acknowledged_sequence_numbers: set[int] = set()
+        entries: dict[int, tuple[int, int]] = {}
+        delivery_progress: dict[int, tuple[int, int]] = {}
+        file_size = 0
+
+        for record, record_size in self._read_records():
+            file_size += record_size
+            if "ack" in record:
+                acknowledged_sequence_numbers.update(record["ack"])
+            elif "progress" in record:
+                # Later records are further along
+                delivery_progress.update((sequence_number, (done_line_count, attempt_count)) for sequence_number, done_line_count, attempt_count in record["progress"])
+            else:
+                entries[record["seq"]] = (record_size, len(record["lines"]))
+
+        self.pending_entries = {sequence_number: entry for sequence_number, entry in entries.items() if sequence_number not in acknowledged_sequence_numbers}
+        self.pending_bytes = sum(record_size for record_size, _ in self.pending_entries.values())
+        self.replayable_sequence_numbers = set(self.pending_entries)
+        self.delivery_progress = {sequence_number: progress for sequence_number, progress in delivery_progress.items() if sequence_number in self.pending_entries}
+        self.unwritten_acknowledgements = []
+        self.unwritten_progress_sequence_numbers = set()
+        self.next_sequence_number = max(entries, default=0) + 1
+        self.file_size = file_size
+        self.spool_file = open(self.file_name, "a", encoding="utf-8")
+
+    async def load(self) -> int:
+        """
+        Reads what is left in the spool file from the last run (if anything), and opens it for appending.
+
+        Everything left unacknowledged is sent again (see `iter_replayable_entries`). Returns how many lines that is.
+        """
+        async with self.lock:
+            if self.spool_file is not None:
+                self.spool_file.close()
+            await asyncio.to_thread(self._load)
+
+        return self.pending_line_count
+
+    @property
+    def pending_line_count(self) -> int:
+        return sum(line_count - self.delivery_progress.get(sequence_number, (0, 0))[0] for sequence_number, (_, line_count) in self.pending_entries.items())
+
+    @property
+    def has_replayable_entries(self) -> bool:
+        return len(self.replayable_sequence_numbers) > 0
+
+    def _write(self, record_text: str) -> None:
+        """Appends `record_text` to the spool file. Blocking, so run it in a thread."""
+        self.spool_file.write(record_text)
+        self.spool_file.flush()
+        self.file_size += len(record_text.encode("utf-8"))
+        self.is_synced = False
+
+    async def sync(self) -> None:
+        """
+        Waits until everything written to the spool file so far is on disk, fsyncing it in a thread if needed.
+
+        Called before a log checkpoint is written, so the checkpoint never moves past lines the spool could lose in a crash.
+        """
+        async with self.lock:
+            if self.is_synced is True or self.spool_file is None:
+                return
+
+            await asyncio.to_thread(os.fsync, self.spool_file.fileno())
+            self.is_synced = True
+
+    def _drop_oldest_entries(self, needed_bytes: int) -> None:
+        """Drops the oldest pending entries until `needed_bytes` more fit in `self.max_bytes`."""
+        dropped_sequence_numbers: list[int] = []
+        dropped_line_count = 0
+        remaining_bytes = self.pending_bytes
+
+        for sequence_number, (record_size, line_count) in self.pending_entries.items():
+            if remaining_bytes + needed_bytes <= self.max_bytes:
+                break
+            dropped_sequence_numbers.append(sequence_number)
+            remaining_bytes -= record_size
+            dropped_line_count += line_count - self.delivery_progress.get(sequence_number, (0, 0))[0]
+
+        for sequence_number in dropped_sequence_numbers:
+            self._forget_entry(sequence_number)
+
+        if len(dropped_sequence_numbers) > 0:
+            self.dropped_line_count += dropped_line_count
+
+            now = time.monotonic()
+            if self.last_drop_warning_time is None or now - self.last_drop_warning_time >= DROPPED_LINES_WARNING_INTERVAL_SECONDS:
+                logging.warning(f"Spool {self.file_name} is full, dropped the oldest {self.dropped_line_count - self.last_drop_warning_line_count} unsent line(s) ({self.dropped_line_count} in total so far).")
+                self.last_drop_warning_time = now
+                self.last_drop_warning_line_count = self.dropped_line_count
+
+    async def append(self, lines: list[str]) -> int:
+        """
+        Writes `lines` to the spool as one entry and returns its sequence number, to acknowledge it with once it is sent.
+
+        If the unacknowledged entries would take up more than `self.max_bytes`, the oldest ones are dropped to make room.
+        """
+        async with self.lock:
+            sequence_number = self.next_sequence_number
+            self.next_sequence_number += 1
+
+            record_text = self.encode_record({"seq": sequence_number, "lines": lines})
+            record_size = len(record_text.encode("utf-8"))
+            self._drop_oldest_entries(record_size)
+
+            await asyncio.to_thread(self._write, self._take_unwritten_records() + record_text)
+
+            self.pending_entries[sequence_number] = (record_size, len(lines))
+            self.pending_bytes += record_size
+
+        return sequence_number
+
+    def _forget_entry(self, sequence_number: int) -> None:
+        """Forgets the pending entry `sequence_number` (once the next acknowledgements are written), whether it was sent or dropped."""
+        record_size, _ = self.pending_entries.pop(sequence_number)
+        self.pending_bytes -= record_size
+        self.replayable_sequence_numbers.discard(sequence_number)
+        self.delivery_progress.pop(sequence_number, None)
+        self.unwritten_progress_sequence_numbers.discard(sequence_number)
+        self.unwritten_acknowledgements.append(sequence_number)
+
+    def _take_unwritten_records(self) -> str:
+        """Returns the records of the acknowledgements and delivery progress recorded since they were last written, to write them down."""
+        record_text = ""
+        if len(self.unwritten_acknowledgements) > 0:
+            record_text += self.encode_record({"ack": self.unwritten_acknowledgements})
+            self.unwritten_acknowledgements = []
+        if len(self.unwritten_progress_sequence_numbers) > 0:
+            record_text += self.encode_record({"progress": [[sequence_number, *self.delivery_progress[sequence_number]] for sequence_number in sorted(self.unwritten_progress_sequence_numbers)]})
+            self.unwritten_progress_sequence_numbers = set()
+
+        return record_text
+
+    def acknowledge(self, sequence_number: int, rejected_line_count: int = 0) -> None:
+        """
+        Records that Discord dealt with every line left to send of the entry `sequence_number`, so it is forgotten (once `flush` writes that down).
+
+        `rejected_line_count` of those lines were refused by Discord rather than sent - they are counted as dropped, since sending them again won't help.
+        """
+        if sequence_number not in self.pending_entries:
+            return
+
+        self.dropped_line_count += rejected_line_count
+        self._forget_entry(sequence_number)
+
+    def record_failed_delivery(self, sequence_number: int, done_line_count: int, rejected_line_count: int = 0) -> None:
+        """
+        Records that sending the entry `sequence_number` failed after Discord dealt with the first `done_line_count` of the lines left to send
+        (`rejected_line_count` of them refused rather than sent), so only the rest of them are sent again later (see `iter_replayable_entries`).
+
+        Once sending it has failed `self.max_delivery_attempts` times, the rest of its lines are dropped instead, so an entry that can never be sent
+        doesn't hold up everything after it forever.
+        """
+        if sequence_number not in self.pending_entries:
+            return
+
+        _, line_count = self.pending_entries[sequence_number]
+        previous_done_line_count, attempt_count = self.delivery_progress.get(sequence_number, (0, 0))
+        done_line_count = min(line_count, previous_done_line_count + done_line_count)
+        attempt_count += 1
+        self.dropped_line_count += rejected_line_count
+
+        if attempt_count >= self.max_delivery_attempts:
+            logging.error(f"Giving up on sending {line_count - done_line_count} spooled line(s) from {self.file_name} after {attempt_count} failed attempts, dropping them.")
+            self.dropped_line_count += line_count - done_line_count
+            self._forget_entry(sequence_number)
+            return
+
+        self.delivery_progress[sequence_number] = (done_line_count, attempt_count)
+        self.unwritten_progress_sequence_numbers.add(sequence_number)
+        self.replayable_sequence_numbers.add(sequence_number)
+
+    def requeue(self, sequence_number: int) -> None:
+        """Records that the entry `sequence_number` wasn't sent (without being tried, e.g. since an earlier entry failed), so it is sent again later."""
+        if sequence_number in self.pending_entries:
+            self.replayable_sequence_numbers.add(sequence_number)
+
+    def _compact(self, progress_record_text: str | None) -> None:
+        """
+        Rewrites the spool file with only the pending entries (and `progress_record_text` after them), replacing it in one rename.
+        Blocking, so run it in a thread.
+        """
+        self.spool_file.close()
+        temporary_file_name = f"{self.file_name}.tmp"
+        file_size = 0
+
+        with open(temporary_file_name, "w", encoding="utf-8") as temporary_file:
+            if len(self.pending_entries) > 0:
+                for record, _ in self._read_records():
+                    if "seq" in record and record["seq"] in self.pending_entries:
+                        record_text = self.encode_record(record)
+                        temporary_file.write(record_text)
+                        file_size += len(record_text.encode("utf-8"))
+            if progress_record_text is not None:
+                temporary_file.write(progress_record_text)
+                file_size += len(progress_record_text.encode("utf-8"))
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+
+        os.replace(temporary_file_name, self.file_name)
+        self.file_size = file_size
+        self.is_synced = True
+        self.spool_file = open(self.file_name, "a", encoding="utf-8")
+
+    async def flush(self) -> None:
+        """Writes down the acknowledgements (and delivery progress) recorded since the last flush, compacting the file if it is mostly acknowledged entries."""
+        async with self.lock:
+            if len(self.unwritten_acknowledgements) == 0 and len(self.unwritten_progress_sequence_numbers) == 0:
+                return
+
+            await asyncio.to_thread(self._write, self._take_unwritten_records())
+
+            if self.file_size - self.pending_bytes >= max(self.min_compaction_bytes, self.pending_bytes):
+                progress_record_text = None
+                if len(self.delivery_progress) > 0:
+                    progress_record_text = self.encode_record({"progress": [[sequence_number, *progress] for sequence_number, progress in self.delivery_progress.items()]})
+                try:
+                    await asyncio.to_thread(self._compact, progress_record_text)
+                except Exception as exception:
+                    logging.error(f"Unhandled exception compacting spool file {self.file_name}! {exception}")
+                    if self.spool_file is None or self.spool_file.closed:
+                        self.spool_file = open(self.file_name, "a", encoding="utf-8")
+
+    def _read_replayable_entries(self, sequence_numbers: set[int]) -> typing.Iterator[SpoolEntry]:
+        for record, _ in self._read_records():
+            if "seq" in record and record["seq"] in sequence_numbers:
+                yield SpoolEntry(record["seq"], record["lines"])
+
+    async def iter_replayable_entries(self, max_batch_lines: int = 1000) -> typing.AsyncIterator[list[SpoolEntry]]:
+        """
+        Yields the entries to send again, oldest first, in batches of up to `max_batch_lines` lines (an entry is never split).
+        Each entry has only the lines left to send - not those Discord already dealt with when an earlier send of it failed partway through.
+
+        The file is read as it goes, so only one batch is held in memory at a time.
+        """
+        sequence_numbers = set(self.replayable_sequence_numbers)
+        entry_iterator = self._read_replayable_entries(sequence_numbers)
+
+        batch: list[SpoolEntry] = []
+        batch_line_count = 0
+        while True:
+            entry = await asyncio.to_thread(next, entry_iterator, None)
+            if entry is None:
+                break
+            # Dropped to make room (or given up on) since
+            if entry.sequence_number not in self.pending_entries:
+                continue
+            done_line_count, _ = self.delivery_progress.get(entry.sequence_number, (0, 0))
+            entry.lines = entry.lines[done_line_count:]
+
+            if len(batch) > 0 and batch_line_count + len(entry.lines) > max_batch_lines:
+                yield batch
+                batch = []
+                batch_line_count = 0
+
+            batch.append(entry)
+            batch_line_count += len(entry.lines)
+
+        if len(batch) > 0:
+            yield batch
@@ -0,0 +1,80 @@
+import random
+import pytest
+from log_packer import CODE_BLOCK_FENCE, ZERO_WIDTH_SPACE, escape_code_block_fences, pack_log_messages, split_long_log
+
+# Backticks often enough to make fences (and longer runs), and characters that take more than one byte
+LOG_ALPHABET = "abcdefghij ```[]:/é✓"
+
+def random_logs(rng: random.Random) -> list[str]:
+    logs = []
+    for _ in range(rng.randint(0, 40)):
+        # Mostly short lines, some longer than a whole message
+        log_length = rng.choice((rng.randint(0, 20), rng.randint(0, 400)))
+        logs.append("".join(rng.choice(LOG_ALPHABET) for _ in range(log_length)))
+
+    return logs
+
+def random_packing_options(rng: random.Random) -> dict:
+    return {
+        "max_message_size": rng.randint(20, 300),
+        "max_lines": rng.choice((None, rng.randint(1, 6))),
+        "code_block_language": rng.choice((None, "", "ansi")),
+    }
+
+def get_message_body(message: str, code_block_language: str | None) -> str:
+    """Returns `message` without the code block around it, if it has one."""
+    if code_block_language is None:
+        return message
+
+    message_prefix = f"{CODE_BLOCK_FENCE}{code_block_language}\n"
+    assert message.startswith(message_prefix) and message.endswith(CODE_BLOCK_FENCE)
+    return message[len(message_prefix):-len(CODE_BLOCK_FENCE)]
+
+@pytest.mark.parametrize("seed", range(300))
+def test_packed_messages_fit_and_hold_every_line_in_order(seed: int):
+    rng = random.Random(seed)
+    logs = random_logs(rng)
+    packing_options = random_packing_options(rng)
+    code_block_language = packing_options["code_block_language"]
+
+    packed_messages = list(pack_log_messages(iter(logs), **packing_options))
+    message_bodies = [get_message_body(message, code_block_language) for message, _ in packed_messages]
+
+    # No message is too big, or empty
+    assert all(len(message) <= packing_options["max_message_size"] for message, _ in packed_messages)
+    assert all(body != "" for body in message_bodies)
+    if packing_options["max_lines"] is not None:
+        assert all(body.count("\n") <= packing_options["max_lines"] for body in message_bodies)
+
+    # Every line is counted once, by the message it ends in
+    assert sum(line_count for _, line_count in packed_messages) == len(logs)
+
+    # Joined back together (and unescaped), the pieces are the lines, in order
+    line_budget = packing_options["max_message_size"] - (len(CODE_BLOCK_FENCE) * 2 + len(code_block_language) + 1 if code_block_language is not None else 0)
+    expected_logs = [escape_code_block_fences(log) if code_block_language is not None else log for log in logs]
+    expected_pieces = [split_long_log(log, line_budget - 1) for log in expected_logs]
+    assert all("".join(log_pieces) == log for log_pieces, log in zip(expected_pieces, expected_logs))
+    assert "".join(message_bodies) == "".join(f"{log_piece}\n" for log_pieces in expected_pieces for log_piece in log_pieces)
+    assert [log.replace(ZERO_WIDTH_SPACE, "") for log in expected_logs] == logs
+
+    # Nothing in a message can end its code block early
+    if code_block_language is not None:
+        assert all(CODE_BLOCK_FENCE not in body for body in message_bodies)
+
+@pytest.mark.parametrize("seed", range(100))
+def test_escaping_breaks_up_every_backtick_run(seed: int):
+    rng = random.Random(seed)
+    log = "".join(rng.choice("`a") for _ in range(rng.randint(0, 30)))
+
+    escaped_log = escape_code_block_fences(log)
+
+    assert escaped_log.replace(ZERO_WIDTH_SPACE, "") == log
+    if CODE_BLOCK_FENCE in log:
+        assert "``" not in escaped_log
+    else:
+        # Left alone, since it can't end a code block anyway
+        assert escaped_log == log
+
+def test_message_too_small_for_any_logs_is_rejected():
+    with pytest.raises(ValueError):
+        list(pack_log_messages(["hello"], max_message_size=7, code_block_language=""))
@@ -0,0 +1,168 @@
+import asyncio
+import struct
+import typing
+import pytest
+from rcon_client import RconAuthenticationError, RconClient, RconError, SERVERDATA_AUTH, SERVERDATA_AUTH_RESPONSE, SERVERDATA_EXECCOMMAND, SERVERDATA_RESPONSE_VALUE
+
+PASSWORD = "hunter2"
+
+def encode_packet(request_id: int, packet_type: int, payload: bytes) -> bytes:
+    packet = struct.pack("<ii", request_id, packet_type) + payload + b"\0\0"
+    return struct.pack("<i", len(packet)) + packet
+
+class FakeRconServer:
+    """Speaks just enough of the RCON protocol, answering each connection's packets in order like Minecraft does."""
+
+    def __init__(self, responses: dict[str, str] | None = None, fragment_size: int = 4096, command_delay_seconds: float = 0.0, authentication_delay_seconds: float = 0.0, drop_after_commands: int | None = None) -> None:
+        self.responses = responses if responses is not None else {}
+        self.fragment_size = fragment_size
+        self.command_delay_seconds = command_delay_seconds
+        self.authentication_delay_seconds = authentication_delay_seconds
+        self.drop_after_commands = drop_after_commands
+        self.received_commands: list[str] = []
+        self.connection_count = 0
+        self.server: asyncio.AbstractServer | None = None
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle_connection, "127.0.0.1", 0)
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connection_count += 1
+        command_count = 0
+
+        try:
+            while True:
+                (packet_length,) = struct.unpack("<i", await reader.readexactly(4))
+                packet = await reader.readexactly(packet_length)
+                request_id, packet_type = struct.unpack_from("<ii", packet)
+                payload = packet[8:-2].decode("utf-8")
+
+                if packet_type == SERVERDATA_AUTH:
+                    await asyncio.sleep(self.authentication_delay_seconds)
+                    writer.write(encode_packet(request_id if payload == PASSWORD else -1, SERVERDATA_AUTH_RESPONSE, b""))
+                elif packet_type == SERVERDATA_EXECCOMMAND:
+                    self.received_commands.append(payload)
+                    command_count += 1
+                    if self.drop_after_commands is not None and command_count > self.drop_after_commands:
+                        break
+                    await asyncio.sleep(self.command_delay_seconds)
+                    response = self.responses.get(payload, f"ran {payload}").encode("utf-8")
+                    for fragment_start in range(0, max(1, len(response)), self.fragment_size):
+                        fragment = encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, response[fragment_start:fragment_start + self.fragment_size])
+                        # Split each packet over two writes too, so it arrives in pieces
+                        writer.write(fragment[:5])
+                        await writer.drain()
+                        writer.write(fragment[5:])
+                else:
+                    # Minecraft answers the terminator packet (an unknown type) straight away
+                    writer.write(encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, b"Unknown request 0"))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+async def run_with_server(fake_server: FakeRconServer, test: typing.Callable[[RconClient], typing.Awaitable[None]], **client_options) -> None:
+    await fake_server.start()
+    rcon_client = RconClient("127.0.0.1", fake_server.port, client_options.pop("password", PASSWORD), **client_options)
+    try:
+        await test(rcon_client)
+    finally:
+        await rcon_client.close()
+        await fake_server.stop()
+
+def test_pipelined_commands_get_their_own_responses():
+    fake_server = FakeRconServer(command_delay_seconds=0.01)
+
+    async def test(rcon_client: RconClient) -> None:
+        responses = await asyncio.gather(*(rcon_client.command(f"say {index}") for index in range(20)))
+        assert responses == [f"ran say {index}" for index in range(20)]
+        # All over the one connection
+        assert fake_server.connection_count == 1
+
+    asyncio.run(run_with_server(fake_server, test))
+
+def test_response_split_over_several_packets_is_joined():
+    long_response = "".join(f"/command{index} <argument> [option]\n" for index in range(400))
+    fake_server = FakeRconServer(responses={"help": long_response}, fragment_size=4096)
+
+    async def test(rcon_client: RconClient) -> None:
+        assert len(long_response) > 2 * 4096
+        assert await rcon_client.command("help") == long_response
+
+    asyncio.run(run_with_server(fake_server, test))
+
+def test_terminator_ends_each_response():
+    fake_server = FakeRconServer(responses={"save-all": "", "list": "There are 0 of a max of 20 players online: "}, fragment_size=8)
+
+    async def test(rcon_client: RconClient) -> None:
+        # An empty response, then one in many fragments - the fragments of one can't end up in the other
+        save_response, list_response = await asyncio.gather(rcon_client.command("save-all"), rcon_client.command("list"))
+        assert save_response == ""
+        assert list_response == "There are 0 of a max of 20 players online: "
+        assert rcon_client.pending_commands == {}
+
+    asyncio.run(run_with_server(fake_server, test))
+
+def test_wrong_password_fails_closes_and_backs_off():
+    fake_server = FakeRconServer()
+
+    async def test(rcon_client: RconClient) -> None:
+        with pytest.raises(RconAuthenticationError):
+            await rcon_client.command("list")
+        assert rcon_client.is_connected is False
+        assert rcon_client.next_connect_time > 0.0
+        assert rcon_client.reconnect_delay_seconds == pytest.approx(0.2)
+
+    asyncio.run(run_with_server(fake_server, test, password="wrong", min_reconnect_delay_seconds=0.1))
+
+def test_command_timeout_leaves_the_connection_usable():
+    fake_server = FakeRconServer(command_delay_seconds=0.3)
+
+    async def test(rcon_client: RconClient) -> None:
+        with pytest.raises(asyncio.TimeoutError):
+            await rcon_client.command("slow")
+        fake_server.command_delay_seconds = 0.0
+        # Let the late response to the first command arrive - it is ignored rather than taken for the next one's
+        await asyncio.sleep(0.3)
+        assert await rcon_client.command("fast") == "ran fast"
+        assert fake_server.connection_count == 1
+
+    asyncio.run(run_with_server(fake_server, test, command_timeout_seconds=0.1))
+
+def test_timeout_while_authenticating_doesnt_leave_a_connection():
+    fake_server = FakeRconServer(authentication_delay_seconds=0.3)
+
+    async def test(rcon_client: RconClient) -> None:
+        with pytest.raises(asyncio.TimeoutError):
+            await rcon_client.command("list")
+        assert rcon_client.is_connected is False
+        assert rcon_client.read_task is None
+
+        fake_server.authentication_delay_seconds = 0.0
+        assert await rcon_client.command("list") == "ran list"
+        assert fake_server.connection_count == 2
+
+    asyncio.run(run_with_server(fake_server, test, command_timeout_seconds=0.1, min_reconnect_delay_seconds=0.01))
+
+def test_reconnects_after_the_server_drops_the_connection():
+    fake_server = FakeRconServer(drop_after_commands=1)
+
+    async def test(rcon_client: RconClient) -> None:
+        assert await rcon_client.command("first") == "ran first"
+        with pytest.raises(RconError):
+            await rcon_client.command("dropped")
+        assert rcon_client.is_connected is False
+
+        assert await rcon_client.command("second") == "ran second"
+        assert fake_server.connection_count == 2
+
+    asyncio.run(run_with_server(fake_server, test, min_reconnect_delay_seconds=0.01))
@@ -0,0 +1,166 @@
+import asyncio
+import time
+import typing
+from aiohttp import web
+from send_scheduler import DELIVERY_FAILED, DELIVERY_REJECTED, DELIVERY_SENT, WebhookSendQueue
+
+class FakeWebhook:
+    """Stands in for a Discord webhook, answering each post with the next of `responses` (then 204s) and keeping what was posted."""
+
+    def __init__(self, responses: list[web.Response] | None = None) -> None:
+        self.responses = responses if responses is not None else []
+        self.posted_payloads: list[dict] = []
+        self.post_times: list[float] = []
+        self.runner: web.AppRunner | None = None
+        self.site: web.TCPSite | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.runner.addresses[0][1]}/api/webhooks/1234/token"
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/api/webhooks/1234/token", self.handle_post)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        self.site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await self.site.start()
+
+    async def stop(self) -> None:
+        await self.runner.cleanup()
+
+    async def handle_post(self, request: web.Request) -> web.Response:
+        self.posted_payloads.append(await request.json())
+        self.post_times.append(time.monotonic())
+        if len(self.responses) > 0:
+            return self.responses.pop(0)
+
+        return web.Response(status=204)
+
+async def run_with_webhook(fake_webhook: FakeWebhook, test: typing.Callable[[WebhookSendQueue], typing.Awaitable[None]], **queue_options) -> None:
+    await fake_webhook.start()
+    webhook_send_queue = WebhookSendQueue(fake_webhook.url, **queue_options)
+    try:
+        await test(webhook_send_queue)
+    finally:
+        webhook_send_queue.sender_task.cancel()
+        await webhook_send_queue.close()
+        await fake_webhook.stop()
+
+def test_rate_limited_post_is_retried_after_retry_after():
+    fake_webhook = FakeWebhook([web.json_response({"message": "You are being rate limited.", "retry_after": 0.3, "global": False}, status=429)])
+
+    async def test(webhook_send_queue: WebhookSendQueue) -> None:
+        delivery_future = await webhook_send_queue.enqueue(["hello"])
+        assert await asyncio.wait_for(delivery_future, 5.0) == [DELIVERY_SENT]
+
+        assert [payload["content"] for payload in fake_webhook.posted_payloads] == ["hello\n", "hello\n"]
+        # Waited as long as Discord said to, not the usual one second backoff
+        assert 0.25 <= fake_webhook.post_times[1] - fake_webhook.post_times[0] < 0.9
+
+    asyncio.run(run_with_webhook(fake_webhook, test))
+
+def test_server_error_is_retried():
+    fake_webhook = FakeWebhook([web.Response(status=502)])
+
+    async def test(webhook_send_queue: WebhookSendQueue) -> None:
+        delivery_future = await webhook_send_queue.enqueue(["hello"])
+        assert await asyncio.wait_for(delivery_future, 5.0) == [DELIVERY_SENT]
+        assert len(fake_webhook.posted_payloads) == 2
+
+    asyncio.run(run_with_webhook(fake_webhook, test))
+
+def test_rejected_post_is_dropped_without_retrying():
+    fake_webhook = FakeWebhook([web.json_response({"message": "Invalid Form Body", "code": 50035}, status=400)])
+
+    async def test(webhook_send_queue: WebhookSendQueue) -> None:
+        delivery_future = await webhook_send_queue.enqueue(["<discordfan> hi"])
+        assert await asyncio.wait_for(delivery_future, 5.0) == [DELIVERY_REJECTED]
+        assert len(fake_webhook.posted_payloads) == 1
+        assert webhook_send_queue.dropped_line_count == 1
+
+        # The next message goes through as usual
+        assert await asyncio.wait_for(await webhook_send_queue.enqueue(["<PikaGoku> hello"]), 5.0) == [DELIVERY_SENT]
+
+    asyncio.run(run_with_webhook(fake_webhook, test, use_player_names=True))
+
+def test_player_names_post_each_players_lines_under_their_name():
+    fake_webhook = FakeWebhook()
+
+    async def test(webhook_send_queue: WebhookSendQueue) -> None:
+        delivery_future = await webhook_send_queue.enqueue(["<PikaGoku> hello", "<PikaGoku> anyone on?", "<Steve> hi", "Steve joined the game"])
+        assert await asyncio.wait_for(delivery_future, 5.0) == [DELIVERY_SENT] * 4
+
+        assert [(payload.get("username"), payload["content"]) for payload in fake_webhook.posted_payloads] == [
+            ("PikaGoku", "hello\nanyone on?\n"),
+            ("Steve", "hi\n"),
+            (None, "Steve joined the game\n"),
+        ]
+        # Nobody gets pinged by what players say
+        assert all(payload["allowed_mentions"] == {"parse": []} for payload in fake_webhook.posted_payloads)
+
+    asyncio.run(run_with_webhook(fake_webhook, test, use_player_names=True))
+
+def test_concurrent_batches_are_queued_whole():
+    fake_webhook = FakeWebhook()
+    first_batch = [f"first {index}" for index in range(5)]
+    second_batch = [f"second {index}" for index in range(5)]
+
+    async def test(webhook_send_queue: WebhookSendQueue) -> None:
+        async def enqueue_once_a_line_is_sent() -> asyncio.Future[list[str]]:
+            # Comes back for more right as room is made in the queue, before the first batch's caller gets to it
+            assert await (await webhook_send_queue.enqueue(["zero"])) == [DELIVERY_SENT]
+            return await webhook_send_queue.enqueue(second_batch)
+
+        # Both batches are bigger than the whole queue
+        delivery_futures = await asyncio.gather(enqueue_once_a_line_is_sent(), webhook_send_queue.enqueue(first_batch))
+        assert await asyncio.wait_for(asyncio.gather(*delivery_futures), 5.0) == [[DELIVERY_SENT] * 5, [DELIVERY_SENT] * 5]
+
+        posted_lines = [line for payload in fake_webhook.posted_payloads for line in payload["content"].splitlines()]
+        assert posted_lines in (["zero", *first_batch, *second_batch], ["zero", *second_batch, *first_batch])
+
+    asyncio.run(run_with_webhook(fake_webhook, test, max_queued_lines=3))
+
+def test_batch_with_a_rejected_message_reports_which_lines_were_rejected():
+    fake_webhook = FakeWebhook([web.Response(status=204), web.json_response({"message": "Invalid Form Body", "code": 50035}, status=400)])
+
+    async def test(webhook_send_queue: WebhookSendQueue) -> None:
+        # Each player's lines are a message of their own, and only the second one is refused
+        delivery_future = await webhook_send_queue.enqueue(["<PikaGoku> hello", "<discordfan> hi", "<Steve> hey"])
+        assert await asyncio.wait_for(delivery_future, 5.0) == [DELIVERY_SENT, DELIVERY_REJECTED, DELIVERY_SENT]
+        assert [payload["username"] for payload in fake_webhook.posted_payloads] == ["PikaGoku", "discordfan", "Steve"]
+
+    asyncio.run(run_with_webhook(fake_webhook, test, use_player_names=True))
+
+def test_rest_of_batch_is_given_up_on_after_a_failed_message():
+    fake_webhook = FakeWebhook([web.Response(status=204), web.Response(status=502)])
+
+    async def test(webhook_send_queue: WebhookSendQueue) -> None:
+        delivery_future = await webhook_send_queue.enqueue(["<PikaGoku> hello", "<Steve> hi", "<PikaGoku> anyone on?"])
+        assert await asyncio.wait_for(delivery_future, 5.0) == [DELIVERY_SENT, DELIVERY_FAILED, DELIVERY_FAILED]
+        # Sending the last line without the one before it would post them out of order
+        assert [payload["username"] for payload in fake_webhook.posted_payloads] == ["PikaGoku", "Steve"]
+
+        # Later batches are sent as usual
+        assert await asyncio.wait_for(await webhook_send_queue.enqueue(["<Steve> hi"]), 5.0) == [DELIVERY_SENT]
+
+    asyncio.run(run_with_webhook(fake_webhook, test, use_player_names=True, max_send_attempts=1))
+
+def test_unexpected_send_error_fails_the_waiting_lines_instead_of_leaving_them_hanging():
+    fake_webhook = FakeWebhook()
+
+    async def test(webhook_send_queue: WebhookSendQueue) -> None:
+        send_message = webhook_send_queue._send_message
+
+        async def send_message_once_broken(message) -> str:
+            webhook_send_queue._send_message = send_message
+            raise RuntimeError("Something nobody expected")
+
+        webhook_send_queue._send_message = send_message_once_broken
+        assert await asyncio.wait_for(await webhook_send_queue.enqueue(["hello", "anyone on?"]), 5.0) == [DELIVERY_FAILED, DELIVERY_FAILED]
+
+        # The sender carries on with the next lines
+        assert await asyncio.wait_for(await webhook_send_queue.enqueue(["hello again"]), 5.0) == [DELIVERY_SENT]
+        assert [payload["content"] for payload in fake_webhook.posted_payloads] == ["hello again\n"]
+
+    asyncio.run(run_with_webhook(fake_webhook, test))